@@ -1,86 +1,649 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
+import os
 import csv
+import copy
+import time
 import socket
-from scheduler import GroupScheduler
-from csv_parser import get_csv, parse_student_data, parse_all_constraints
+from engines import create_scheduler
+from jobs import JobQueue
+from result_cache import ResultCache, schedule_fingerprint
+from diagnostics import PhaseTimer, Metrics
+from roster_store import RosterStore, roster_info
+from batch import schedule_sections, schedule_variants, pool_size, solver_threads
+import worker_pool
+from result_format import RESPONSE_FORMATS, EXPORT_FORMATS, render_schedule, stream_csv, stream_ndjson
+from csv_parser import (open_csv_stream, open_csv_streams, split_sections, parse_student_rows, parse_all_constraints, parse_scheduler_options,
+                        parse_previous_schedule, parse_sweep, SWEEP_FIELDS)
 
 app = Flask(__name__)
 CORS(app)
 
+job_queue = JobQueue(max_workers=int(os.environ['SMARTGROUPS_JOB_WORKERS']) if os.environ.get('SMARTGROUPS_JOB_WORKERS') else None)
+
+# repeat uploads of the same sheet with the same settings are answered from here instead of solving again
+# (SMARTGROUPS_CACHE_DIR adds an on-disk tier that survives restarts)
+result_cache = ResultCache(max_entries=int(os.environ.get('SMARTGROUPS_CACHE_SIZE', 128)),
+                           cache_dir=os.environ.get('SMARTGROUPS_CACHE_DIR') or None,
+                           max_disk_bytes=int(float(os.environ.get('SMARTGROUPS_CACHE_MAX_MB', 256)) * 1024 * 1024))
+
+# per-phase timings, model sizes and outcomes of every schedule request, served at /api/metrics
+metrics = Metrics()
+
+# sections / variants that /api/batch and /api/sweep solve side by side (defaults to the number of cores, fewer while
+# the solve slots are busy)
+batch_workers = int(os.environ['SMARTGROUPS_BATCH_WORKERS']) if os.environ.get('SMARTGROUPS_BATCH_WORKERS') else None
+
+# rosters uploaded once with /api/rosters and scheduled by id afterwards
+# (SMARTGROUPS_ROSTER_DIR keeps them on disk so they survive restarts)
+roster_store = RosterStore(max_entries=int(os.environ.get('SMARTGROUPS_ROSTER_SIZE', 32)),
+                           store_dir=os.environ.get('SMARTGROUPS_ROSTER_DIR') or None)
+
+# limits for serving many users at once (all off unless set; wsgi.py sets production defaults):
+# SMARTGROUPS_MAX_UPLOAD_MB caps the request body, SMARTGROUPS_MAX_SOLVES caps how many solving requests this process
+# works on at once (the rest get a 503 straight away, so health checks and job polls always find a free thread),
+# SMARTGROUPS_MAX_TIME_LIMIT caps (and fills in) every solve's time_limit, which bounds the solver's search (not reading
+# the upload or explaining an infeasible result), and
+# SMARTGROUPS_SOLVER_THREADS is the cp-sat search workers a solve gets unless the request says
+if os.environ.get('SMARTGROUPS_MAX_UPLOAD_MB'):
+    app.config['MAX_CONTENT_LENGTH'] = int(float(os.environ['SMARTGROUPS_MAX_UPLOAD_MB']) * 1024 * 1024)
+max_solves = int(os.environ['SMARTGROUPS_MAX_SOLVES']) if os.environ.get('SMARTGROUPS_MAX_SOLVES') else None
+# the same slots are taken by background jobs and by the extra sections / variants / time slots a request solves side
+# by side on the shared worker pool, so together they never run more than max_solves solves at once
+worker_pool.limit_solves(max_solves)
+max_time_limit = float(os.environ['SMARTGROUPS_MAX_TIME_LIMIT']) if os.environ.get('SMARTGROUPS_MAX_TIME_LIMIT') else None
+default_solver_threads = int(os.environ['SMARTGROUPS_SOLVER_THREADS']) if os.environ.get('SMARTGROUPS_SOLVER_THREADS') else None
+
+# the endpoints that run solves (or parse big uploads) and so count against SMARTGROUPS_MAX_SOLVES
+# (/api/jobs isn't one: its jobs wait in the queue for a slot of their own, and the queue has its own limit)
+SOLVE_ENDPOINTS = ('upload_csv', 'export_schedule', 'resolve_schedule', 'schedule_batch', 'sweep_constraints', 'upload_roster')
+
+@app.before_request
+def take_solve_slot():
+    """
+    claim one of this process's solve slots for a solving request, or turn it away with a 503 if they're all taken
+    the upload is parsed here too, so a body over SMARTGROUPS_MAX_UPLOAD_MB is a 413 before any work is done
+    """
+    if request.method != 'POST' or request.endpoint not in SOLVE_ENDPOINTS:
+        return None # cors preflights included
+    request.form # werkzeug reads (and size-checks) the whole multipart body on first access anyway
+    if max_solves is None:
+        return None
+    if not worker_pool.take_solve_slot():
+        response = jsonify({'error': 'The server is busy with other schedules right now. Please try again in a moment.'})
+        response.headers['Retry-After'] = str(int(max_time_limit or 10))
+        return response, 503
+    g.solve_slot = True
+    return None
+
+@app.teardown_request
+def release_solve_slot(error=None):
+    if g.pop('solve_slot', False):
+        worker_pool.release_solve_slot()
+    for _ in range(g.pop('extra_solve_slots', 0)):
+        worker_pool.release_solve_slot()
+
+def pool_workers(num_tasks):
+    """
+    how many of a request's num_tasks solves may run side by side: its own solve slot plus the ones free right now
+    (up to SMARTGROUPS_BATCH_WORKERS or the cores), held until the request ends
+    """
+    extra = worker_pool.take_extra_solve_slots(pool_size(num_tasks, batch_workers) - 1)
+    g.extra_solve_slots = g.get('extra_solve_slots', 0) + extra
+    return extra + 1
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    limit = round(app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024), 2)
+    return jsonify({'error': f'The upload is too large (the limit is {limit:g} MB).'}), 413
+
+def cap_time_limit(time_limit):
+    """a solve's time_limit after SMARTGROUPS_MAX_TIME_LIMIT (None = no limit)"""
+    if max_time_limit is None:
+        return time_limit
+    return min(time_limit or max_time_limit, max_time_limit)
+
+def read_schedule_request(request):
+    """
+    parse everything a scheduling request carries (csv or the roster_id of a stored roster, attributes, constraints, scheduler options)
+    returns a dict with either 'error' + 'status' or the pieces needed to run the scheduler
+    (plus a PhaseTimer with how long the parsing took, and whether the response should include diagnostics)
+    """
+    # request.files is a dictionary of the files the user uploaded
+    # request.form is a dictionary of the form data the user submitted
+
+    timer = PhaseTimer()
+    # a roster stored earlier with /api/rosters instead of a file: nothing to upload or parse
+    if read_option(request, 'roster_id'):
+        timer.start('load_roster')
+        roster = roster_store.get(read_option(request, 'roster_id'))
+        if roster is None:
+            return {'error': 'Roster not found (it may have been deleted, or the server restarted without a roster store folder). Please upload the file again.', 'status': 404}
+        # which columns are attributes was settled when the roster was uploaded
+        return prepare_schedule(roster, request, timer, roster['matrix'].attribute_names)
+
+    # decoding is streamed into the parser, so the two are timed together
+    timer.start('parse_csv')
+    csv_input = open_csv_stream(request)
+    if 'error' in csv_input:
+        return csv_input # this is an error message
+
+    return prepare_roster(csv.reader(csv_input['lines']), request, timer)
+
+def read_given_attributes(request):
+    """check for student attributes (if they exist)"""
+    if request.form.get('given_attributes'):
+        return [attr.strip().lower() for attr in request.form['given_attributes'].split(',')]
+    return []
+
+def prepare_roster(rows, request, timer, num_workers=None):
+    """
+    turn one roster's csv rows plus the request's settings into what the scheduler needs (see read_schedule_request)
+    num_workers: cp-sat search workers to use if the request doesn't say
+    """
+    given_attributes = read_given_attributes(request)
+
+    # parse the rows straight into the compact student matrix
+    timer.start('parse_csv')
+    results = parse_student_rows(rows, given_attributes)
+    if 'error' in results:
+        return results
+    return prepare_schedule(results, request, timer, given_attributes, num_workers)
+
+def prepare_schedule(results, request, timer, given_attributes, num_workers=None):
+    """the rest of prepare_roster, for a roster that's already parsed (results as parse_student_rows returns them)"""
+    matrix = results['matrix']
+    timer.start('parse_constraints')
+    constraints = parse_all_constraints(request, results['total_students'], matrix.num_time_slots, given_attributes)
+    constraints.time_limit = cap_time_limit(constraints.time_limit)
+    num_workers = num_workers or default_solver_threads
+    if num_workers and not constraints.num_workers:
+        constraints.num_workers = num_workers
+
+    # check the scheduler options up front so bad ones are a 400 rather than a failed solve
+    scheduler_options = parse_scheduler_options(request)
+    try:
+        create_scheduler(matrix, constraints, **scheduler_options)
+    except ValueError as e:
+        return {'error': str(e), 'status': 400}
+
+    response_format = read_option(request, 'response_format') or 'full'
+    if response_format not in RESPONSE_FORMATS:
+        return {'error': f"Unknown response_format '{response_format}' (expected one of: {', '.join(RESPONSE_FORMATS)})", 'status': 400}
+
+    timer.start('fingerprint')
+    cache_key = schedule_fingerprint(matrix, constraints, scheduler_options)
+    timer.stop()
+
+    return {
+        'matrix': matrix,
+        'constraints': constraints,
+        'scheduler_options': scheduler_options,
+        'cache_key': cache_key,
+        'unassigned_students': results['unassigned_students'],
+        'timer': timer,
+        'diagnostics': read_option(request, 'diagnostics') in ('1', 'yes', 'true'),
+        'response_format': response_format,
+        'status': 200
+    }
+
+def read_option(request, name):
+    """a response option, from the form or the query string (lowercased, '' if not given)"""
+    return (request.form.get(name) or request.args.get(name) or '').strip().lower()
+
+def read_batch_request(request):
+    """
+    split a batch request into its sections: one per uploaded file, or (with section_column) one per value of that
+    column in each file
+    returns {'sections': [(name, rows)], 'status': 200} or an error
+    """
+    csv_input = open_csv_streams(request)
+    if 'error' in csv_input:
+        return csv_input
+
+    section_column = request.form.get('section_column', '').strip()
+    several_files = len(csv_input['files']) > 1
+    sections = []
+    for filename, lines in csv_input['files']:
+        file_name = os.path.splitext(filename)[0]
+        if not section_column:
+            sections.append((file_name, csv.reader(lines)))
+            continue
+        split = split_sections(csv.reader(lines), section_column)
+        if 'error' in split:
+            return {'error': f"{filename}: {split['error']}", 'status': split['status']}
+        for section, rows in split['sections'].items():
+            sections.append((f'{file_name} / {section}' if several_files else section, rows))
+    return {'sections': sections, 'status': 200}
+
+def merge_diagnostics(request_phases, schedule):
+    """the schedule's diagnostics block (if it came from a solve) with the request's own phases (parsing etc.) in front"""
+    diagnostics = dict(schedule.get('diagnostics', {}))
+    diagnostics['phases'] = dict(request_phases, **diagnostics.get('phases', {}))
+    return diagnostics
+
+def record_schedule(schedule, schedule_request, endpoint):
+    """record a schedule for /api/metrics and keep its diagnostics block only if the request asked for it (diagnostics=true)"""
+    diagnostics = merge_diagnostics(schedule_request['timer'].as_dict(), schedule)
+    schedule.pop('diagnostics', None)
+    metrics.record(endpoint, schedule, diagnostics)
+    if schedule_request['diagnostics']:
+        schedule['diagnostics'] = diagnostics
+    return schedule
+
+def finish_schedule(schedule, schedule_request, endpoint):
+    """
+    last step before a schedule goes out: record it (see record_schedule) and render its students in the requested
+    response_format, unassigned group included
+    """
+    schedule = record_schedule(schedule, schedule_request, endpoint)
+    return render_schedule(schedule, schedule_request['matrix'], schedule_request['unassigned_students'], schedule_request['response_format'])
+
+def solve_or_cached(matrix, constraints, scheduler_options, cache_key, timer):
+    """run the scheduler unless the exact same request was answered before; marks the schedule as a cache hit or miss"""
+    timer.start('cache_lookup')
+    schedule = result_cache.get(cache_key)
+    timer.stop()
+    if schedule is not None:
+        schedule['cache'] = 'hit'
+        return schedule
+
+    scheduler = create_scheduler(matrix, constraints, **scheduler_options)
+    schedule = scheduler.schedule()
+    result_cache.put(cache_key, schedule)
+    schedule['cache'] = 'miss'
+    return schedule
+
+def add_min_moves(constraints):
+    """add 'move as few students as possible' to whatever the request already optimizes for"""
+    from scheduler import WEIGHTED_OBJECTIVE_TERMS # scheduler imports ortools, keep it out of startup (see engines.py)
+    objective, objective_weights = constraints.get_objective()
+    if objective in ('none', 'min_moves'):
+        constraints.set_objective('min_moves')
+    elif objective != 'weighted': # weighted already counts min_moves unless its weight was set to 0
+        constraints.set_objective('weighted', {term: 1 if term in (objective, 'min_moves') else 0 for term in WEIGHTED_OBJECTIVE_TERMS})
+
 @app.route('/api/upload', methods=['POST'])
 def upload_csv():
     """
     upload csv file, parse into list of constraints, 
     run through scheduler, and return the student schedule
     expected format of the csv is FirstName, LastName, some number of binary attributes, availabilities (each column is a available time, 1 if available 0 if not)
+    response_format=compact lists each group's students as indices into one top-level students table (see result_format.py)
+    """
+
+    try:
+        schedule_request = read_schedule_request(request)
+        if 'error' in schedule_request:
+            return jsonify({'error': schedule_request['error']}), schedule_request['status']
+
+        # run the scheduler
+        schedule = solve_or_cached(schedule_request['matrix'], schedule_request['constraints'], schedule_request['scheduler_options'],
+                                   schedule_request['cache_key'], schedule_request['timer'])
+
+        return jsonify(finish_schedule(schedule, schedule_request, 'upload'))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export', methods=['POST'])
+def export_schedule():
+    """
+    same input as /api/upload, but the schedule comes back as a file that's written out one group at a time instead of
+    one big json response: export_format=csv (default, the layout of examples/sample_result_sheets) or ndjson
+    (a summary line, then one line per group)
+    """
+    try:
+        export_format = read_option(request, 'export_format') or 'csv'
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f"Unknown export_format '{export_format}' (expected one of: {', '.join(EXPORT_FORMATS)})"}), 400
+
+        schedule_request = read_schedule_request(request)
+        if 'error' in schedule_request:
+            return jsonify({'error': schedule_request['error']}), schedule_request['status']
+
+        schedule = solve_or_cached(schedule_request['matrix'], schedule_request['constraints'], schedule_request['scheduler_options'],
+                                   schedule_request['cache_key'], schedule_request['timer'])
+        schedule = record_schedule(schedule, schedule_request, 'export')
+        if 'error' in schedule:
+            # nothing to export
+            return jsonify(schedule), 422
+
+        if export_format == 'csv':
+            rows = stream_csv(schedule, schedule_request['matrix'], schedule_request['unassigned_students'])
+            return Response(rows, mimetype='text/csv',
+                            headers={'Content-Disposition': 'attachment; filename=smart_groups_results.csv'})
+        lines = stream_ndjson(schedule, schedule_request['matrix'], schedule_request['unassigned_students'])
+        return Response(lines, mimetype='application/x-ndjson',
+                        headers={'Content-Disposition': 'attachment; filename=smart_groups_results.ndjson'})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/resolve', methods=['POST'])
+def resolve_schedule():
+    """
+    re-solve after a small change (a student added or dropped, an availability or a constraint changed)
+    same input as /api/upload plus previous_schedule (the json an earlier request returned); the solver starts from
+    the previous schedule and, unless minimize_moves is false, moves as few students out of their group as it can
     """
+    try:
+        schedule_request = read_schedule_request(request)
+        if 'error' in schedule_request:
+            return jsonify({'error': schedule_request['error']}), schedule_request['status']
+
+        previous = parse_previous_schedule(request)
+        if 'error' in previous:
+            return jsonify({'error': previous['error']}), previous['status']
+
+        scheduler_options = schedule_request['scheduler_options']
+        if scheduler_options.get('engine', 'cp_sat') != 'cp_sat':
+            return jsonify({'error': 'Re-solving from a previous schedule only works with the cp_sat engine'}), 400
 
+        from scheduler import assignment_from_groups
+        matrix = schedule_request['matrix']
+        constraints = schedule_request['constraints']
+        if request.form.get('minimize_moves', 'true').strip().lower() in ('1', 'yes', 'true'):
+            add_min_moves(constraints)
+        scheduler_options = dict(scheduler_options, hint=assignment_from_groups(matrix, previous['groups']))
+
+        timer = schedule_request['timer']
+        timer.start('fingerprint')
+        cache_key = schedule_fingerprint(matrix, constraints, scheduler_options)
+        schedule = solve_or_cached(matrix, constraints, scheduler_options, cache_key, timer)
+
+        return jsonify(finish_schedule(schedule, schedule_request, 'resolve'))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/batch', methods=['POST'])
+def schedule_batch():
+    """
+    schedule many sections in one request: several csv files under 'files' (one section each), and/or csvs with a
+    section column (section_column=<its header>) that get split into one roster per section
+    every section gets the same constraints; the solves run side by side on a pool of worker processes and the
+    response lists each section's schedule or error
+    """
     try:
-        # request.files is a dictionary of the files the user uploaded
-        # request.form is a dictionary of the form data the user submitted
+        start = time.perf_counter()
+        batch = read_batch_request(request)
+        if 'error' in batch:
+            return jsonify({'error': batch['error']}), batch['status']
+
+        # share the cores between the sections that solve at once
+        workers = pool_workers(len(batch['sections']))
+        sections = []
+        to_solve = []
+        for name, rows in batch['sections']:
+            section = prepare_roster(rows, request, PhaseTimer(), num_workers=solver_threads(workers))
+            section['name'] = name
+            sections.append(section)
+            if 'error' in section:
+                continue
+            section['timer'].start('cache_lookup')
+            cached = result_cache.get(section['cache_key'])
+            section['timer'].stop()
+            if cached is not None:
+                section['schedule'] = dict(cached, cache='hit')
+            else:
+                to_solve.append(section)
+
+        solved = schedule_sections([(section['matrix'], section['constraints'], section['scheduler_options']) for section in to_solve],
+                                   max_workers=workers)
+        for section, schedule in zip(to_solve, solved):
+            result_cache.put(section['cache_key'], schedule)
+            section['schedule'] = dict(schedule, cache='miss')
+
+        results = []
+        for section in sections:
+            if 'error' in section:
+                metrics.record('batch', section, {})
+                results.append({'section': section['name'], 'status': 'error', 'error': section['error']})
+                continue
+            schedule = finish_schedule(section['schedule'], section, 'batch')
+            entry = {'section': section['name'], 'status': 'error' if 'error' in schedule else 'ok', 'result': schedule}
+            if 'error' in schedule:
+                entry['error'] = schedule['error']
+            results.append(entry)
+
+        failed = sum(1 for entry in results if entry['status'] == 'error')
+        return jsonify({
+            'sections': results,
+            'total_sections': len(results),
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'wall_time': time.perf_counter() - start
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def constraints_for_variant(constraints, variant, time_limit):
+    """copy of constraints with one sweep variant's values (and the per-variant time limit) filled in"""
+    constraints = copy.deepcopy(constraints)
+    for field, value in variant.items():
+        if field in SWEEP_FIELDS:
+            # 0 means the default, as it does for the request's own fields (at least 1 / no upper bound)
+            setattr(constraints, field, value or (1 if field.endswith('_min') else None))
+            continue
+        for bound in ('min_per_group', 'max_per_group'):
+            if field.endswith(f'_{bound}'):
+                constraints.attribute_constraints.setdefault(field[:-len(bound) - 1], {})[bound] = value
+    if time_limit:
+        constraints.time_limit = cap_time_limit(time_limit)
+    return constraints
+
+def variant_summary(variant, schedule):
+    """one row of the sweep table: is the variant feasible, and how good is what came out"""
+    summary = {
+        'variant': variant,
+        # presolve's 'reasons' are a proof there's no schedule, same as cp-sat's INFEASIBLE
+        'status': schedule.get('solver_status') or ('INFEASIBLE' if 'reasons' in schedule else 'ERROR' if 'error' in schedule else 'OK'),
+        'feasible': 'error' not in schedule,
+        'cache': schedule.get('cache')
+    }
+    solve_stats = schedule.get('solve_stats', {})
+    if 'wall_time' in solve_stats:
+        summary['wall_time'] = solve_stats['wall_time']
+    if 'diagnostics' in schedule: # only there with diagnostics=true
+        summary['diagnostics'] = schedule['diagnostics']
+    if 'error' in schedule:
+        summary['error'] = schedule['error']
+        return summary
+
+    sizes = [group['size'] for group in schedule['groups']]
+    summary.update(total_groups=len(sizes), smallest_group=min(sizes), largest_group=max(sizes), size_spread=max(sizes) - min(sizes))
+    if 'objective_value' in solve_stats:
+        summary['objective_value'] = solve_stats['objective_value']
+    if 'total_violation' in schedule:
+        summary['total_violation'] = schedule['total_violation']
+    return summary
+
+def best_variant(summaries):
+    """
+    index of the nicest feasible variant: least soft constraint violation, then lowest objective value (if the request
+    optimizes something), then the most even group sizes, then proven optimal before merely feasible, then sweep order;
+    None if nothing was feasible
+    """
+    feasible = [i for i, summary in enumerate(summaries) if summary['feasible']]
+    if not feasible:
+        return None
+    return min(feasible, key=lambda i: (summaries[i].get('total_violation', 0), summaries[i].get('objective_value', 0), summaries[i]['size_spread'],
+                                        summaries[i]['status'] != 'OPTIMAL', i))
+
+@app.route('/api/sweep', methods=['POST'])
+def sweep_constraints():
+    """
+    try a grid of constraint variants in one request: same input as /api/upload (a file or a roster_id) plus 'sweep', a
+    json object of field -> values to try, e.g. {"group_size_min": [3, 4], "group_size_max": [5, 6]} (see parse_sweep)
+    every combination is solved, side by side on a pool of worker processes with variant_time_limit seconds each;
+    the response is a table of which variants are feasible and how even / how good their schedules are, plus the
+    full schedule of the best one
+    """
+    try:
+        start = time.perf_counter()
+        schedule_request = read_schedule_request(request)
+        if 'error' in schedule_request:
+            return jsonify({'error': schedule_request['error']}), schedule_request['status']
+
+        matrix = schedule_request['matrix']
+        scheduler_options = schedule_request['scheduler_options']
+        sweep = parse_sweep(request, matrix.attribute_names)
+        if 'error' in sweep:
+            return jsonify({'error': sweep['error']}), sweep['status']
+
+        # share the cores between the variants that solve at once
+        workers = pool_workers(len(sweep['variants']))
+        variants = []
+        to_solve = []
+        for variant in sweep['variants']:
+            constraints = constraints_for_variant(schedule_request['constraints'], variant, sweep['time_limit'])
+            if not constraints.num_workers:
+                constraints.num_workers = solver_threads(workers)
+            cache_key = schedule_fingerprint(matrix, constraints, scheduler_options)
+            entry = {'constraints': constraints, 'cache_key': cache_key, 'schedule': result_cache.get(cache_key)}
+            if entry['schedule'] is not None:
+                entry['schedule']['cache'] = 'hit'
+            else:
+                to_solve.append(entry)
+            variants.append(entry)
+
+        solved = schedule_variants(matrix, [entry['constraints'] for entry in to_solve], scheduler_options, max_workers=workers)
+        for entry, schedule in zip(to_solve, solved):
+            result_cache.put(entry['cache_key'], schedule)
+            entry['schedule'] = dict(schedule, cache='miss')
 
-        csv_input = get_csv(request)
+        summaries = []
+        for variant, entry in zip(sweep['variants'], variants):
+            schedule = record_schedule(entry['schedule'], schedule_request, 'sweep')
+            summaries.append(variant_summary(variant, schedule))
+
+        best = best_variant(summaries)
+        response = {
+            'variants': summaries,
+            'total_variants': len(summaries),
+            'feasible_variants': sum(1 for summary in summaries if summary['feasible']),
+            'best_variant': best,
+            'best': None,
+            'wall_time': time.perf_counter() - start
+        }
+        if best is not None:
+            response['best'] = render_schedule(variants[best]['schedule'], matrix, schedule_request['unassigned_students'],
+                                               schedule_request['response_format'])
+        return jsonify(response)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    same input as /api/upload, but the solve runs in the background on the job queue;
+    returns a job id to poll with GET /api/jobs/<id> (or cancel with DELETE)
+    """
+    try:
+        schedule_request = read_schedule_request(request)
+        if 'error' in schedule_request:
+            return jsonify({'error': schedule_request['error']}), schedule_request['status']
+
+        cache_key = schedule_request['cache_key']
+        timer = schedule_request['timer']
+        timer.start('cache_lookup')
+        cached = result_cache.get(cache_key)
+        timer.stop()
+        context = {'matrix': schedule_request['matrix'], 'unassigned_students': schedule_request['unassigned_students'],
+                   'response_format': schedule_request['response_format'], 'diagnostics': schedule_request['diagnostics'],
+                   'request_phases': timer.as_dict()}
+        if cached is not None:
+            # answered before: hand out a job that's already done so clients poll it the usual way
+            metrics.record('jobs', dict(cached, cache='hit'), merge_diagnostics(context['request_phases'], cached))
+            job_id = job_queue.add_finished(cached, context=dict(context, cache='hit'))
+            return jsonify({'job_id': job_id, 'status': 'done'}), 202
+
+        def job_finished(result):
+            result_cache.put(cache_key, result)
+            metrics.record('jobs', dict(result, cache='miss'), merge_diagnostics(context['request_phases'], result))
+
+        job_id = job_queue.submit(schedule_request['matrix'], schedule_request['constraints'], schedule_request['scheduler_options'],
+                                  context=dict(context, cache='miss'), on_result=job_finished)
+        if job_id is None:
+            return jsonify({'error': 'Too many scheduling jobs are running right now. Please try again in a moment.'}), 503
+
+        return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    info = job_queue.status(job_id)
+    if info is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if 'result' in info:
+        context = job_queue.get(job_id).context
+        result = info['result']
+        diagnostics = merge_diagnostics(context['request_phases'], result)
+        result.pop('diagnostics', None)
+        if context['diagnostics']:
+            result['diagnostics'] = diagnostics
+        info['result'] = render_schedule(result, context['matrix'], context['unassigned_students'], context['response_format'])
+        info['result']['cache'] = context['cache']
+    return jsonify(info)
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if not job_queue.cancel(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_queue.status(job_id))
+
+@app.route('/api/rosters', methods=['POST'])
+def upload_roster():
+    """
+    upload and parse a csv once (file + given_attributes, same format as /api/upload) and keep it; returns a roster_id
+    that /api/upload, /api/resolve, /api/export and /api/jobs accept instead of a file, so only the constraints have to be
+    sent again while tuning them
+    """
+    try:
+        csv_input = open_csv_stream(request)
         if 'error' in csv_input:
-            return jsonify({'error': csv_input['error']}), csv_input['status'] # this is an error message
-            
-        # check for student attributes (if they exist)
-        given_attributes = []
-        if request.form.get('given_attributes'):
-            given_attributes = [attr.strip().lower() for attr in request.form['given_attributes'].split(',')]
-        
-        # get the data as df
-        data = csv_input['data'] # get the data
-        results = parse_student_data(data, given_attributes)
+            return jsonify({'error': csv_input['error']}), csv_input['status']
+
+        results = parse_student_rows(csv.reader(csv_input['lines']), read_given_attributes(request))
         if 'error' in results:
             return jsonify({'error': results['error']}), results['status']
-        
-        df = results['df']
-        student_names = results['student_names']
-        student_attributes = results['student_attributes']
-        student_availabilities = results['student_availabilities']
-        unassigned_students = results['unassigned_students']
 
-        constraints = parse_all_constraints(request, len(df), len(student_availabilities[0]), given_attributes)
+        return jsonify(roster_info(roster_store.add(results), results)), 201
 
-        # run the scheduler
-        student_data = {
-            'names': student_names,  
-            'attributes': student_attributes,
-            'availabilities': student_availabilities
-        }
-        
-        scheduler = GroupScheduler(student_data, constraints)
-        schedule = scheduler.schedule()
-
-        # add unassigned students to the response if any exist
-        if 'error' not in schedule and unassigned_students:
-            groups_list = list(schedule.get('groups', []))  # type: ignore
-            
-            # add unassigned group
-            groups_list.append({  # type: ignore
-                'group_id': len(groups_list) + 1,
-                'time_slot': 'Unassigned - no availabilities',
-                'students': unassigned_students,
-                'size': len(unassigned_students),
-                'is_unassigned': True
-            })
-            
-            schedule['groups'] = groups_list  # type: ignore
-            
-            # update total students count
-            total_students = int(schedule.get('total_students', 0))
-            schedule['total_students'] = total_students + len(unassigned_students)  # type: ignore
-
-        return jsonify(schedule)
-    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/rosters/<roster_id>', methods=['GET'])
+def get_roster(roster_id):
+    roster = roster_store.get(roster_id)
+    if roster is None:
+        return jsonify({'error': 'Roster not found'}), 404
+    return jsonify(roster_info(roster_id, roster))
+
+@app.route('/api/rosters/<roster_id>', methods=['DELETE'])
+def delete_roster(roster_id):
+    if not roster_store.delete(roster_id):
+        return jsonify({'error': 'Roster not found'}), 404
+    return jsonify({'roster_id': roster_id, 'deleted': True})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'smart groups is running / works'})
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    totals since this process started: requests per endpoint, outcomes, cache hits and misses, seconds per phase
+    (parsing, model building, solving, ...), model sizes and cp-sat search counters
+    """
+    return jsonify(metrics.snapshot())
+
 # def find_available_port(start_port=5000):
 #     """find the first available port starting from start_port"""
 #     port = start_port
@@ -94,9 +657,9 @@ def health_check():
 #     raise RuntimeError("No available ports found")
 
 if __name__ == '__main__':
-    port = 5013 #find_available_port() # find first available port
+    # development server for running it locally (run.sh); see wsgi.py for serving many users
+    port = int(os.environ.get('SMARTGROUPS_PORT', 5013)) #find_available_port() # find first available port
     
-    import os
     os.makedirs('../frontend/src/', exist_ok=True)
     
     with open('../frontend/src/backend-port.txt', 'w') as f:
@@ -0,0 +1,81 @@
+import os
+import pickle
+import uuid
+from engines import create_scheduler
+import worker_pool
+
+def _solve_section(matrix, constraints, scheduler_options):
+    """runs in a worker process: schedule one section"""
+    return create_scheduler(matrix, constraints, **scheduler_options).schedule()
+
+def pool_size(num_sections, max_workers=None):
+    """how many worker processes a batch of num_sections gets (one per core, never more than there are sections)"""
+    return max(1, min(max_workers or os.cpu_count() or 1, num_sections))
+
+def solver_threads(workers):
+    """
+    cp-sat search workers per section when workers sections solve at once, so together they fill the cores instead
+    of each one starting a full set of threads
+    """
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def schedule_sections(tasks, max_workers=None):
+    """
+    solve many independent rosters side by side on the shared pool of worker processes
+    tasks: list of (matrix, constraints, scheduler_options), one per section
+    max_workers: sections solving at once (defaults to the number of cores, 1 = solve them one by one in this process)
+    returns the schedule dicts in task order; a section whose solve crashed gets an error dict instead
+    """
+    workers = pool_size(len(tasks), max_workers)
+    if workers <= 1:
+        results = []
+        for matrix, constraints, scheduler_options in tasks:
+            try:
+                results.append(_solve_section(matrix, constraints, scheduler_options))
+            except Exception as e:
+                results.append({'error': f'Scheduling this section failed: {e}'})
+        return results
+
+    results = []
+    for future in worker_pool.run_all(_solve_section, tasks, workers):
+        try:
+            results.append(future.result())
+        except Exception as e: # includes a worker process dying
+            results.append({'error': f'Scheduling this section failed: {e}'})
+    return results
+
+# the last sweep's roster in this worker process, unpickled once however many of its variants the worker solves
+_shared_roster = {}
+
+def _solve_variant(roster_key, roster, constraints):
+    """runs in a worker process: schedule a sweep's roster (pickled (matrix, scheduler_options)) under one constraint variant"""
+    if _shared_roster.get('key') != roster_key:
+        _shared_roster['matrix'], _shared_roster['scheduler_options'] = pickle.loads(roster)
+        _shared_roster['key'] = roster_key
+    return create_scheduler(_shared_roster['matrix'], constraints, **_shared_roster['scheduler_options']).schedule()
+
+def schedule_variants(matrix, variants, scheduler_options, max_workers=None):
+    """
+    solve one roster under many constraint variants side by side (a parameter sweep)
+    variants: list of SchedulingConstraints; the roster is pickled once, and each worker process unpickles it once
+    returns the schedule dicts in variant order; a variant whose solve crashed gets an error dict instead
+    """
+    workers = pool_size(len(variants), max_workers)
+    if workers <= 1:
+        results = []
+        for constraints in variants:
+            try:
+                results.append(_solve_section(matrix, constraints, scheduler_options))
+            except Exception as e:
+                results.append({'error': f'Scheduling this variant failed: {e}'})
+        return results
+
+    roster = pickle.dumps((matrix, scheduler_options), protocol=pickle.HIGHEST_PROTOCOL)
+    roster_key = uuid.uuid4().hex
+    results = []
+    for future in worker_pool.run_all(_solve_variant, [(roster_key, roster, constraints) for constraints in variants], workers):
+        try:
+            results.append(future.result())
+        except Exception as e: # includes a worker process dying
+            results.append({'error': f'Scheduling this variant failed: {e}'})
+    return results
@@ -0,0 +1,246 @@
+"""
+benchmark harness for the parser and the scheduler on synthetic rosters (see roster_generator.py)
+records parse, model-build and solve times, model size and peak memory after each phase per case and writes them as json,
+so runs from two revisions can be compared
+
+usage (from the backend folder):
+    python benchmark.py -o before.json                      # default suite
+    python benchmark.py --students 500 2000 --slots 12 --tightness medium tight --engine cp_sat decompose -o after.json
+    python benchmark.py --compare before.json after.json    # exits with 1 if anything got slower than --threshold
+"""
+import io
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+from roster_generator import generate_roster, roster_csv, constraint_form, TIGHTNESS_LEVELS
+
+try:
+    import resource
+except ImportError: # windows: no peak memory numbers
+    resource = None
+
+DEFAULT_SUITE = {
+    'students': [100, 500, 2000],
+    'slots': [10],
+    'tightness': ['loose', 'tight'],
+    'engine': ['cp_sat']
+}
+
+# numbers --compare looks at (lower is better for all of them)
+COMPARED_METRICS = ('parse_seconds', 'build_seconds', 'solve_seconds', 'schedule_seconds', 'parse_rss_mb', 'peak_rss_mb')
+
+def _peak_rss_mb(who=None):
+    """peak resident memory so far of this process (or of its finished child processes)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # linux reports kilobytes, macos bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def case_roster(case):
+    """the case's csv (bytes) and the form fields a request for it would send"""
+    data = roster_csv(generate_roster(case['students'], case['slots'], case['attributes'], case['attribute_density'],
+                                      case['availability'], seed=case['seed']))
+    form = constraint_form(case['tightness'], case['students'], case['attributes'])
+    form['engine'] = case['engine']
+    if case.get('time_limit'):
+        form['time_limit'] = str(case['time_limit'])
+    return data, form
+
+def run_case(case):
+    """
+    one benchmark case; runs in its own worker process so the peak memory belongs to this case alone
+    case: dict with students, slots, attributes, attribute_density, availability, tightness, engine, time_limit, seed
+    peak memory is read after parsing (parse_rss_mb) and again after scheduling (peak_rss_mb), it only ever goes up
+    """
+    import worker_pool
+    from csv_parser import decode_lines, parse_student_stream, parse_all_constraints, parse_scheduler_options
+    from engines import create_scheduler
+    # this process runs no other threads, so forking is safe here, and forked workers (decomposed slots) stay its
+    # children, so their memory shows up in peak_child_rss_mb once they're shut down
+    worker_pool.start_method = 'fork'
+
+    data, form = case_roster(case)
+    request = SimpleNamespace(form=form) # all the parse_* helpers need from a flask request
+    given_attributes = [attr.strip().lower() for attr in form['given_attributes'].split(',')]
+    record = {'name': case_name(case), 'case': case, 'csv_bytes': len(data), 'baseline_rss_mb': _peak_rss_mb()}
+
+    start = time.perf_counter()
+    parsed = parse_student_stream(decode_lines(io.BytesIO(data)), given_attributes)
+    record['parse_seconds'] = time.perf_counter() - start
+    record['parse_rss_mb'] = _peak_rss_mb()
+    if 'error' in parsed:
+        record['error'] = parsed['error']
+        return record
+
+    matrix = parsed['matrix']
+    constraints = parse_all_constraints(request, parsed['total_students'], matrix.num_time_slots, given_attributes)
+    scheduler = create_scheduler(matrix, constraints, **parse_scheduler_options(request))
+
+    start = time.perf_counter()
+    result = scheduler.schedule()
+    record['schedule_seconds'] = time.perf_counter() - start
+
+    # schedule() times its own phases (building_model, solving, ...) and counts the model's size
+    diagnostics = result.get('diagnostics', {})
+    phase_seconds = diagnostics.get('phases', {})
+    record['phase_seconds'] = phase_seconds
+    record['build_seconds'] = phase_seconds.get('building_model', 0)
+    record['solve_seconds'] = phase_seconds.get('solving', 0) + phase_seconds.get('assigning_time_slots', 0)
+    record['num_variables'] = diagnostics.get('model', {}).get('num_variables')
+    record['num_constraints'] = diagnostics.get('model', {}).get('num_constraints')
+    record['status'] = result.get('solver_status', 'ERROR' if 'error' in result else None)
+    record['num_groups'] = result.get('total_groups')
+    if 'error' in result:
+        record['error'] = result['error']
+
+    record['peak_rss_mb'] = _peak_rss_mb()
+    worker_pool.shutdown()
+    if resource is not None and _peak_rss_mb(resource.RUSAGE_CHILDREN):
+        record['peak_child_rss_mb'] = _peak_rss_mb(resource.RUSAGE_CHILDREN) # decomposed slots ran in their own processes
+    return record
+
+def time_pandas_parse(case):
+    """
+    the old pandas parser on the same roster, for comparison; runs in a process of its own so neither its time nor
+    its memory (pandas included) ends up in the case's numbers
+    """
+    from csv_parser import parse_student_data
+    data, form = case_roster(case)
+    given_attributes = [attr.strip().lower() for attr in form['given_attributes'].split(',')]
+    try:
+        start = time.perf_counter()
+        parse_student_data(list(csv.reader(io.StringIO(data.decode('utf-8')))), given_attributes)
+        return {'parse_pandas_seconds': time.perf_counter() - start, 'parse_pandas_rss_mb': _peak_rss_mb()}
+    except ImportError:
+        return {'parse_pandas_seconds': None}
+
+def case_name(case):
+    return f"{case['students']}x{case['slots']}-{case['tightness']}-{case['engine']}"
+
+def build_cases(args):
+    cases = []
+    for students in args.students:
+        for slots in args.slots:
+            for tightness in args.tightness:
+                for engine in args.engine:
+                    cases.append({
+                        'students': students, 'slots': slots, 'attributes': args.attributes,
+                        'attribute_density': args.attribute_density, 'availability': args.availability,
+                        'tightness': tightness, 'engine': engine, 'time_limit': args.time_limit, 'seed': args.seed
+                    })
+    return cases
+
+def environment():
+    """what the numbers were measured on, so comparisons between machines or revisions can be told apart"""
+    info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        info['git_revision'] = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+        info['git_dirty'] = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here,
+                                                capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        info['git_revision'] = None
+    for package in ('ortools', 'numpy', 'pandas'):
+        try:
+            info[f'{package}_version'] = __import__(package).__version__
+        except ImportError:
+            info[f'{package}_version'] = None
+    return info
+
+def run_suite(cases, repeat=1, report=print):
+    """run every case repeat times, each in a fresh process"""
+    records = []
+    # max_tasks_per_child=1 so no case inherits another's memory high-water mark
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        for case in cases:
+            for run in range(repeat):
+                record = executor.submit(run_case, case).result()
+                record.update(executor.submit(time_pandas_parse, case).result())
+                record['run'] = run
+                records.append(record)
+                report(f"{record['name']} run {run + 1}/{repeat}: parse {record['parse_seconds']:.3f}s, "
+                       f"build {record.get('build_seconds', 0):.3f}s, solve {record.get('solve_seconds', 0):.3f}s, "
+                       f"status {record.get('status')}, peak {record.get('peak_rss_mb')} MB")
+    return records
+
+def summarize(records):
+    """median of every compared metric per case name"""
+    by_name = {}
+    for record in records:
+        by_name.setdefault(record['name'], []).append(record)
+    summary = {}
+    for name, runs in by_name.items():
+        summary[name] = {}
+        for metric in COMPARED_METRICS:
+            values = [run[metric] for run in runs if run.get(metric) is not None]
+            summary[name][metric] = statistics.median(values) if values else None
+    return summary
+
+def compare(old_path, new_path, threshold, report=print):
+    """print new/old ratios per case and metric; returns True if nothing got worse by more than threshold"""
+    with open(old_path) as f:
+        old = summarize(json.load(f)['results'])
+    with open(new_path) as f:
+        new = summarize(json.load(f)['results'])
+
+    ok = True
+    report(f"{'case':<32}{'metric':<18}{'old':>10}{'new':>10}{'new/old':>9}")
+    for name in sorted(set(old) & set(new)):
+        for metric in COMPARED_METRICS:
+            before, after = old[name][metric], new[name][metric]
+            if before is None or after is None:
+                continue
+            ratio = after / before if before else float('inf') if after else 1.0
+            worse = ratio > threshold
+            ok = ok and not worse
+            report(f"{name:<32}{metric:<18}{before:>10.3f}{after:>10.3f}{ratio:>8.2f}x{' !' if worse else ''}")
+    for name in sorted(set(old) ^ set(new)):
+        report(f"{name:<32}only in {'old' if name in old else 'new'} results")
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark the SmartGroups parser and scheduler on synthetic rosters')
+    parser.add_argument('--students', type=int, nargs='+', default=DEFAULT_SUITE['students'])
+    parser.add_argument('--slots', type=int, nargs='+', default=DEFAULT_SUITE['slots'])
+    parser.add_argument('--tightness', nargs='+', choices=TIGHTNESS_LEVELS, default=DEFAULT_SUITE['tightness'])
+    parser.add_argument('--engine', nargs='+', default=DEFAULT_SUITE['engine'])
+    parser.add_argument('--attributes', type=int, default=2)
+    parser.add_argument('--attribute-density', type=float, default=0.3)
+    parser.add_argument('--availability', type=float, default=0.4)
+    parser.add_argument('--time-limit', type=float, default=60, help='cp-sat time limit per solve in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='runs per case (compare uses the median)')
+    parser.add_argument('-o', '--output', help='json file to write (default: stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=1.2, help='new/old ratio that counts as a regression in --compare')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        sys.exit(0 if compare(args.compare[0], args.compare[1], args.threshold) else 1)
+
+    # progress goes to stderr so stdout stays clean json
+    records = run_suite(build_cases(args), args.repeat, report=lambda line: print(line, file=sys.stderr))
+    output = {'environment': environment(), 'results': records, 'summary': summarize(records)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,22 @@
 # parse the csv file into list of constraints
 
 class SchedulingConstraints:
-    def __init__(self, attribute_constraints = None, group_size_min = None, group_size_max = None, group_count_min = None, group_count_max = None, combined_constraints = None):
+    def __init__(self, attribute_constraints = None, group_size_min = None, group_size_max = None, group_count_min = None, group_count_max = None, combined_constraints = None,
+                 time_limit = None, num_workers = None, random_seed = None, relative_gap = None, objective = None, objective_weights = None):
         self.attribute_constraints = attribute_constraints or {}
         self.group_size_min = group_size_min or 1
         self.group_size_max = group_size_max or None
         self.group_count_min = group_count_min or 1
         self.group_count_max = group_count_max or None
         self.combined_constraints = combined_constraints or []
+        # solver settings (None = let cp-sat use its default)
+        self.time_limit = time_limit or None # seconds
+        self.num_workers = num_workers or None
+        self.random_seed = random_seed
+        self.relative_gap = relative_gap
+        # what to optimize ('none' = any valid schedule will do); weights are only used by the 'weighted' objective
+        self.objective = objective or 'none'
+        self.objective_weights = objective_weights or {}
 
     def set_attribute_constraints(self, attribute_constraints):
         self.attribute_constraints = attribute_constraints
@@ -23,6 +32,16 @@ class SchedulingConstraints:
     def set_combined_constraints(self, combined_constraints):
         self.combined_constraints = combined_constraints
 
+    def set_solver_parameters(self, time_limit = None, num_workers = None, random_seed = None, relative_gap = None):
+        self.time_limit = time_limit
+        self.num_workers = num_workers
+        self.random_seed = random_seed
+        self.relative_gap = relative_gap
+
+    def set_objective(self, objective, objective_weights = None):
+        self.objective = objective
+        self.objective_weights = objective_weights or {}
+
     def get_attribute_constraints(self):
         return self.attribute_constraints
 
@@ -31,10 +50,25 @@ class SchedulingConstraints:
 
     def get_group_count_constraints(self):
         return self.group_count_min, self.group_count_max
-        
+
     def get_combined_constraints(self):
         return self.combined_constraints
-        
-    
-    
 
+    def get_solver_parameters(self):
+        return {
+            'time_limit': self.time_limit,
+            'num_workers': self.num_workers,
+            'random_seed': self.random_seed,
+            'relative_gap': self.relative_gap
+        }
+
+    def get_objective(self):
+        return self.objective, self.objective_weights
+
+    # attribute and combined constraints marked 'soft' (with an optional 'weight', default 1) may be broken at a cost
+    # instead of ruling a schedule out; these two leave them out, for the code that only deals with rules that must hold
+    def get_hard_attribute_constraints(self):
+        return {attr: cons for attr, cons in self.attribute_constraints.items() if not cons.get('soft')}
+
+    def get_hard_combined_constraints(self):
+        return [combined for combined in self.combined_constraints if not combined.get('soft')]
@@ -1,10 +1,23 @@
 import io
 import csv
-import pandas as pd
+import codecs
+import numpy as np
 from constraint_parser import SchedulingConstraints
+from student_matrix import StudentMatrix, is_truthy
 import json
 
-def get_csv(request):
+# how many bytes of the upload get decoded at a time when streaming
+CSV_CHUNK_SIZE = 64 * 1024
+
+# SchedulingConstraints fields a parameter sweep can vary (plus <attribute>_min_per_group / _max_per_group)
+SWEEP_FIELDS = ('group_size_min', 'group_size_max', 'group_count_min', 'group_count_max')
+# most variants one sweep request may ask for
+MAX_SWEEP_VARIANTS = 64
+
+def open_csv_stream(request):
+    """
+    check the request has a file and hand back an iterator over its decoded lines, without reading the whole file at once
+    """
     if 'file' not in request.files:
         return {'error': 'No file part', 'status': 400}
 
@@ -12,11 +25,37 @@ def get_csv(request):
 
     if file.filename == '':
         return {'error': 'No selected file', 'status': 400}
-    
-    stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-    csv_input = list(csv.reader(stream)) # csv_input is a list of lists, each inner list is a row
-    
-    return {'data': csv_input, 'status': 200}
+
+    return {'lines': decode_lines(file.stream), 'status': 200}
+
+def open_csv_streams(request):
+    """
+    open_csv_stream for requests that carry several files (batch scheduling): every file under 'files' (and 'file')
+    returns {'files': [(filename, lines)], 'status': 200} or an error
+    """
+    files = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+    if not files:
+        return {'error': 'No file part', 'status': 400}
+    return {'files': [(file.filename, decode_lines(file.stream)) for file in files], 'status': 200}
+
+def decode_lines(binary_stream, chunk_size=CSV_CHUNK_SIZE):
+    """
+    decode a binary stream chunk by chunk and yield its lines (newlines normalized like io.StringIO(newline=None))
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    while True:
+        chunk = binary_stream.read(chunk_size)
+        pending += decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            break
+        # only hand over complete lines; the rest waits for the next chunk
+        end = pending.rfind('\n') + 1
+        if end:
+            yield from io.StringIO(pending[:end], newline=None)
+            pending = pending[end:]
+    if pending:
+        yield from io.StringIO(pending, newline=None)
 
 def find_name_indices(headers_lower):
     """
@@ -45,8 +84,11 @@ def find_data_attributes(headers_lower, name_indices, student_attributes):
     availabilities_indices = [i for i, header in enumerate(headers_lower) if i not in name_indices and i not in attributes_indices]
     return attributes_indices, availabilities_indices
 
-def parse_student_data(data, given_attributes):
-    headers_lower = [str(header).strip().lower() for header in data[0]] # first row of data is headers, make lower case and strip whitespace
+def check_headers(header_row, given_attributes):
+    """
+    validate the header row and work out which columns are names, attributes and availabilities
+    """
+    headers_lower = [str(header).strip().lower() for header in header_row] # make lower case and strip whitespace
 
     # check that the name column(s) exist, and figure out which ones they are
     name_indices = find_name_indices(headers_lower)
@@ -60,6 +102,119 @@ def parse_student_data(data, given_attributes):
 
     # get attributes and availabilities indices
     attribute_indices, availability_indices = find_data_attributes(headers_lower, name_indices, given_attributes)
+    return {
+        'headers_lower': headers_lower,
+        'name_indices': name_indices,
+        'attribute_indices': attribute_indices,
+        'availability_indices': availability_indices,
+    }
+
+def split_sections(rows, section_column):
+    """
+    split one roster with a section column into a roster per section (header row first, section column dropped),
+    in order of first appearance; rows with an empty section cell end up in 'No section'
+    returns {'sections': {section: rows}, 'status': 200} or an error
+    """
+    rows = iter(rows)
+    header_row = next(rows, None)
+    if header_row is None:
+        return {'error': 'The CSV file is empty.', 'status': 400}
+
+    headers_lower = [str(header).strip().lower() for header in header_row]
+    if section_column.strip().lower() not in headers_lower:
+        return {'error': f'section column {section_column} not found in the csv file. please check the format and try again.', 'status': 400}
+    index = headers_lower.index(section_column.strip().lower())
+
+    header_row = header_row[:index] + header_row[index + 1:]
+    sections = {}
+    for row in rows:
+        if not row:
+            continue # blank line
+        section = row[index].strip() if index < len(row) else ''
+        sections.setdefault(section or 'No section', [header_row]).append(row[:index] + row[index + 1:])
+    return {'sections': sections, 'status': 200}
+
+def parse_student_stream(lines, given_attributes):
+    """
+    single pass, pandas-free version of parse_student_data: reads csv lines one row at a time,
+    normalizes the 0/1 (Yes/No/True/False) cells as it goes and packs them straight into a StudentMatrix,
+    setting aside students with no availability along the way
+    """
+    return parse_student_rows(csv.reader(lines), given_attributes)
+
+def parse_student_rows(rows, given_attributes):
+    """parse_student_stream for rows that are already split into cells (e.g. one section of a batch upload)"""
+    reader = iter(rows)
+    header_row = next(reader, None)
+    if header_row is None:
+        return {'error': 'The CSV file is empty.', 'status': 400}
+
+    columns = check_headers(header_row, given_attributes)
+    if 'error' in columns:
+        return columns
+
+    headers_lower = columns['headers_lower']
+    name_indices = columns['name_indices']
+    attribute_indices = columns['attribute_indices']
+    availability_indices = columns['availability_indices']
+    attribute_columns = [headers_lower[i] for i in attribute_indices]
+    availability_columns = [headers_lower[i] for i in availability_indices]
+
+    names = []
+    attribute_bytes = bytearray() # one byte per (student, attribute), row after row
+    availability_bytes = bytearray() # one byte per (student, time slot), row after row
+    unassigned_students = []
+    total_students = 0
+
+    for row in reader:
+        if not row:
+            continue # blank line
+        if len(row) < len(headers_lower):
+            row = row + [''] * (len(headers_lower) - len(row)) # missing trailing cells count as 0
+        total_students += 1
+
+        name = ' '.join(row[i] for i in name_indices)
+        attributes = bytes(is_truthy(row[i]) for i in attribute_indices)
+        availabilities = bytes(is_truthy(row[i]) for i in availability_indices)
+
+        if any(availabilities):
+            names.append(name)
+            attribute_bytes += attributes
+            availability_bytes += availabilities
+        else:
+            # student has no availability - add to unassigned list
+            unassigned_students.append({
+                'name': name,
+                'attributes': {attr: str(v) for attr, v in zip(attribute_columns, attributes)},
+                'availabilities': {slot: str(v) for slot, v in zip(availability_columns, availabilities)}
+            })
+
+    # if no students have availability, return error
+    if not names:
+        return {'error': 'No students have any available times. Please ensure at least one student has available time slots.', 'status': 400}
+
+    matrix = StudentMatrix(names, attribute_columns, availability_columns,
+                           np.frombuffer(attribute_bytes, dtype=np.uint8), np.frombuffer(availability_bytes, dtype=np.uint8))
+    return {
+        'matrix': matrix,
+        'unassigned_students': unassigned_students,
+        'total_students': total_students,
+    }
+
+def parse_student_data(data, given_attributes):
+    """
+    pandas version of parse_student_stream, for when the csv is already a list of rows
+    """
+    import pandas as pd # only this path needs pandas, so don't pay for the import at startup
+
+    columns = check_headers(data[0], given_attributes) # first row of data is headers
+    if 'error' in columns:
+        return columns
+
+    headers_lower = columns['headers_lower']
+    name_indices = columns['name_indices']
+    attribute_indices = columns['attribute_indices']
+    availability_indices = columns['availability_indices']
 
     # now make the csv into a df
     df = pd.DataFrame(data[1:], columns=headers_lower)  # type: ignore
@@ -93,42 +248,24 @@ def parse_student_data(data, given_attributes):
         df.loc[:, col] = df.loc[:, col].replace({'Yes': '1', 'yes': '1', 'No': '0', 'no': '0', 'True': '1', 'False': '0', 'true': '1', 'false': '0'})
         df.loc[:, col] = df.loc[:, col].astype(str)  
 
-    # get the student data, attributes, availabilities
-    student_names = df[name_column].tolist()  
-    student_attributes = df[attribute_columns].to_dict(orient='records') if attribute_columns else []  # type: ignore
-    student_availabilities = df[availability_columns].to_dict(orient='records') if availability_columns else []  # type: ignore
+    # pack the 0/1 columns into the compact student matrix
+    attribute_values = df[attribute_columns].map(is_truthy).to_numpy(dtype=np.uint8) if attribute_columns else None
+    availability_values = df[availability_columns].map(is_truthy).to_numpy(dtype=np.uint8) if availability_columns else None
+    matrix = StudentMatrix(df[name_column].tolist(), attribute_columns, availability_columns, attribute_values, availability_values)
 
     # filter out students with no availability and track them separately
-    filtered_names = []
-    filtered_attributes = []
-    filtered_availabilities = []
-    unassigned_students = []
-    
-    for i, avail in enumerate(student_availabilities):
-        if all(str(v).strip() == '0' for v in avail.values()):
-            # student has no availability - add to unassigned list
-            unassigned_students.append({
-                'name': student_names[i],
-                'attributes': student_attributes[i] if student_attributes else {},
-                'availabilities': avail
-            })
-        else:
-            # student has availability - include in filtered data
-            filtered_names.append(student_names[i])
-            if student_attributes:
-                filtered_attributes.append(student_attributes[i])
-            filtered_availabilities.append(avail)
+    has_availability = matrix.has_any_availability()
+    unassigned_students = [matrix.student_record(s) for s in np.flatnonzero(~has_availability)]
     
     # if no students have availability, return error
-    if not filtered_names:
+    if not has_availability.any():
         return {'error': 'No students have any available times. Please ensure at least one student has available time slots.', 'status': 400}
 
     return {
         'df': df,
-        'student_names': filtered_names,
-        'student_attributes': filtered_attributes,
-        'student_availabilities': filtered_availabilities,
+        'matrix': matrix.subset(np.flatnonzero(has_availability)),
         'unassigned_students': unassigned_students,
+        'total_students': len(df),
     }
 
 def parse_attribute_constraints(request, given_attributes):
@@ -147,6 +284,13 @@ def parse_attribute_constraints(request, given_attributes):
         if max_key in request.form:
             attr_constraints['max_per_group'] = int(request.form[max_key])
         
+        # <attr>_soft=true lets groups break the bounds at a cost (<attr>_weight per student too many / too few, default 1)
+        # instead of ruling the schedule out
+        if attr_constraints and request.form.get(f'{attr}_soft', '').strip().lower() in ('1', 'yes', 'true'):
+            attr_constraints['soft'] = True
+            if request.form.get(f'{attr}_weight'):
+                attr_constraints['weight'] = float(request.form[f'{attr}_weight'])
+
         # only add if constraints were specified
         if attr_constraints:
             attribute_constraints[attr] = attr_constraints
@@ -179,6 +323,7 @@ def parse_all_constraints(request, num_students, num_availabilities, given_attri
 
     attribute_constraints = parse_attribute_constraints(request, given_attributes)
 
+    # a json list of {"attributes": [...], "min": n, "max": n}, each optionally "soft": true with a "weight"
     combined_constraints = []
     if 'combined_constraints' in request.form:
         try:
@@ -186,5 +331,99 @@ def parse_all_constraints(request, num_students, num_availabilities, given_attri
         except Exception:
             combined_constraints = []
 
-    constraints = SchedulingConstraints(attribute_constraints, group_size_min, group_size_max, group_count_min, group_count_max, combined_constraints)
+    objective = request.form.get('objective') or None
+    objective_weights = {}
+    if request.form.get('objective_weights'):
+        try:
+            objective_weights = {name: float(weight) for name, weight in json.loads(request.form['objective_weights']).items()}
+        except Exception:
+            objective_weights = {}
+
+    constraints = SchedulingConstraints(attribute_constraints, group_size_min, group_size_max, group_count_min, group_count_max, combined_constraints,
+                                        objective=objective, objective_weights=objective_weights, **parse_solver_parameters(request))
     return constraints
+
+def parse_solver_parameters(request):
+    """
+    optional cp-sat settings: time limit (seconds), number of search workers, random seed, relative optimality gap
+    """
+    solver_parameters = {}
+    if request.form.get('time_limit'):
+        solver_parameters['time_limit'] = float(request.form['time_limit'])
+    if request.form.get('num_workers'):
+        solver_parameters['num_workers'] = int(request.form['num_workers'])
+    if request.form.get('random_seed'):
+        solver_parameters['random_seed'] = int(request.form['random_seed'])
+    if request.form.get('relative_gap'):
+        solver_parameters['relative_gap'] = float(request.form['relative_gap'])
+    return solver_parameters
+
+def parse_scheduler_options(request):
+    """
+    parse the optional knobs that change how the model is built (not what a valid schedule is)
+    """
+    options = {}
+    if 'engine' in request.form:
+        options['engine'] = request.form['engine'].strip().lower()
+    if 'symmetry_breaking' in request.form:
+        options['symmetry_breaking'] = request.form['symmetry_breaking'].strip().lower()
+    if 'prebind_slots' in request.form:
+        prebind_slots = request.form['prebind_slots'].strip().lower()
+        options['prebind_slots'] = 'auto' if prebind_slots == 'auto' else prebind_slots in ('1', 'yes', 'true')
+    return options
+
+def parse_previous_schedule(request):
+    """
+    the schedule to re-solve from: 'previous_schedule' is the json an earlier request returned (or just its groups list)
+    returns {'groups': [...], 'status': 200} or an error
+    """
+    if not request.form.get('previous_schedule'):
+        return {'error': 'No previous schedule given', 'status': 400}
+    try:
+        previous = json.loads(request.form['previous_schedule'])
+    except ValueError:
+        return {'error': 'previous_schedule is not valid JSON', 'status': 400}
+
+    groups = previous.get('groups') if isinstance(previous, dict) else previous
+    if not isinstance(groups, list) or not all(isinstance(group, dict) for group in groups):
+        return {'error': 'previous_schedule must be a schedule response or its list of groups', 'status': 400}
+
+    # a compact response lists student indices into its 'students' table, swap them back for names
+    table = previous.get('students') if isinstance(previous, dict) else None
+    if isinstance(table, dict):
+        names = table.get('names', [])
+        try:
+            groups = [dict(group, students=[{'name': names[s]} for s in group.get('students', [])]) for group in groups]
+        except (IndexError, TypeError):
+            return {'error': "previous_schedule lists students that aren't in its students table", 'status': 400}
+    return {'groups': groups, 'status': 200}
+
+def parse_sweep(request, given_attributes):
+    """
+    the parameter sweep of a /api/sweep request: 'sweep' is a json object of field -> list of values to try
+    (fields: SWEEP_FIELDS and <attribute>_min_per_group / <attribute>_max_per_group); every combination is one variant
+    variant_time_limit: seconds each variant may take (defaults to time_limit)
+    returns {'variants': [{field: value}], 'time_limit': seconds or None, 'status': 200} or an error
+    """
+    if not request.form.get('sweep'):
+        return {'error': 'No sweep given', 'status': 400}
+    try:
+        sweep = json.loads(request.form['sweep'])
+    except ValueError:
+        return {'error': 'sweep is not valid JSON', 'status': 400}
+    if not isinstance(sweep, dict) or not sweep:
+        return {'error': 'sweep must be an object of field -> list of values', 'status': 400}
+
+    attribute_fields = {f'{attr}_{bound}_per_group' for attr in given_attributes for bound in ('min', 'max')}
+    variants = [{}]
+    for field, values in sweep.items():
+        if field not in SWEEP_FIELDS and field not in attribute_fields:
+            return {'error': f"Can't sweep over '{field}' (expected one of: {', '.join(SWEEP_FIELDS)} or <attribute>_min_per_group / _max_per_group)", 'status': 400}
+        if not isinstance(values, list) or not values or not all(isinstance(value, int) and not isinstance(value, bool) and value >= 0 for value in values):
+            return {'error': f'sweep values for {field} must be a list of whole numbers', 'status': 400}
+        variants = [dict(variant, **{field: value}) for variant in variants for value in values]
+        if len(variants) > MAX_SWEEP_VARIANTS:
+            return {'error': f'That sweep has too many combinations (at most {MAX_SWEEP_VARIANTS} per request)', 'status': 400}
+
+    time_limit = request.form.get('variant_time_limit') or request.form.get('time_limit')
+    return {'variants': variants, 'time_limit': float(time_limit) if time_limit else None, 'status': 200}
@@ -0,0 +1,281 @@
+import os
+import time
+import numpy as np
+from ortools.sat.python import cp_model
+from constraint_parser import SchedulingConstraints
+from student_matrix import StudentMatrix
+from scheduler import GroupScheduler, CANCELLED_RESULT, model_size, solver_counters
+import worker_pool
+
+# share of the time limit the slot assignment may use at most, the rest is left for forming the groups inside the slots
+SLOT_ASSIGNMENT_TIME_SHARE = 0.5
+# seconds a slot gets even when the ones before it used up the time limit
+MIN_SLOT_TIME_LIMIT = 0.5
+
+class _SlotScheduler(GroupScheduler):
+    """GroupScheduler for one time slot's students that hands back raw (slot, student indices) groups instead of json"""
+    def _format_solution(self, assignment):
+        return {'assignment': assignment}
+
+    def explain_infeasibility(self):
+        # a slot only fails if the split from step 1 can't work out, which the user can't act on per slot, so the
+        # time explaining would take isn't worth it
+        return None
+
+def _solve_slot(matrix, constraints, scheduler_options):
+    """runs in a worker process: form the groups for one time slot"""
+    return _SlotScheduler(matrix, constraints, **scheduler_options).schedule()
+
+class DecomposedScheduler(GroupScheduler):
+    def __init__(self, student_data, constraints, symmetry_breaking='index', prebind_slots=True, max_workers=None):
+        """
+        scheduler for big rosters that splits the problem in two:
+        1. decide which time slot every student goes to (and how many groups each slot gets) with a small
+           assignment model over the available (student, slot) pairs only
+        2. form the groups inside each slot separately, one GroupScheduler per slot, in parallel worker processes
+        slot-level totals (group sizes, attribute counts, group counts) are checked in step 1, so step 2 almost always
+        works out; the price is that objectives like balance_sizes are only optimized within each slot
+        max_workers: slots solving at once in step 2, on the shared worker pool and each taking a free solve slot
+                     (defaults to the number of cores, 1 = solve the slots one by one in this process)
+        """
+        super().__init__(student_data, constraints, symmetry_breaking=symmetry_breaking, prebind_slots=prebind_slots)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._slot_scheduler = None
+
+    def stop(self):
+        """
+        stop the slot assignment solve and any slot that hasn't started yet
+        (slots already running in worker processes finish, bounded by the time limit)
+        """
+        super().stop()
+        if self._slot_scheduler is not None:
+            self._slot_scheduler.stop()
+
+    def _schedule(self, report_progress):
+        start = time.perf_counter()
+
+        report_progress('checking')
+        presolve_error = self._presolve_error()
+        if presolve_error is not None:
+            return presolve_error
+
+        report_progress('assigning_time_slots')
+        plan = self._assign_time_slots()
+        if 'error' in plan:
+            return plan
+        if self._stop_requested.is_set():
+            return CANCELLED_RESULT.copy()
+
+        report_progress('solving', subproblems=len(plan['slot_students']))
+        deadline = start + self.constraints.time_limit if self.constraints.time_limit else None
+        slot_results = self._solve_slots(plan['slot_students'], plan['slot_groups'], deadline)
+        self._add_subproblem_diagnostics(slot_results)
+        if self._stop_requested.is_set():
+            return CANCELLED_RESULT.copy()
+
+        # merge the per-slot groups back together, in time slot order, with the roster's own student indices
+        assignment = []
+        for t, result in slot_results:
+            if 'error' in result:
+                return {
+                    'error': f"Could not form groups for time slot '{self.time_slots[t]}': {result['error']} Try again without decomposition.",
+                    'solve_stats': {'slot_assignment': plan['solve_stats']}
+                }
+            slot_students = plan['slot_students'][t]
+            for _, local_students in result['assignment']:
+                assignment.append((t, [int(slot_students[i]) for i in local_students]))
+
+        report_progress('formatting')
+        result = self._format_solution(assignment)
+        # the split itself isn't optimized jointly with the slots, so an objective (or soft constraints) only ever gives a
+        # good (not proven best) answer
+        all_optimal = all(slot_result['solver_status'] == 'OPTIMAL' for _, slot_result in slot_results)
+        result['solver_status'] = 'OPTIMAL' if all_optimal and not self._objective_weights() and not self._soft_rules() else 'FEASIBLE'
+        result['objective'] = self.constraints.get_objective()[0]
+        result['solve_stats'] = {
+            'wall_time': time.perf_counter() - start,
+            'slot_assignment': plan['solve_stats'],
+            'subproblems': [dict(slot_result['solve_stats'], time_slot=self.time_slots[t]) for t, slot_result in slot_results]
+        }
+        result['decomposed'] = True
+        return result
+
+    def _assign_time_slots(self):
+        """
+        step 1: pick one available slot per student and a number of groups per slot such that every slot's
+        totals could be split into valid groups (size bounds, per-group attribute and combined bounds, group count bounds)
+        returns {'slot_students': {slot: student indices}, 'slot_groups': {slot: number of groups}, 'solve_stats'} or an error
+        """
+        model = cp_model.CpModel()
+        size_min = self.constraints.group_size_min
+        size_max = self.constraints.group_size_max
+
+        # one "student s meets at slot t" variable per available (s, t) pair, indexed both by student and by slot
+        students, slots = np.nonzero(self.matrix.availabilities)
+        student_slots = [[] for _ in range(self.num_students)]
+        slot_vars = [[] for _ in range(self.num_time_slots)]
+        slot_members = [[] for _ in range(self.num_time_slots)]
+        for s, t in zip(students.tolist(), slots.tolist()):
+            var = model.NewBoolVar(f'student_{s}_at_time_{t}')
+            student_slots[s].append(var)
+            slot_vars[t].append(var)
+            slot_members[t].append(s)
+
+        for s in range(self.num_students):
+            model.AddExactlyOne(student_slots[s])
+
+        # slot_groups[t] = number of groups meeting at slot t
+        slot_groups = []
+        for t in range(self.num_time_slots):
+            available = len(slot_vars[t])
+            groups_t = model.NewIntVar(0, available // max(size_min, 1), f'time_{t}_groups')
+            slot_groups.append(groups_t)
+            load = cp_model.LinearExpr.Sum(slot_vars[t])
+            model.Add(load >= size_min * groups_t)
+            model.Add(load <= (size_max or available) * groups_t)
+
+            # attribute totals have to fit the per-group bounds times the number of groups (soft bounds are the slots' business)
+            for attr, cons in self.constraints.get_hard_attribute_constraints().items():
+                has_attr = self.matrix.attribute_column(attr)
+                attr_count = cp_model.LinearExpr.Sum([var for s, var in zip(slot_members[t], slot_vars[t]) if has_attr[s]])
+                if 'min_per_group' in cons:
+                    model.Add(attr_count >= cons['min_per_group'] * groups_t)
+                if 'max_per_group' in cons:
+                    model.Add(attr_count <= cons['max_per_group'] * groups_t)
+
+            for combined in self.constraints.get_hard_combined_constraints():
+                has_any = np.zeros(self.num_students, dtype=bool)
+                has_any[self.matrix.students_with_any_attribute(combined.get('attributes', []))] = True
+                combined_count = cp_model.LinearExpr.Sum([var for s, var in zip(slot_members[t], slot_vars[t]) if has_any[s]])
+                if combined.get('min') is not None:
+                    model.Add(combined_count >= combined['min'] * groups_t)
+                if combined.get('max') is not None:
+                    model.Add(combined_count <= combined['max'] * groups_t)
+
+        total_groups = cp_model.LinearExpr.Sum(slot_groups)
+        model.Add(total_groups >= self.constraints.group_count_min)
+        if self.constraints.group_count_max:
+            model.Add(total_groups <= self.constraints.group_count_max)
+        if 'min_groups' in self._objective_weights():
+            model.Minimize(total_groups)
+
+        solver = cp_model.CpSolver()
+        self._configure_solver(solver)
+        if self.constraints.time_limit:
+            solver.parameters.max_time_in_seconds = float(self.constraints.time_limit) * SLOT_ASSIGNMENT_TIME_SHARE
+        self._solver = solver
+        if self._stop_requested.is_set():
+            return CANCELLED_RESULT.copy()
+        status = solver.Solve(model)
+        self._diagnostics['model'] = model_size(model)
+        self._diagnostics['solver'] = solver_counters(solver, status)
+        solve_stats = {
+            'status': solver.StatusName(status),
+            'wall_time': solver.WallTime(),
+            'num_branches': solver.NumBranches(),
+            'num_conflicts': solver.NumConflicts()
+        }
+
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            if status == cp_model.UNKNOWN:
+                error = f'No way to split the students across time slots was found within the time limit ({self.constraints.time_limit} seconds).'
+            else:
+                error = 'No valid solution found with the given constraints: the students cannot be split across time slots so that every slot can form valid groups.'
+            return {'error': error, 'solver_status': solver.StatusName(status), 'solve_stats': {'slot_assignment': solve_stats}}
+
+        plan_students = {}
+        plan_groups = {}
+        for t in range(self.num_time_slots):
+            groups_t = solver.Value(slot_groups[t])
+            if groups_t:
+                plan_students[t] = np.array([s for s, var in zip(slot_members[t], slot_vars[t]) if solver.Value(var)], dtype=np.intp)
+                plan_groups[t] = groups_t
+        return {'slot_students': plan_students, 'slot_groups': plan_groups, 'solve_stats': solve_stats}
+
+    def _add_subproblem_diagnostics(self, slot_results):
+        """fold the slots' model sizes and search counters into the slot assignment's (totals over all solves)"""
+        model = self._diagnostics.setdefault('model', {'num_variables': 0, 'num_constraints': 0})
+        solver = self._diagnostics.setdefault('solver', {})
+        solver.pop('status', None)
+        model['subproblems'] = len(slot_results)
+        for _, slot_result in slot_results:
+            slot_diagnostics = slot_result.get('diagnostics', {})
+            for name, value in slot_diagnostics.get('model', {}).items():
+                if name != 'formulation':
+                    model[name] = model.get(name, 0) + value
+            for name, value in slot_diagnostics.get('solver', {}).items():
+                if name != 'status':
+                    solver[name] = solver.get(name, 0) + value
+
+    def _slot_constraints(self, num_groups):
+        """
+        the roster's constraints for one slot's subproblem: exactly num_groups groups, group count no longer optimized
+        (and no min_moves, the subproblem's hint is just a starting point, not a previous schedule); _solve_slots sets
+        its time limit
+        """
+        objective, objective_weights = self.constraints.get_objective()
+        if objective in ('min_groups', 'min_moves'):
+            objective = 'none'
+        elif objective == 'weighted':
+            objective_weights = dict(objective_weights, min_groups=0, min_moves=0)
+        return SchedulingConstraints(self.constraints.get_attribute_constraints(), self.constraints.group_size_min, self.constraints.group_size_max,
+                                     num_groups, num_groups, self.constraints.get_combined_constraints(),
+                                     objective=objective, objective_weights=objective_weights, **self.constraints.get_solver_parameters())
+
+    def _round_robin_hint(self, slot_matrix, num_groups):
+        """
+        starting point for a slot's subproblem: sort the students by which constrained attributes they have and
+        deal them out to the groups like cards, so sizes and attribute counts come out as even as they can be
+        (step 1 made sure the slot's totals fit, so for a single attribute this is already a valid answer)
+        """
+        constrained = list(self.constraints.get_attribute_constraints())
+        for combined in self.constraints.get_combined_constraints():
+            constrained.extend(combined.get('attributes', []))
+        signature = np.zeros(slot_matrix.num_students, dtype=np.int64)
+        for attr in dict.fromkeys(constrained):
+            signature = 2 * signature + slot_matrix.attribute_column(attr)
+        order = np.argsort(-signature, kind='stable')
+        return [(0, order[g::num_groups].tolist()) for g in range(num_groups)]
+
+    def _solve_slots(self, slot_students, slot_groups, deadline=None):
+        """
+        step 2: one GroupScheduler per slot, in parallel; returns [(slot, result)] in slot order
+        deadline: time.perf_counter() by which all slots should be done, the time left is split between them
+        """
+        tasks = []
+        for t in sorted(slot_students):
+            students = slot_students[t]
+            slot_matrix = StudentMatrix([self.matrix.names[s] for s in students], self.matrix.attribute_names, [self.time_slots[t]],
+                                        self.matrix.attributes[students], np.ones((len(students), 1), dtype=np.uint8))
+            scheduler_options = {'symmetry_breaking': self.symmetry_breaking, 'prebind_slots': True,
+                                 'hint': self._round_robin_hint(slot_matrix, slot_groups[t])}
+            tasks.append((t, slot_matrix, self._slot_constraints(slot_groups[t]), scheduler_options))
+
+        def time_left(rounds):
+            # the time to deadline shared by rounds slots solved one after the other
+            if deadline is None:
+                return None
+            return max((deadline - time.perf_counter()) / rounds, MIN_SLOT_TIME_LIMIT)
+
+        # the caller's own solve slot covers one time slot at a time, more run side by side only on solve slots free right now
+        extra = worker_pool.take_extra_solve_slots(min(self.max_workers, len(tasks)) - 1)
+        try:
+            if extra == 0:
+                results = []
+                for i, (t, slot_matrix, slot_constraints, scheduler_options) in enumerate(tasks):
+                    if self._stop_requested.is_set():
+                        break
+                    # slots that finish early leave their time to the ones after them
+                    slot_constraints.time_limit = time_left(len(tasks) - i)
+                    self._slot_scheduler = _SlotScheduler(slot_matrix, slot_constraints, **scheduler_options)
+                    results.append((t, self._slot_scheduler.schedule()))
+                return results
+
+            slot_time_limit = time_left(-(-len(tasks) // (extra + 1)))
+            for _, _, slot_constraints, _ in tasks:
+                slot_constraints.time_limit = slot_time_limit
+            futures = worker_pool.run_all(_solve_slot, [task[1:] for task in tasks], extra + 1, stop_event=self._stop_requested)
+            return [(t, future.result()) for (t, _, _, _), future in zip(tasks, futures) if not future.cancelled()]
+        finally:
+            for _ in range(extra):
+                worker_pool.release_solve_slot()
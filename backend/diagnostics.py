@@ -0,0 +1,92 @@
+import time
+import threading
+
+class PhaseTimer:
+    def __init__(self):
+        """
+        adds up wall-clock seconds per named phase; start() a phase to end the previous one
+        (phases can come back, their times add up)
+        """
+        self.phases = {}
+        self._current = None
+        self._started = None
+
+    def start(self, phase):
+        """switch to phase (does nothing if it's already the current one)"""
+        if phase == self._current:
+            return
+        self.stop()
+        self._current = phase
+        self._started = time.perf_counter()
+
+    def stop(self):
+        """end the current phase"""
+        if self._current is not None:
+            self.phases[self._current] = self.phases.get(self._current, 0) + time.perf_counter() - self._started
+        self._current = None
+
+    def as_dict(self):
+        return {phase: round(seconds, 6) for phase, seconds in self.phases.items()}
+
+def _running_stat():
+    return {'count': 0, 'total': 0, 'max': 0}
+
+def _add(stat, value):
+    stat['count'] += 1
+    stat['total'] += value
+    stat['max'] = max(stat['max'], value)
+
+def _summary(stat, digits=6):
+    return {
+        'count': stat['count'],
+        'total': round(stat['total'], digits),
+        'mean': round(stat['total'] / stat['count'], digits) if stat['count'] else 0,
+        'max': round(stat['max'], digits)
+    }
+
+class Metrics:
+    def __init__(self):
+        """
+        running totals over every schedule request this process has answered (phase times, model sizes,
+        cp-sat search stats, outcomes, cache hits) for /api/metrics
+        each worker process keeps its own numbers
+        """
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = {}
+        self.outcomes = {}
+        self.cache = {}
+        self.phases = {}
+        self.model = {'num_variables': _running_stat(), 'num_constraints': _running_stat()}
+        self.solver = {'wall_time': _running_stat(), 'num_branches': _running_stat(), 'num_conflicts': _running_stat()}
+
+    def record(self, endpoint, schedule, diagnostics):
+        """add one answered request: its schedule dict (for the outcome) and its diagnostics block"""
+        if schedule.get('cancelled'):
+            outcome = 'CANCELLED'
+        else:
+            outcome = schedule.get('solver_status') or ('ERROR' if 'error' in schedule else 'OK')
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if schedule.get('cache'):
+                self.cache[schedule['cache']] = self.cache.get(schedule['cache'], 0) + 1
+            for phase, seconds in diagnostics.get('phases', {}).items():
+                _add(self.phases.setdefault(phase, _running_stat()), seconds)
+            for section, stats in (('model', self.model), ('solver', self.solver)):
+                for name, stat in stats.items():
+                    value = diagnostics.get(section, {}).get(name)
+                    if value is not None:
+                        _add(stat, value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'requests': dict(self.requests),
+                'outcomes': dict(self.outcomes),
+                'cache': dict(self.cache),
+                'phase_seconds': {phase: _summary(stat) for phase, stat in self.phases.items()},
+                'model': {name: _summary(stat, 1) for name, stat in self.model.items()},
+                'solver': {name: _summary(stat, 3 if name == 'wall_time' else 1) for name, stat in self.solver.items()}
+            }
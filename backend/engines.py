@@ -0,0 +1,25 @@
+import importlib
+
+# which scheduler class runs for each value of the 'engine' option, as (module, class name)
+# the modules pull in ortools (and ortools pulls in pandas), which takes most of a second, so they're only imported
+# once a scheduler is actually built instead of when the app starts
+ENGINES = {
+    'cp_sat': ('scheduler', 'GroupScheduler'),
+    'decompose': ('decomposition', 'DecomposedScheduler'),
+    'heuristic': ('heuristic', 'HeuristicScheduler'),
+    'auto': ('heuristic', 'AutoScheduler'),
+}
+
+def engine_class(engine):
+    """the scheduler class for an engine name (imports its module the first time)"""
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {', '.join(ENGINES)}")
+    module_name, class_name = ENGINES[engine]
+    return getattr(importlib.import_module(module_name), class_name)
+
+def create_scheduler(student_data, constraints, engine='cp_sat', **options):
+    """
+    build the scheduler for the chosen engine; every engine has the same schedule() / stop() interface
+    options are passed on to the scheduler (e.g. symmetry_breaking, prebind_slots)
+    """
+    return engine_class(engine)(student_data, constraints, **options)
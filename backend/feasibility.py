@@ -0,0 +1,147 @@
+import math
+import numpy as np
+
+# how many student names an error message lists before saying "and N more"
+MAX_NAMES_LISTED = 5
+
+def find_infeasibility(matrix, constraints):
+    """
+    cheap necessary conditions every valid schedule meets, checked straight on the roster matrices before any
+    cp-sat model is built (milliseconds even for big rosters)
+    matrix: StudentMatrix
+    constraints: SchedulingConstraints object
+    returns a list of reasons the constraints can't be met; an empty list means nothing obviously wrong was found,
+    not that a solution exists
+    """
+    rules = _per_group_rules(matrix, constraints)
+    reasons = _check_bounds(constraints, rules)
+    if reasons:
+        return reasons # the group count arithmetic below assumes the bounds themselves make sense
+
+    slot_group_caps = _slot_group_caps(matrix, constraints, rules)
+    reasons.extend(_check_group_count(matrix, constraints, rules, slot_group_caps))
+    reasons.extend(_check_students(matrix, slot_group_caps))
+    return reasons
+
+def _per_group_rules(matrix, constraints):
+    """
+    attribute and combined constraints as (label, which students count, min per group, max per group)
+    (only the hard ones: a soft constraint can always be broken, so it never rules anything out)
+    """
+    rules = []
+    for attr, cons in constraints.get_hard_attribute_constraints().items():
+        members = matrix.attribute_column(attr).astype(bool)
+        rules.append((f"attribute '{attr}'", members, cons.get('min_per_group'), cons.get('max_per_group')))
+    for combined in constraints.get_hard_combined_constraints():
+        attrs = combined.get('attributes', [])
+        members = np.zeros(matrix.num_students, dtype=bool)
+        members[matrix.students_with_any_attribute(attrs)] = True
+        label = 'combined attributes (' + ', '.join(f"'{attr}'" for attr in attrs) + ')'
+        rules.append((label, members, combined.get('min'), combined.get('max')))
+    return rules
+
+def _check_bounds(constraints, rules):
+    """bounds that contradict each other no matter who is on the roster"""
+    reasons = []
+    size_min, size_max = constraints.get_group_size_constraints()
+    count_min, count_max = constraints.get_group_count_constraints()
+    if size_max and size_min > size_max:
+        reasons.append(f"Minimum group size ({size_min}) is greater than the maximum group size ({size_max}).")
+    if count_max and count_min > count_max:
+        reasons.append(f"Maximum group count ({count_max}) is less than the minimum group count ({count_min}).")
+    for label, _, rule_min, rule_max in rules:
+        if rule_min is not None and rule_max is not None and rule_min > rule_max:
+            reasons.append(f"The minimum per group for {label} ({rule_min}) is greater than its maximum ({rule_max}).")
+        if rule_min is not None and size_max and rule_min > size_max:
+            reasons.append(f"{label[0].upper() + label[1:]} needs at least {rule_min} per group, but groups have at most {size_max} students.")
+    return reasons
+
+def slot_group_caps(matrix, constraints):
+    """most groups that could meet at each time slot under constraints (numpy array, one entry per time slot)"""
+    return _slot_group_caps(matrix, constraints, _per_group_rules(matrix, constraints))
+
+def _slot_group_caps(matrix, constraints, rules):
+    """most groups that could meet at each time slot, counting only who is available there (0 = no valid group fits)"""
+    size_min = constraints.group_size_min
+    available = matrix.availabilities.astype(bool)
+    caps = available.sum(axis=0) // max(size_min, 1)
+    for _, members, rule_min, rule_max in rules:
+        if rule_min:
+            caps = np.minimum(caps, available[members].sum(axis=0) // rule_min)
+        if rule_max is not None and size_min > rule_max:
+            # every group needs at least size_min - max students who don't count towards the rule
+            caps = np.minimum(caps, available[~members].sum(axis=0) // (size_min - rule_max))
+    return caps
+
+def _check_group_count(matrix, constraints, rules, slot_group_caps):
+    """
+    every constraint limits how many groups there can be; collect those limits and check they leave room for
+    at least one group count (only the tightest lower and upper limit are reported)
+    """
+    n = matrix.num_students
+    size_min = constraints.group_size_min
+    size_max = constraints.group_size_max
+    count_min, count_max = constraints.get_group_count_constraints()
+
+    lower = [(count_min, f"the minimum group count is {count_min}")]
+    upper = [(n // size_min, f"{n} students only make {_groups(n // size_min)} of at least {size_min}")]
+    if count_max:
+        upper.append((count_max, f"the maximum group count is {count_max}"))
+    if size_max:
+        lower.append((math.ceil(n / size_max), f"{n} students need {_groups(math.ceil(n / size_max))} of at most {size_max}"))
+    upper.append((int(slot_group_caps.sum()), "that is all the students' availability leaves room for across the time slots"))
+
+    reasons = []
+    for label, members, rule_min, rule_max in rules:
+        with_rule = int(members.sum())
+        without_rule = n - with_rule
+        if rule_min:
+            upper.append((with_rule // rule_min, f"only {with_rule} students have {label}, enough for {_groups(with_rule // rule_min)} with at least {rule_min} each"))
+            if size_max:
+                room = size_max - rule_min # students without the attribute(s) that fit next to the required ones
+                if room > 0:
+                    needed = math.ceil(without_rule / room)
+                    lower.append((needed, f"{without_rule} students without {label} need {_groups(needed)} when each group only has room for {room} of them"))
+                elif without_rule:
+                    reasons.append(f"{without_rule} students don't have {label}, but every group has to be filled entirely with students who do.")
+        if rule_max is not None:
+            if rule_max > 0:
+                needed = math.ceil(with_rule / rule_max)
+                lower.append((needed, f"{with_rule} students have {label}, which takes {_groups(needed)} with at most {rule_max} each"))
+            elif with_rule:
+                reasons.append(f"{with_rule} students have {label}, but the maximum per group is 0.")
+            if size_min > rule_max:
+                fillers = size_min - rule_max
+                upper.append((without_rule // fillers, f"only {without_rule} students don't have {label}, enough for {_groups(without_rule // fillers)} that each need {fillers} of them"))
+
+    lowest, lower_reason = max(lower, key=lambda bound: bound[0])
+    highest, upper_reason = min(upper, key=lambda bound: bound[0])
+    if lowest > highest:
+        reasons.append(f"At least {_groups(lowest)} are needed ({lower_reason}), but at most {highest} are possible ({upper_reason}).")
+    return reasons
+
+def _check_students(matrix, slot_group_caps):
+    """students who can't be put in any group because of their own availability"""
+    reasons = []
+    available = matrix.availabilities.astype(bool)
+    never_available = np.flatnonzero(~available.any(axis=1))
+    if len(never_available):
+        reasons.append(f"{_students(matrix, never_available)} not available at any time slot.")
+
+    usable_slots = slot_group_caps > 0
+    stranded = np.flatnonzero(available.any(axis=1) & ~available[:, usable_slots].any(axis=1))
+    if len(stranded):
+        reasons.append(f"{_students(matrix, stranded)} only available at time slots where no valid group can meet "
+                       "(too few students, or too few with the required attributes, are available there).")
+    return reasons
+
+def _groups(count):
+    return f"{count} group" if count == 1 else f"{count} groups"
+
+def _students(matrix, student_indices):
+    """'Alice, Bob and 3 more are' style list for error messages"""
+    names = [matrix.names[s] for s in student_indices[:MAX_NAMES_LISTED]]
+    listed = ', '.join(names)
+    if len(student_indices) > MAX_NAMES_LISTED:
+        listed += f' and {len(student_indices) - MAX_NAMES_LISTED} more'
+    return f"{listed} {'is' if len(student_indices) == 1 else 'are'}"
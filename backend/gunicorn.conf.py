@@ -0,0 +1,24 @@
+"""
+gunicorn settings for `gunicorn -c gunicorn.conf.py wsgi:app` (see wsgi.py for the SMARTGROUPS_* variables)
+"""
+import os
+from serving import serving_defaults
+
+settings = serving_defaults()
+
+bind = os.environ.get('SMARTGROUPS_BIND', f"{os.environ.get('SMARTGROUPS_HOST', '127.0.0.1')}:{os.environ.get('SMARTGROUPS_PORT', 5013)}")
+workers = settings['SMARTGROUPS_WEB_WORKERS']
+# threaded workers, so a worker busy solving still answers /api/health on one of its spare threads
+worker_class = 'gthread'
+threads = settings['SMARTGROUPS_WEB_THREADS']
+
+# for gthread workers this is a heartbeat, not a request limit: a worker whose main loop hangs that long is restarted,
+# a long solve on one of its threads doesn't trip it (SMARTGROUPS_MAX_TIME_LIMIT is what bounds the solver's search)
+timeout = 30
+# a graceful restart waits for solves in flight, give them the longest search plus time to parse and explain
+graceful_timeout = int(settings['SMARTGROUPS_MAX_TIME_LIMIT']) + 30
+keepalive = 5
+
+# workers come back fresh every so often, in case a solve left a lot of memory behind
+max_requests = 500
+max_requests_jitter = 50
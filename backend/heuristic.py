@@ -0,0 +1,303 @@
+import time
+import numpy as np
+from scheduler import GroupScheduler, CANCELLED_RESULT
+
+# caps on the repair loops, per student in the roster (slot moves) and per group in a slot (swaps)
+MAX_SLOT_MOVES_PER_STUDENT = 1
+MAX_SWAPS_PER_GROUP = 4
+
+class HeuristicScheduler(GroupScheduler):
+    def __init__(self, student_data, constraints, symmetry_breaking='index', prebind_slots='auto', hint=None):
+        """
+        fast path without cp-sat for loosely constrained rosters:
+        1. send every student to the most popular time slot they're available at, then move students between slots
+           one at a time until every slot's head count (and attribute counts) can be split into valid groups
+        2. give each slot as few groups as that allows, adding some where the minimum group count asks for more
+        3. deal each slot's students out to its groups like cards (sorted by their constrained attributes, so sizes
+           and counts come out even), then swap students between groups of the same slot until every rule holds
+        honours the same SchedulingConstraints but doesn't optimize an objective, and returns an error instead of
+        searching when the greedy fill can't be repaired (symmetry_breaking, prebind_slots and hint only shape the
+        cp-sat model and are ignored)
+        """
+        super().__init__(student_data, constraints, symmetry_breaking=symmetry_breaking, prebind_slots=prebind_slots, hint=hint)
+        self.size_min = max(self.constraints.group_size_min or 1, 1)
+        self.size_max = self.constraints.group_size_max or self.num_students
+
+        # per-group rules as (which students count, min, max); column 0 of the feature matrix is "is a student"
+        # (soft constraints are left out: the fast path doesn't weigh them, the response just reports how far off they are)
+        rules = []
+        for attr, cons in self.constraints.get_hard_attribute_constraints().items():
+            rules.append((self.matrix.attribute_column(attr).astype(bool), cons.get('min_per_group'), cons.get('max_per_group')))
+        for combined in self.constraints.get_hard_combined_constraints():
+            members = np.zeros(self.num_students, dtype=bool)
+            members[self.matrix.students_with_any_attribute(combined.get('attributes', []))] = True
+            rules.append((members, combined.get('min'), combined.get('max')))
+        self.features = np.column_stack([np.ones(self.num_students, dtype=bool)] + [members for members, _, _ in rules]).astype(np.int64)
+        self.rule_min = np.array([0] + [rule_min or 0 for _, rule_min, _ in rules], dtype=np.int64)
+        self.rule_max = np.array([self.size_max] + [self.size_max if rule_max is None else rule_max for _, _, rule_max in rules], dtype=np.int64)
+        self.rule_min[0] = self.size_min
+
+        # students with the same features are interchangeable, so the repairs work on counts per signature
+        self.signatures, self.signature_of = np.unique(self.features, axis=0, return_inverse=True)
+        self.signature_of = self.signature_of.ravel()
+        self.slot_moves = 0
+        self.swaps = 0
+
+    def _schedule(self, report_progress):
+        start = time.perf_counter()
+        report_progress('checking')
+        presolve_error = self._presolve_error()
+        if presolve_error is not None:
+            return presolve_error
+
+        report_progress('solving')
+        assignment = self._heuristic_assignment()
+        if self._stop_requested.is_set():
+            return CANCELLED_RESULT.copy()
+        if assignment is None:
+            return {
+                'error': 'The fast heuristic could not find a valid schedule for these constraints. Try the cp_sat engine, it searches properly.',
+                'solver_status': 'UNKNOWN',
+                'solve_stats': self._heuristic_stats(start)
+            }
+
+        report_progress('formatting')
+        result = self._format_solution(assignment)
+        # no objective = any valid schedule is as good as it gets; with one (or soft constraints), this is just a good start
+        result['solver_status'] = 'FEASIBLE' if self._objective_weights() or self._soft_rules() else 'OPTIMAL'
+        result['objective'] = self.constraints.get_objective()[0]
+        result['solve_stats'] = self._heuristic_stats(start)
+        result['heuristic'] = True
+        return result
+
+    def _heuristic_stats(self, start):
+        return {'wall_time': time.perf_counter() - start, 'slot_moves': self.slot_moves, 'swaps': self.swaps}
+
+    def _heuristic_assignment(self):
+        """[(time slot index, [student indices])] for a valid schedule, or None if the repairs got stuck"""
+        slot_of = self._fill_slots()
+        if slot_of is None:
+            return None
+
+        slot_counts = self._slot_counts(slot_of)
+        group_counts = self._groups_per_slot(slot_counts)
+        if group_counts is None:
+            return None
+
+        assignment = []
+        for t in range(self.num_time_slots):
+            if not group_counts[t]:
+                continue
+            groups = self._deal_groups(np.flatnonzero(slot_of == t), group_counts[t])
+            if groups is None or self._stop_requested.is_set():
+                return None
+            assignment.extend((t, students) for students in groups)
+        return assignment
+
+    def _slot_counts(self, slot_of):
+        """(time slots x features) head count and rule member counts per slot"""
+        counts = np.zeros((self.num_time_slots, self.features.shape[1]), dtype=np.int64)
+        np.add.at(counts, slot_of, self.features)
+        return counts
+
+    def _violations(self, counts, k):
+        """how far a slot with counts (head count first) is from fitting into k groups, for each k in the array k"""
+        k = k[:, None]
+        short = np.maximum(self.rule_min * k - counts, 0).sum(axis=1)
+        over = np.maximum(counts - self.rule_max * k, 0).sum(axis=1)
+        # students outside a rule have to fit next to (and make up for) the ones inside it
+        others = counts[0] - counts[1:]
+        room = np.maximum(others - (self.size_max - self.rule_min[1:]) * k, 0).sum(axis=1)
+        fillers = np.maximum((self.size_min - self.rule_max[1:]) * k - others, 0).sum(axis=1)
+        return short + over + room + fillers
+
+    def _slot_shortfall(self, counts):
+        """how far the slot's students are from splitting into valid groups (0 if they do, or if the slot is empty)"""
+        if counts[0] == 0:
+            return 0
+        return int(self._violations(counts, np.arange(1, max(counts[0] // self.size_min, 1) + 1)).min())
+
+    def _slot_badness(self, counts):
+        """0 if the slot can be split into valid groups (or is empty), else how far off it is (emptying it counts too)"""
+        return min(self._slot_shortfall(counts), int(counts[0]))
+
+    def _fill_slots(self):
+        """
+        step 1: everyone goes to their most popular available slot (so students bunch up into few, full slots), then
+        single students move between slots while that makes some slot splittable into valid groups
+        returns the slot index per student, or None
+        """
+        available = self.matrix.availabilities.astype(bool)
+        popularity = available.sum(axis=0)
+        slot_of = np.where(available, popularity, -1).argmax(axis=1)
+        counts = self._slot_counts(slot_of)
+        badness = np.array([self._slot_badness(counts[t]) for t in range(self.num_time_slots)])
+
+        for _ in range(MAX_SLOT_MOVES_PER_STUDENT * self.num_students + self.num_time_slots):
+            if not badness.any():
+                return slot_of
+            if self._stop_requested.is_set():
+                return None
+            t = int(np.flatnonzero(badness)[0])
+            move = self._best_slot_move(t, slot_of, available, counts, badness)
+            if move is None:
+                return None
+            student, source, target = move
+            slot_of[student] = target
+            counts[source] -= self.features[student]
+            counts[target] += self.features[student]
+            badness[source] = self._slot_badness(counts[source])
+            badness[target] = self._slot_badness(counts[target])
+            self.slot_moves += 1
+        return None
+
+    def _best_slot_move(self, t, slot_of, available, counts, badness):
+        """
+        the single student move into or out of slot t that helps most (one candidate per signature and other slot,
+        since students with the same signature are interchangeable)
+        badness caps a slot's shortfall at its head count, so filling up a nearly empty slot takes a few moves that don't
+        lower (or even raise) it; moves that leave the other slot no worse and bring t strictly closer to full (fewer
+        students short) or to empty (fewer students) count as progress too, the nearer of the two directions first
+        (a slot with a student who can't go anywhere else can only be filled, so it's never drained)
+        returns (student, from slot, to slot) or None
+        """
+        best = None
+        in_t = slot_of == t
+        candidates = []
+        for u in range(self.num_time_slots):
+            if u == t:
+                continue
+            for source, target, movable in ((t, u, in_t & available[:, u]), (u, t, (slot_of == u) & available[:, t])):
+                if not movable.any():
+                    continue
+                signatures, first = np.unique(self.signature_of[movable], return_index=True)
+                students = np.flatnonzero(movable)[first]
+                for signature, student in zip(signatures, students):
+                    candidates.append((student, source, target, self.signatures[signature]))
+
+        shortfall = self._slot_shortfall(counts[t])
+        stuck = (available[in_t].sum(axis=1) <= 1).any()
+        prefer_filling = stuck or shortfall <= counts[t][0]
+        for student, source, target, feature in candidates:
+            new_source = self._slot_badness(counts[source] - feature)
+            new_target = self._slot_badness(counts[target] + feature)
+            gain = badness[source] + badness[target] - new_source - new_target
+            other_ok = (new_target <= badness[target]) if source == t else (new_source <= badness[source])
+            filling = target == t and other_ok and self._slot_shortfall(counts[t] + feature) < shortfall
+            emptying = source == t and other_ok and not stuck
+            # 2 = progress in the nearer direction, 1 = in the other one, 0 = none
+            progress = 2 if (filling and prefer_filling) or (emptying and not prefer_filling) else 1 if filling or emptying else 0
+            # in the nearer direction even a move that raises t's capped badness is fine, the other way only one that doesn't
+            if gain > 0 or progress == 2 or (gain == 0 and progress):
+                key = (gain, progress)
+                if best is None or key > best[0]:
+                    best = (key, (int(student), source, target))
+        return None if best is None else best[1]
+
+    def _groups_per_slot(self, slot_counts):
+        """
+        step 2: fewest valid groups per slot, then one more here and there until the minimum group count is met
+        returns the number of groups per slot, or None if the group count bounds can't be met this way
+        """
+        count_min, count_max = self.constraints.get_group_count_constraints()
+        valid = []
+        for t in range(self.num_time_slots):
+            if slot_counts[t][0] == 0:
+                valid.append(np.array([0]))
+                continue
+            k = np.arange(1, slot_counts[t][0] // self.size_min + 1)
+            valid.append(k[self._violations(slot_counts[t], k) == 0])
+        if any(len(k) == 0 for k in valid):
+            return None
+
+        group_counts = [int(k[0]) for k in valid]
+        for t in np.argsort(-slot_counts[:, 0], kind='stable'):
+            missing = (count_min or 0) - sum(group_counts)
+            if missing <= 0:
+                break
+            bigger = valid[t][valid[t] > group_counts[t]]
+            if len(bigger):
+                enough = bigger[bigger >= group_counts[t] + missing]
+                group_counts[t] = int(enough[0] if len(enough) else bigger[-1])
+
+        total = sum(group_counts)
+        if total < (count_min or 0) or (count_max and total > count_max):
+            return None
+        return group_counts
+
+    def _deal_groups(self, students, num_groups):
+        """
+        step 3: deal one slot's students out to num_groups groups, then swap pairs of students with different
+        signatures between groups until every rule holds
+        returns a list of student index lists, or None
+        """
+        order = students[np.argsort(-self.signature_of[students], kind='stable')]
+        num_signatures = len(self.signatures)
+        # how many students of each signature every group has; sizes never change from here on
+        members = np.zeros((num_groups, num_signatures), dtype=np.int64)
+        np.add.at(members, (np.arange(len(order)) % num_groups, self.signature_of[order]), 1)
+
+        def violations(counts):
+            return (np.maximum(self.rule_min[1:] - counts[..., 1:], 0) + np.maximum(counts[..., 1:] - self.rule_max[1:], 0)).sum(axis=-1)
+
+        counts = members @ self.signatures
+        group_violations = violations(counts)
+        # change[p, q] = what swapping out a p student for a q student does to a group's counts
+        change = self.signatures[None, :, :] - self.signatures[:, None, :]
+        for _ in range(MAX_SWAPS_PER_GROUP * num_groups):
+            if not group_violations.any():
+                break
+            g = int(group_violations.argmax())
+            # gain of giving one p student of group g to group h in exchange for one of its q students, for every (h, p, q)
+            g_after = violations(counts[g] + change)
+            h_after = violations(counts[:, None, None, :] - change[None])
+            gain = group_violations[g] + group_violations[:, None, None] - g_after[None] - h_after
+            possible = (members[g][None, :, None] > 0) & (members[:, None, :] > 0)
+            possible[g] = False
+            gain = np.where(possible, gain, 0)
+            h, p, q = np.unravel_index(int(gain.argmax()), gain.shape)
+            if gain[h, p, q] <= 0:
+                return None
+            members[g, p] -= 1
+            members[g, q] += 1
+            members[h, p] += 1
+            members[h, q] -= 1
+            counts[g] += change[p, q]
+            counts[h] -= change[p, q]
+            group_violations[g] = violations(counts[g])
+            group_violations[h] = violations(counts[h])
+            self.swaps += 1
+        if group_violations.any():
+            return None
+
+        # hand out the actual students, signature by signature
+        by_signature = [list(students[self.signature_of[students] == p]) for p in range(num_signatures)]
+        groups = []
+        for g in range(num_groups):
+            group = []
+            for p in range(num_signatures):
+                group.extend(int(s) for s in by_signature[p][:members[g, p]])
+                del by_signature[p][:members[g, p]]
+            groups.append(group)
+        return groups
+
+class AutoScheduler(HeuristicScheduler):
+    def __init__(self, student_data, constraints, symmetry_breaking='index', prebind_slots='auto', hint=None):
+        """
+        picks the engine per roster: when there's nothing to optimize (no objective, no soft constraints to break as
+        little as possible, and no previous schedule to stay close to), the heuristic fast path goes first; cp-sat
+        runs when there is, or when the fast path gets stuck
+        (a stuck fast path costs milliseconds, so it's worth trying on anything the cheap checks don't rule out)
+        """
+        super().__init__(student_data, constraints, symmetry_breaking=symmetry_breaking, prebind_slots=prebind_slots, hint=hint)
+
+    def _schedule(self, report_progress):
+        if not self._objective_weights() and not self._soft_rules() and not self.hint:
+            result = super()._schedule(report_progress)
+            # presolve errors and cancellations stand, cp-sat would only repeat them
+            if 'error' not in result or 'reasons' in result or result.get('cancelled'):
+                result['engine'] = 'heuristic'
+                return result
+        result = GroupScheduler._schedule(self, report_progress)
+        result['engine'] = 'cp_sat'
+        return result
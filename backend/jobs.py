@@ -0,0 +1,229 @@
+import os
+import time
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import Future, wait
+from engines import create_scheduler
+import worker_pool
+
+# job states, in the order a job normally goes through them
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+# how often (seconds) a worker checks whether its job was cancelled
+CANCEL_POLL_INTERVAL = 0.2
+# how often (seconds) the dispatcher waiting for a free solve slot checks whether the queue is shutting down
+DISPATCH_POLL_INTERVAL = 1.0
+
+def _watch_for_cancel(cancel_event, finished, scheduler):
+    """runs next to the solve inside the worker process; stops the cp-sat search once the job is cancelled"""
+    while not finished.is_set():
+        if cancel_event.wait(CANCEL_POLL_INTERVAL):
+            scheduler.stop()
+            return
+
+def _run_schedule_job(matrix, constraints, scheduler_options, cancel_event, progress):
+    """
+    what actually runs in the worker process: build the scheduler for the chosen engine, solve, hand back the schedule dict
+    progress is a shared dict the web process reads for GET /api/jobs/<id>
+    """
+    progress['phase'] = 'starting'
+    progress['started_at'] = time.time()
+    scheduler = create_scheduler(matrix, constraints, **scheduler_options)
+
+    finished = threading.Event()
+    watcher = threading.Thread(target=_watch_for_cancel, args=(cancel_event, finished, scheduler), daemon=True)
+    watcher.start()
+    try:
+        return scheduler.schedule(progress_callback=lambda phase, **details: progress.update(phase=phase, **details))
+    finally:
+        finished.set()
+
+class Job:
+    def __init__(self, job_id, future, cancel_event, progress, context):
+        self.job_id = job_id
+        self.future = future
+        self.cancel_event = cancel_event
+        self.progress = progress
+        self.context = context # anything the caller wants back with the result (e.g. unassigned students)
+        self.created_at = time.time()
+
+class JobQueue:
+    def __init__(self, max_workers=None, max_pending=None, max_finished=100):
+        """
+        in-process job queue that runs GroupScheduler solves on the shared pool of worker processes (worker_pool)
+        a queued job starts once it can take a solve slot, so jobs and solving requests share SMARTGROUPS_MAX_SOLVES
+        max_workers: how many jobs run at once (defaults to the number of cores)
+        max_pending: how many jobs can be queued or running at once before submit() refuses new ones
+        max_finished: how many finished jobs to remember before the oldest are forgotten
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._has_queued = threading.Condition(self._lock)
+        self._queued = deque() # (job, arguments for _run_schedule_job) waiting for a solve slot
+        self._running = threading.BoundedSemaphore(self.max_workers)
+        self._dispatcher = None # started on first use so importing the app doesn't spawn processes
+        self._manager = None
+        self._closed = False
+
+    def _start(self):
+        if self._dispatcher is None:
+            self._manager = worker_pool.mp_context().Manager()
+            self._closed = False
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        """background thread: hand queued jobs to the pool in order, each once it has a solve slot"""
+        while True:
+            with self._has_queued:
+                while not self._queued and not self._closed:
+                    self._has_queued.wait()
+                if self._closed:
+                    return
+            self._running.acquire()
+            while not worker_pool.take_solve_slot(blocking=True, timeout=DISPATCH_POLL_INTERVAL):
+                if self._closed:
+                    self._running.release()
+                    return
+            with self._lock:
+                job, args = self._queued.popleft() if self._queued else (None, None)
+            # set_running_or_notify_cancel is False for a job cancelled while it waited
+            if job is None or not job.future.set_running_or_notify_cancel():
+                self._release()
+                continue
+            try:
+                work = worker_pool.submit(_run_schedule_job, *args)
+            except Exception as e: # e.g. the pool can't start new processes
+                self._release()
+                job.future.set_exception(e)
+                continue
+            work.add_done_callback(lambda done, job=job: self._finish(job, done))
+
+    def _release(self):
+        worker_pool.release_solve_slot()
+        self._running.release()
+
+    def _finish(self, job, done):
+        self._release()
+        if done.cancelled():
+            job.future.set_exception(RuntimeError('The worker pool shut down before the job finished.'))
+        elif done.exception() is not None:
+            job.future.set_exception(done.exception())
+        else:
+            job.future.set_result(done.result())
+
+    def submit(self, matrix, constraints, scheduler_options=None, context=None, on_result=None):
+        """
+        queue a solve and return its job id, or None if the queue is full
+        on_result: optional function called with the schedule dict once the solve finishes (e.g. to cache it)
+        """
+        with self._lock:
+            self._start()
+            self._forget_old_jobs()
+            if sum(1 for job in self._jobs.values() if not job.future.done()) >= self.max_pending:
+                return None
+
+            job_id = uuid.uuid4().hex
+            cancel_event = self._manager.Event()
+            progress = self._manager.dict({'phase': QUEUED})
+            future = Future()
+            if on_result is not None:
+                future.add_done_callback(lambda done: on_result(done.result()) if not done.cancelled() and done.exception() is None else None)
+            job = Job(job_id, future, cancel_event, progress, context)
+            self._jobs[job_id] = job
+            self._queued.append((job, (matrix, constraints, scheduler_options or {}, cancel_event, progress)))
+            self._has_queued.notify()
+            return job_id
+
+    def add_finished(self, result, context=None):
+        """
+        register a job whose result is already known (e.g. from the result cache) so clients can poll it like any other
+        returns its job id
+        """
+        with self._lock:
+            self._forget_old_jobs()
+            job_id = uuid.uuid4().hex
+            future = Future()
+            future.set_result(result)
+            self._jobs[job_id] = Job(job_id, future, threading.Event(), {'phase': DONE}, context)
+            return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """
+        snapshot of a job: its state, progress so far, and the schedule (or error) once it's finished
+        returns None for unknown job ids
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+
+        info = {'job_id': job_id, 'created_at': job.created_at}
+        future = job.future
+        if future.cancelled():
+            info['status'] = CANCELLED
+        elif future.done():
+            error = future.exception()
+            if error is not None:
+                info['status'] = FAILED
+                info['error'] = str(error)
+            elif future.result().get('cancelled'):
+                info['status'] = CANCELLED
+            else:
+                info['status'] = DONE
+                info['result'] = dict(future.result()) # copy, callers may decorate it
+        elif future.running():
+            info['status'] = RUNNING
+        else:
+            info['status'] = QUEUED
+
+        try:
+            info['progress'] = dict(job.progress)
+        except (EOFError, OSError):
+            info['progress'] = {} # manager already shut down
+        return info
+
+    def cancel(self, job_id):
+        """
+        cancel a job: queued jobs never start, running ones have their cp-sat search stopped
+        returns False for unknown job ids
+        """
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if not job.future.done() and not job.future.cancel():
+            job.cancel_event.set()
+        return True
+
+    def _forget_old_jobs(self):
+        finished = sorted((job for job in self._jobs.values() if job.future.done()), key=lambda job: job.created_at)
+        for job in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job.job_id]
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.future.cancel():
+                    job.cancel_event.set()
+            self._queued.clear()
+            self._closed = True
+            self._has_queued.notify_all()
+            running = [job.future for job in self._jobs.values()]
+            dispatcher, manager = self._dispatcher, self._manager
+            self._dispatcher = None
+            self._manager = None
+        if dispatcher is not None:
+            dispatcher.join()
+            wait(running)
+            manager.shutdown()
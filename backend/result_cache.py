@@ -0,0 +1,175 @@
+import os
+import json
+import inspect
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from engines import engine_class, create_scheduler
+
+# bump when the key layout or the cached result format changes, so old on-disk entries are never read back
+CACHE_VERSION = 3
+
+def normalized_scheduler_options(scheduler_options=None):
+    """the scheduler options with the engine's defaults filled in, so leaving an option out hashes like giving its default"""
+    options = dict(scheduler_options or {})
+    engine = options.pop('engine', inspect.signature(create_scheduler).parameters['engine'].default)
+    defaults = {name: parameter.default for name, parameter in inspect.signature(engine_class(engine)).parameters.items()
+                if parameter.default is not inspect.Parameter.empty}
+    return dict(defaults, **options, engine=engine)
+
+def schedule_fingerprint(matrix, constraints, scheduler_options=None):
+    """
+    content hash of everything that decides what schedule() returns: the student matrix (names, column labels and
+    the 0/1 data) plus every SchedulingConstraints field and the scheduler options
+    things that don't change the meaning are normalized first (dict key order, the order of attributes inside a
+    combined constraint, the order of the combined constraints, options left at their defaults); the time limit and
+    the number of search threads are left out, only answers they can't change get cached (see is_cacheable)
+    """
+    combined = []
+    for combined_constraint in constraints.get_combined_constraints():
+        combined_constraint = dict(combined_constraint)
+        combined_constraint['attributes'] = sorted(combined_constraint.get('attributes', []))
+        combined.append(combined_constraint)
+    objective, objective_weights = constraints.get_objective()
+    settings = {
+        'version': CACHE_VERSION,
+        'attribute_constraints': constraints.get_attribute_constraints(),
+        'group_size': constraints.get_group_size_constraints(),
+        'group_count': constraints.get_group_count_constraints(),
+        'combined_constraints': sorted(combined, key=lambda c: json.dumps(c, sort_keys=True)),
+        'solver_parameters': {name: value for name, value in constraints.get_solver_parameters().items() if name not in ('time_limit', 'num_workers')},
+        'objective': objective,
+        'objective_weights': objective_weights,
+        'scheduler_options': normalized_scheduler_options(scheduler_options),
+        'names': matrix.names,
+        'attribute_names': matrix.attribute_names,
+        'time_slots': matrix.time_slots
+    }
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+    digest.update(np.ascontiguousarray(matrix.attributes, dtype=np.uint8).tobytes())
+    digest.update(np.ascontiguousarray(matrix.availabilities, dtype=np.uint8).tobytes())
+    return digest.hexdigest()
+
+def is_cacheable(result):
+    """
+    only cache answers that come out the same every time: proven optimal schedules, and proofs that there is none
+    (not cancellations, running out of time or the best schedule found before the time limit, a longer or less busy
+    try could go differently)
+    """
+    return 'reasons' in result or result.get('solver_status') in ('OPTIMAL', 'INFEASIBLE')
+
+class ResultCache:
+    def __init__(self, max_entries=128, cache_dir=None, max_disk_bytes=256 * 1024 * 1024):
+        """
+        schedule results by fingerprint: an in-memory lru of max_entries results (0 = keep none in memory), plus
+        (if cache_dir is given) json files on disk that survive restarts and are evicted oldest-used first once they
+        take up more than max_disk_bytes
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key):
+        """copy of the cached result for key, or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return dict(self._memory[key])
+
+        result = self._read_disk(key)
+        if result is not None:
+            self._remember(key, result)
+            return dict(result)
+        return None
+
+    def put(self, key, result):
+        """store result if it's worth keeping (see is_cacheable)"""
+        if not is_cacheable(result):
+            return
+        # diagnostics describe the solve that produced the result, a later hit doesn't repeat it
+        result = {name: value for name, value in result.items() if name != 'diagnostics'}
+        self._remember(key, result)
+        self._write_disk(key, result)
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            os.utime(path) # mark as recently used for eviction
+            return result
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # half-written or corrupted entry, treat it as a miss
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _write_disk(self, key, result):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, default=_json_default)
+            os.replace(temp_path, path) # readers never see a half-written file
+        except (OSError, TypeError, ValueError):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """delete least recently used entries until the cache dir fits in max_disk_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
+
+def _json_default(value):
+    """numpy scalars sneak into results now and then"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
@@ -0,0 +1,126 @@
+import io
+import csv
+import json
+import numpy as np
+
+# how a schedule response lists its students:
+# 'full': every group carries its students' records (name plus {'column': '0'/'1'} attribute and availability dicts), what the frontend reads
+# 'compact': groups only carry student indices into one 'students' table at the top level, so the size grows with the roster and nothing else
+RESPONSE_FORMATS = ('full', 'compact')
+
+# what /api/export can stream: the layout of examples/sample_result_sheets, or one json line per group
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+UNASSIGNED_LABEL = 'Unassigned - no availabilities'
+
+def _bit_strings(rows):
+    """one '0'/'1' string per row of a 0/1 matrix ('0110' = columns 2 and 3 are set)"""
+    return [row.tobytes().decode('ascii') for row in np.asarray(rows, dtype=np.uint8) + ord('0')]
+
+def _record_bits(record, columns):
+    """the same string for a {'column': '0'/'1'} dict"""
+    return ''.join('1' if str(record.get(column, '0')) == '1' else '0' for column in columns)
+
+def student_table(matrix, unassigned_students=()):
+    """
+    the compact format's 'students' table: names, the column labels and every student's attributes and availabilities
+    as '0'/'1' strings in that column order; row i is student index i (the unassigned students come after the roster)
+    """
+    return {
+        'names': matrix.names + [student['name'] for student in unassigned_students],
+        'attribute_names': matrix.attribute_names,
+        'time_slots': matrix.time_slots,
+        'attributes': _bit_strings(matrix.attributes) + [_record_bits(student['attributes'], matrix.attribute_names) for student in unassigned_students],
+        'availabilities': _bit_strings(matrix.availabilities) + [_record_bits(student['availabilities'], matrix.time_slots) for student in unassigned_students]
+    }
+
+def _unassigned_group(group_id, students):
+    return {
+        'group_id': group_id,
+        'time_slot': UNASSIGNED_LABEL,
+        'students': students,
+        'size': len(students),
+        'is_unassigned': True
+    }
+
+def render_schedule(schedule, matrix, unassigned_students, response_format='full'):
+    """
+    turn a schedule() result (groups hold 'student_indices' into matrix) into the response: 'full' swaps the indices
+    for student records, 'compact' keeps them (as 'students') next to a student_table; either way the students with no
+    availability at all go last, in an unassigned group
+    """
+    if 'error' in schedule or 'groups' not in schedule:
+        return schedule
+
+    rendered = dict(schedule)
+    groups = []
+    for group in schedule['groups']:
+        group = dict(group)
+        indices = group.pop('student_indices')
+        group['students'] = indices if response_format == 'compact' else [matrix.student_record(s) for s in indices]
+        groups.append(group)
+
+    if unassigned_students:
+        if response_format == 'compact':
+            first = matrix.num_students
+            groups.append(_unassigned_group(len(groups) + 1, list(range(first, first + len(unassigned_students)))))
+        else:
+            groups.append(_unassigned_group(len(groups) + 1, list(unassigned_students)))
+        rendered['total_students'] = int(schedule.get('total_students', 0)) + len(unassigned_students)
+
+    if response_format == 'compact':
+        rendered['students'] = student_table(matrix, unassigned_students)
+    rendered['groups'] = groups
+    return rendered
+
+def _export_groups(schedule, matrix, unassigned_students):
+    """
+    (group summary, students) per group, unassigned group last; students is a generator of
+    (name, attribute 0/1 list, availability 0/1 list), so nothing is built for a group before it's written
+    """
+    for group in schedule['groups']:
+        summary = {name: value for name, value in group.items() if name != 'student_indices'}
+        students = ((matrix.names[s], matrix.attributes[s].tolist(), matrix.availabilities[s].tolist()) for s in group['student_indices'])
+        yield summary, students
+
+    if unassigned_students:
+        summary = {'group_id': len(schedule['groups']) + 1, 'time_slot': UNASSIGNED_LABEL, 'size': len(unassigned_students), 'is_unassigned': True}
+        students = ((student['name'],
+                     [int(c) for c in _record_bits(student['attributes'], matrix.attribute_names)],
+                     [int(c) for c in _record_bits(student['availabilities'], matrix.time_slots)]) for student in unassigned_students)
+        yield summary, students
+
+def stream_csv(schedule, matrix, unassigned_students):
+    """
+    the schedule as csv text in the layout of examples/sample_result_sheets (one row per student: name, group, time
+    slot, then the attribute and availability columns), yielded one group at a time
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(['Student Name', 'Assigned Group', 'Assigned Time Slot'] + matrix.attribute_names + matrix.time_slots)
+    # quote the text columns like the sample sheets do, leave the 0/1 columns bare
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator='\n')
+    for group, students in _export_groups(schedule, matrix, unassigned_students):
+        group_label = UNASSIGNED_LABEL if group.get('is_unassigned') else f"Group {group['group_id']}"
+        for name, attributes, availabilities in students:
+            writer.writerow([name, group_label, group['time_slot']] + attributes + availabilities)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def stream_ndjson(schedule, matrix, unassigned_students):
+    """
+    the schedule as newline-delimited json: first a 'schedule' line with everything but the groups (plus the column
+    labels), then one 'group' line per group whose students carry their attributes and availabilities as '0'/'1'
+    strings in that column order
+    """
+    header = {name: value for name, value in schedule.items() if name != 'groups'}
+    header['total_students'] = int(schedule.get('total_students', 0)) + len(unassigned_students)
+    header.update(type='schedule', attribute_names=matrix.attribute_names, time_slots=matrix.time_slots)
+    yield json.dumps(header) + '\n'
+
+    for group, students in _export_groups(schedule, matrix, unassigned_students):
+        line = dict(group, type='group', students=[
+            {'name': name, 'attributes': ''.join(map(str, attributes)), 'availabilities': ''.join(map(str, availabilities))}
+            for name, attributes, availabilities in students
+        ])
+        yield json.dumps(line) + '\n'
@@ -0,0 +1,108 @@
+"""
+synthetic roster csvs (same layout the upload expects) for benchmarking the parser and the scheduler at realistic sizes
+
+usage (from the backend folder):
+    python roster_generator.py --students 2000 --slots 12 --attributes 4 --attribute-density 0.3 --availability 0.4 -o roster.csv
+"""
+import io
+import csv
+import sys
+import json
+import argparse
+import numpy as np
+
+# constraint presets, from "almost anything goes" to "every group has to be just right"
+TIGHTNESS_LEVELS = ('loose', 'medium', 'tight')
+
+def generate_roster(num_students, num_time_slots, num_attributes=2, attribute_density=0.3, availability=0.4,
+                    unavailable_fraction=0.0, seed=0):
+    """
+    random roster as csv rows (header first): First, Last, the attribute columns, then one column per time slot
+    attribute_density: chance that a student has any given attribute
+    availability: chance that a student is available at any given slot (lower = sparser availability matrix)
+    unavailable_fraction: share of students with no availability at all (they end up in the unassigned group)
+    every other student gets at least one available slot
+    """
+    rng = np.random.default_rng(seed)
+    attribute_names = attribute_columns(num_attributes)
+    time_slots = [f'Slot {t + 1}' for t in range(num_time_slots)]
+
+    attributes = rng.random((num_students, num_attributes)) < attribute_density
+    availabilities = rng.random((num_students, num_time_slots)) < availability
+    if num_time_slots:
+        # nobody should be unavailable by accident; give them one random slot
+        nowhere = np.flatnonzero(~availabilities.any(axis=1))
+        availabilities[nowhere, rng.integers(0, num_time_slots, len(nowhere))] = True
+        availabilities[rng.random(num_students) < unavailable_fraction] = False
+
+    rows = [['First', 'Last'] + attribute_names + time_slots]
+    for s in range(num_students):
+        rows.append([f'Student{s + 1}', f'Synthetic{s + 1}']
+                    + ['1' if has else '0' for has in attributes[s]]
+                    + ['1' if available else '0' for available in availabilities[s]])
+    return rows
+
+def attribute_columns(num_attributes):
+    return [f'Attribute {j + 1}' for j in range(num_attributes)]
+
+def roster_csv(rows):
+    """the rows as csv bytes, like an uploaded file"""
+    text = io.StringIO()
+    csv.writer(text, lineterminator='\n').writerows(rows)
+    return text.getvalue().encode('utf-8')
+
+def constraint_form(tightness, num_students, num_attributes=2):
+    """
+    the form fields the frontend would send alongside the roster, for one of TIGHTNESS_LEVELS
+    loose: groups of 3-8, no attribute rules
+    medium: groups of 4-8, at least one student with the first attribute in each group
+    tight: groups of 5-7, one or two with the first attribute, at most three with the first or second attribute
+    """
+    if tightness not in TIGHTNESS_LEVELS:
+        raise ValueError(f"tightness must be one of {', '.join(TIGHTNESS_LEVELS)}")
+    attribute_names = [attr.lower() for attr in attribute_columns(num_attributes)]
+
+    if tightness == 'loose':
+        size_min, size_max = 3, 8
+    elif tightness == 'medium':
+        size_min, size_max = 4, 8
+    else:
+        size_min, size_max = 5, 7
+    form = {
+        'given_attributes': ', '.join(attribute_names),
+        'group_size_min': str(size_min),
+        'group_size_max': str(size_max),
+        'group_count_min': '1',
+        'group_count_max': str(max(num_students // size_min, 1))
+    }
+
+    if tightness in ('medium', 'tight') and attribute_names:
+        form[f'{attribute_names[0]}_min_per_group'] = '1'
+    if tightness == 'tight' and attribute_names:
+        form[f'{attribute_names[0]}_max_per_group'] = '2'
+        if len(attribute_names) > 1:
+            form['combined_constraints'] = json.dumps([{'attributes': attribute_names[:2], 'max': 3}])
+    return form
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='write a synthetic SmartGroups roster csv')
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--slots', type=int, default=10)
+    parser.add_argument('--attributes', type=int, default=2)
+    parser.add_argument('--attribute-density', type=float, default=0.3)
+    parser.add_argument('--availability', type=float, default=0.4)
+    parser.add_argument('--unavailable-fraction', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='csv file to write (default: stdout)')
+    args = parser.parse_args(argv)
+
+    data = roster_csv(generate_roster(args.students, args.slots, args.attributes, args.attribute_density, args.availability,
+                                      args.unavailable_fraction, args.seed))
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(data)
+    else:
+        sys.stdout.buffer.write(data)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from student_matrix import StudentMatrix
+
+ROSTER_ID_PATTERN = re.compile(r'[0-9a-f]{24}')
+
+def roster_id(parsed):
+    """
+    content hash of a parsed roster (names, column labels, the 0/1 data and the students set aside as unassigned),
+    so uploading the same sheet with the same attributes twice gives the same id
+    """
+    matrix = parsed['matrix']
+    digest = hashlib.sha256()
+    digest.update(json.dumps([matrix.names, matrix.attribute_names, matrix.time_slots, parsed['unassigned_students'],
+                              parsed['total_students']], sort_keys=True).encode('utf-8'))
+    digest.update(np.ascontiguousarray(matrix.attributes, dtype=np.uint8).tobytes())
+    digest.update(np.ascontiguousarray(matrix.availabilities, dtype=np.uint8).tobytes())
+    return digest.hexdigest()[:24]
+
+def roster_info(roster_id, parsed):
+    """what the api says about a stored roster"""
+    matrix = parsed['matrix']
+    return {
+        'roster_id': roster_id,
+        'total_students': parsed['total_students'],
+        'unassigned_students': len(parsed['unassigned_students']),
+        'attribute_names': matrix.attribute_names,
+        'time_slots': matrix.time_slots
+    }
+
+class RosterStore:
+    def __init__(self, max_entries=32, store_dir=None):
+        """
+        parsed rosters by id, so staff tuning constraints can re-schedule a sheet without uploading and parsing it again
+        keeps the max_entries most recently used in memory; with store_dir they also go to disk and survive restarts:
+        one folder per roster with the names, column labels and unassigned students as json, and the 0/1 matrices as
+        .npy files that are memory-mapped back in (so a big roster costs no memory until a solve reads it)
+        """
+        self.max_entries = max_entries
+        self.store_dir = store_dir
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+
+    def add(self, parsed):
+        """store a parse_student_rows result, returns its roster id"""
+        key = roster_id(parsed)
+        parsed = {name: parsed[name] for name in ('matrix', 'unassigned_students', 'total_students')}
+        self._remember(key, parsed)
+        self._write_disk(key, parsed)
+        return key
+
+    def get(self, key):
+        """{'matrix', 'unassigned_students', 'total_students'} for key, or None if there's no such roster"""
+        if not ROSTER_ID_PATTERN.fullmatch(key or ''):
+            return None
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return dict(self._memory[key])
+
+        parsed = self._read_disk(key)
+        if parsed is not None:
+            self._remember(key, parsed)
+            return dict(parsed)
+        return None
+
+    def delete(self, key):
+        """forget a roster; returns False if there was no such roster"""
+        if not ROSTER_ID_PATTERN.fullmatch(key or ''):
+            return False
+        with self._lock:
+            found = self._memory.pop(key, None) is not None
+        if self.store_dir and os.path.isdir(self._path(key)):
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            found = True
+        return found
+
+    def _remember(self, key, parsed):
+        with self._lock:
+            self._memory[key] = parsed
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.store_dir, key)
+
+    def _read_disk(self, key):
+        if not self.store_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, 'roster.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            attributes = np.load(os.path.join(path, 'attributes.npy'), mmap_mode='r')
+            availabilities = np.load(os.path.join(path, 'availabilities.npy'), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # damaged entry, treat it as gone
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        matrix = StudentMatrix(meta['names'], meta['attribute_names'], meta['time_slots'], attributes, availabilities)
+        return {'matrix': matrix, 'unassigned_students': meta['unassigned_students'], 'total_students': meta['total_students']}
+
+    def _write_disk(self, key, parsed):
+        if not self.store_dir or os.path.isdir(self._path(key)):
+            return # same content is already there
+        matrix = parsed['matrix']
+        path = self._path(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(temp_path, exist_ok=True)
+            with open(os.path.join(temp_path, 'roster.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'names': matrix.names,
+                    'attribute_names': matrix.attribute_names,
+                    'time_slots': matrix.time_slots,
+                    'unassigned_students': parsed['unassigned_students'],
+                    'total_students': parsed['total_students']
+                }, f)
+            np.save(os.path.join(temp_path, 'attributes.npy'), np.ascontiguousarray(matrix.attributes, dtype=np.uint8))
+            np.save(os.path.join(temp_path, 'availabilities.npy'), np.ascontiguousarray(matrix.availabilities, dtype=np.uint8))
+            os.rename(temp_path, path) # readers never see a half-written roster
+        except OSError:
+            # another request stored the same roster first, or the disk is unhappy; the memory copy still works
+            shutil.rmtree(temp_path, ignore_errors=True)
@@ -1,205 +1,903 @@
+import math
+import time
+import threading
 from typing import List, Dict, Set, Tuple, Optional, Any
+import numpy as np
 from constraint_parser import SchedulingConstraints
+from student_matrix import StudentMatrix
+from feasibility import find_infeasibility, slot_group_caps
+from diagnostics import PhaseTimer
 from ortools.sat.python import cp_model
 
+# ways of ordering the (otherwise interchangeable) groups so the solver doesn't explore every relabeling
+SYMMETRY_BREAKING_MODES = ('none', 'index', 'time_slot')
+
+# prebind_slots settings: 'auto' pre-binds (the sparse model) whenever that takes no more variables than letting the
+# solver pick every group's slot (the dense model)
+PREBIND_MODES = (True, False, 'auto')
+
+# what schedule() can optimize for; 'weighted' mixes the others using the constraints' objective_weights
+# (min_moves only means something when re-solving from a previous schedule, see the hint argument)
+OBJECTIVES = ('none', 'min_groups', 'balance_sizes', 'spread_attributes', 'min_moves', 'weighted')
+WEIGHTED_OBJECTIVE_TERMS = ('min_groups', 'balance_sizes', 'spread_attributes', 'min_moves')
+
+# seconds explain_infeasibility() may spend in total narrowing down a conflict (capped by the solve's own time limit)
+EXPLAIN_TIME_LIMIT = 10
+
+# what schedule() returns when stop() was called before it finished
+CANCELLED_RESULT = {'error': 'Scheduling was cancelled.', 'cancelled': True}
+
+class SolutionRecorder(cp_model.CpSolverSolutionCallback):
+    def __init__(self, has_objective=False, on_solution=None):
+        """
+        keeps a log of every feasible solution cp-sat finds on the way (when it was found and, if there is an
+        objective, how good it was); on_solution gets called with the log after each one
+        """
+        super().__init__()
+        self.has_objective = has_objective
+        self.solutions = []
+        self._on_solution = on_solution
+
+    def on_solution_callback(self):
+        entry = {'wall_time': round(self.WallTime(), 3)}
+        if self.has_objective:
+            entry['objective'] = self.ObjectiveValue()
+            entry['best_bound'] = self.BestObjectiveBound()
+        self.solutions.append(entry)
+        if self._on_solution is not None:
+            self._on_solution(self.solutions)
+
 class GroupScheduler:
-    def __init__(self, student_data, constraints):
+    def __init__(self, student_data, constraints, symmetry_breaking='index', prebind_slots='auto', hint=None):
         """
         initialize the scheduler with student data and constraints
-        student_data: dict with 'names', 'attributes', 'availabilities' 
+        student_data: StudentMatrix (or the old dict with 'names', 'attributes', 'availabilities')
         constraints: SchedulingConstraints object
+        symmetry_breaking: 'none', 'index' (active groups come first) or 'time_slot' (active groups also sorted by time slot)
+        prebind_slots: if True, each candidate group is tied to one time slot before solving instead of letting the solver pick it
+                       (student variables then only exist where the student is available); 'auto' does that when it makes
+                       the smaller model
+        hint: optional assignment [(time slot index, [student indices])] for the solver to start its search from, e.g. the
+              previous schedule when re-solving after a small change (the min_moves objective then keeps students in it)
         """
-        self.student_data = student_data
+        if symmetry_breaking not in SYMMETRY_BREAKING_MODES:
+            raise ValueError(f"symmetry_breaking must be one of {', '.join(SYMMETRY_BREAKING_MODES)}")
+        if prebind_slots not in PREBIND_MODES:
+            raise ValueError("prebind_slots must be true, false or 'auto'")
+        objective, objective_weights = constraints.get_objective()
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+        for term in objective_weights:
+            if term not in WEIGHTED_OBJECTIVE_TERMS:
+                raise ValueError(f"objective weights can only be given for {', '.join(WEIGHTED_OBJECTIVE_TERMS)}")
+        for rule in list(constraints.get_attribute_constraints().values()) + list(constraints.get_combined_constraints()):
+            weight = rule.get('weight', 1)
+            if rule.get('soft') and (isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0):
+                raise ValueError('soft constraint weights must be positive numbers')
+
+        # accept the old {'names', 'attributes', 'availabilities'} dict too
+        if not isinstance(student_data, StudentMatrix):
+            student_data = StudentMatrix.from_records(student_data['names'], student_data['attributes'], student_data['availabilities'])
+
+        self.matrix = student_data
         self.constraints = constraints
-        self.num_students = len(student_data['names'])
-        self.time_slots = self._extract_time_slots()
-        self.num_time_slots = len(self.time_slots)
-        
-    def _extract_time_slots(self):
-        return list(self.student_data['availabilities'][0].keys())
-    
-    def _get_student_availability(self, student_idx, time_slot):
+        self.symmetry_breaking = symmetry_breaking
+        self.prebind_slots = prebind_slots
+        self.hint = hint
+        self.num_students = self.matrix.num_students
+        self.time_slots = self.matrix.time_slots
+        self.num_time_slots = self.matrix.num_time_slots
+
+        # set by stop() (possibly from another thread) to abandon a running schedule()
+        self._stop_requested = threading.Event()
+        self._solver = None
+        # model size and solver counters of the last schedule(), see schedule()
+        self._diagnostics = {}
+
+    def _max_groups(self, explain=False):
         """
-        check if student student_idx is available at time_slot
+        how many groups the model makes room for: the group count maximum, and never more than the roster fills at the
+        minimum group size (explaining can switch the size bounds off, so there only the roster size counts)
         """
-        if student_idx >= len(self.student_data['availabilities']):
-            return False
-        
-        avail_data = self.student_data['availabilities'][student_idx]
-        return str(avail_data.get(time_slot, 0)) == '1'
+        max_groups = min(self.constraints.group_count_max, self.num_students) if self.constraints.group_count_max else self.num_students
+        if not explain:
+            max_groups = min(max_groups, self.num_students // max(self.constraints.group_size_min, 1))
+        return max_groups
+
+    def _candidate_group_slots(self, max_groups, explain=False):
+        """
+        decide up front which time slot each candidate group meets at (used when prebind_slots is on)
+        a slot gets as many candidate groups as its available students could fill at the minimum group size, and no more
+        than its students with each attribute minimum allow; explaining can switch those rules off, so there a slot gets
+        one candidate per available student (a group of one each), or else the explanation would be stricter than the rules
+        """
+        if explain:
+            caps = self.matrix.availabilities.sum(axis=0)
+        else:
+            caps = slot_group_caps(self.matrix, self.constraints)
+        group_slots = []
+        for t in range(self.num_time_slots):
+            group_slots.extend([t] * min(max_groups, int(caps[t])))
+        return group_slots
+
+    def _use_prebind(self, max_groups, group_slots):
+        """
+        whether to build the sparse model (candidate groups pre-bound to slots, student variables only where available)
+        rather than the dense one (every student x every group, plus each group's slot choice); 'auto' goes by which one
+        needs fewer variables; the dense model also adds a term per (unavailable student, group, slot) on top
+        """
+        if self.prebind_slots != 'auto':
+            return bool(self.prebind_slots)
+        available_per_slot = self.matrix.availabilities.sum(axis=0)
+        sparse_variables = sum(int(available_per_slot[t]) for t in group_slots)
+        dense_variables = max_groups * (self.num_students + self.num_time_slots)
+        return sparse_variables <= dense_variables
+
+    def _add_symmetry_breaking(self, model, student_in_group, group_active, group_uses_time, group_slots, num_groups,
+                               order_by_first_member=True, pinned_groups=()):
+        """
+        groups are interchangeable, so fix an order on them: active groups first (per time slot if groups are pre-bound),
+        then in 'index' mode by their first member, and in 'time_slot' mode by time slot instead
+        pinned_groups are left alone (they stand for a specific group of a previous schedule)
+        """
+        if self.symmetry_breaking == 'none':
+            return
+
+        blocks = self._interchangeable_groups(group_slots, num_groups, pinned_groups)
+        for block in blocks:
+            for g, next_g in zip(block, block[1:]):
+                model.AddImplication(group_active[next_g], group_active[g])
+
+        if self.symmetry_breaking == 'index' and order_by_first_member:
+            # ordering groups by their first member means the k-th group can't hold any of the first k students that could join it
+            for block in blocks:
+                rank = 0
+                for s in range(self.num_students):
+                    if rank >= len(block) - 1:
+                        break
+                    if group_slots is not None and not self.matrix.availabilities[s, group_slots[block[0]]]:
+                        continue
+                    model.Add(cp_model.LinearExpr.Sum([student_in_group[s][g] for g in block[rank + 1:]]) == 0)
+                    rank += 1
+
+        # pre-bound groups are already laid out in time slot order
+        if self.symmetry_breaking == 'time_slot' and group_slots is None:
+            for block in blocks:
+                for g, next_g in zip(block, block[1:]):
+                    slot_g = cp_model.LinearExpr.WeightedSum(group_uses_time[g], range(self.num_time_slots))
+                    slot_next = cp_model.LinearExpr.WeightedSum(group_uses_time[next_g], range(self.num_time_slots))
+                    model.Add(slot_g <= slot_next).OnlyEnforceIf(group_active[next_g])
+
+    def _interchangeable_groups(self, group_slots, num_groups, pinned_groups=()):
+        """
+        runs of group indices that are interchangeable: all of them, or the groups pre-bound to the same slot
+        (minus pinned_groups)
+        """
+        blocks = []
+        for g in range(num_groups):
+            if g in pinned_groups:
+                continue
+            if blocks and (group_slots is None or group_slots[blocks[-1][0]] == group_slots[g]):
+                blocks[-1].append(g)
+            else:
+                blocks.append([g])
+        return blocks
     
-    def _get_student_attribute(self, student_idx, attribute):
+    def _hint_placement(self, group_slots, num_groups, keep_order=False):
+        """
+        match the hint's groups to model groups: ordered by first member (like the symmetry breaking does) unless
+        keep_order is set, and for pre-bound groups into the next free group of the right slot
+        returns [(model group, students, slot)]
+        """
+        hinted_groups = [(sorted(students), slot_idx) for slot_idx, students in self.hint if len(students)]
+        if not keep_order:
+            hinted_groups.sort()
+        placement = []
+        if group_slots is None:
+            for g, (students, slot_idx) in enumerate(hinted_groups[:num_groups]):
+                placement.append((g, students, slot_idx))
+            return placement
+
+        free_groups = {}
+        for g in range(num_groups):
+            free_groups.setdefault(group_slots[g], []).append(g)
+        for students, slot_idx in hinted_groups:
+            if free_groups.get(slot_idx):
+                placement.append((free_groups[slot_idx].pop(0), students, slot_idx))
+        return placement
+
+    def _add_hint(self, model, student_in_group, group_active, group_uses_time, group_slots, num_groups, placement):
+        """
+        give the solver self.hint (placed by _hint_placement) as its starting point
+        only the parts that still fit are hinted: students who are new, or no longer available at their hinted group's slot,
+        are left for the solver to place (a complete hint that's infeasible makes cp-sat spend ages repairing it first)
+        """
+        hinted_group = {}
+        hinted_slot = {}
+        for g, students, slot_idx in placement:
+            hinted_slot[g] = slot_idx
+            for s in students:
+                if slot_idx is not None and self.matrix.availabilities[s, slot_idx]:
+                    hinted_group[s] = g
+
+        for g, slot_idx in hinted_slot.items():
+            model.AddHint(group_active[g], True)
+            if group_slots is None and slot_idx is not None:
+                for t in range(self.num_time_slots):
+                    model.AddHint(group_uses_time[g][t], t == slot_idx)
+        for s, hinted in hinted_group.items():
+            for g in range(num_groups):
+                if group_slots is not None and not self.matrix.availabilities[s, group_slots[g]]:
+                    continue # fixed to 0 anyway
+                model.AddHint(student_in_group[s][g], g == hinted)
+
+    def _objective_weights(self):
+        """which objective terms are switched on and how much each one counts"""
+        objective, objective_weights = self.constraints.get_objective()
+        if objective == 'none':
+            return {}
+        if objective == 'weighted':
+            weights = {term: 1 for term in WEIGHTED_OBJECTIVE_TERMS}
+            weights.update(objective_weights)
+            return {term: weight for term, weight in weights.items() if weight}
+        return {objective: 1}
+
+    def _soft_rules(self):
+        """
+        the attribute and combined constraints marked soft, one entry per bound:
+        (description, students it counts, 'min' or 'max', the bound, weight)
+        """
+        rules = []
+        for attr, cons in self.constraints.get_attribute_constraints().items():
+            if not cons.get('soft'):
+                continue
+            students = self.matrix.students_with_attribute(attr)
+            weight = cons.get('weight', 1)
+            if 'min_per_group' in cons:
+                rules.append((f"at least {cons['min_per_group']} per group with attribute '{attr}'", students, 'min', cons['min_per_group'], weight))
+            if 'max_per_group' in cons:
+                rules.append((f"at most {cons['max_per_group']} per group with attribute '{attr}'", students, 'max', cons['max_per_group'], weight))
+        for combined in self.constraints.get_combined_constraints():
+            if not combined.get('soft'):
+                continue
+            attrs = combined.get('attributes', [])
+            attrs_label = ', '.join(f"'{attr}'" for attr in attrs)
+            students = self.matrix.students_with_any_attribute(attrs)
+            weight = combined.get('weight', 1)
+            if combined.get('min') is not None:
+                rules.append((f"at least {combined['min']} per group with any of {attrs_label}", students, 'min', combined['min'], weight))
+            if combined.get('max') is not None:
+                rules.append((f"at most {combined['max']} per group with any of {attrs_label}", students, 'max', combined['max'], weight))
+        return rules
+
+    def _add_spread(self, model, counts, group_active, upper_bound, name):
+        """
+        (largest - smallest) of counts over the active groups, as a linear expression
+        counts[g] is a linear expression for group g; inactive groups count as 0 so they never raise the largest
+        """
+        largest = model.NewIntVar(0, upper_bound, f'{name}_largest')
+        smallest = model.NewIntVar(0, upper_bound, f'{name}_smallest')
+        for g, count in enumerate(counts):
+            model.Add(count <= largest)
+            model.Add(count >= smallest).OnlyEnforceIf(group_active[g])
+        return largest - smallest
+
+    def _keeps_previous_groups(self):
+        """True when re-solving with min_moves: the hint's groups then keep their identity in the model"""
+        return bool(self.hint) and 'min_moves' in self._objective_weights()
+
+    def _add_objective(self, model, student_in_group, group_active, group_uses_time, num_groups, placement, group_vars, rule_vars, soft_slacks=()):
         """
-        check if student student_idx has 1 for attribute
+        group_vars and rule_vars: the per-group variable lists _build_model keeps for its own sums
+        soft_slacks: [(weight, slack variables)] per soft rule; how far the groups miss the soft constraints (weighted)
+                     comes first, the terms below only decide between schedules that miss them equally
+        min_groups: as few groups as possible
+        balance_sizes: group sizes as even as possible (largest group - smallest group)
+        spread_attributes: every attribute spread as evenly as possible over the groups (summed over attributes)
+        min_moves: as few students of the previous schedule (the hint, placed by _hint_placement) as possible leave their
+                   group or have it meet at another time slot
         """
-        if student_idx >= len(self.student_data['attributes']):
-            return False
+        weights = self._objective_weights()
+        if not weights and not soft_slacks:
+            return
+
+        terms = []
+        coefficients = []
+        # the most each term can come to, see the soft constraints below
+        term_bounds = []
+        if 'min_groups' in weights:
+            terms.append(cp_model.LinearExpr.Sum(group_active))
+            coefficients.append(weights['min_groups'])
+            term_bounds.append(num_groups)
+
+        if 'balance_sizes' in weights:
+            group_sizes = [cp_model.LinearExpr.Sum(group_vars[g]) for g in range(num_groups)]
+            size_bound = self.constraints.group_size_max or self.num_students
+            terms.append(self._add_spread(model, group_sizes, group_active, size_bound, 'group_size'))
+            coefficients.append(weights['balance_sizes'])
+            term_bounds.append(size_bound)
+
+        if 'spread_attributes' in weights:
+            for j, attr in enumerate(self.matrix.attribute_names):
+                students_with_attr = self.matrix.students_with_attribute(attr)
+                attr_counts = [cp_model.LinearExpr.Sum(vars_of_group) for vars_of_group in rule_vars(students_with_attr)]
+                terms.append(self._add_spread(model, attr_counts, group_active, len(students_with_attr), f'attribute_{j}'))
+                coefficients.append(weights['spread_attributes'])
+                term_bounds.append(len(students_with_attr))
+
+        if 'min_moves' in weights and placement:
+            stays = []
+            for g, students, slot_idx in placement:
+                for s in students:
+                    if group_uses_time is None or slot_idx is None:
+                        stays.append(student_in_group[s][g])
+                    else:
+                        # the group can move to another slot too, so staying means same group and same slot
+                        stay = model.NewBoolVar(f'student_{s}_stays')
+                        model.AddImplication(stay, student_in_group[s][g])
+                        model.AddImplication(stay, group_uses_time[g][slot_idx])
+                        stays.append(stay)
+            terms.append(len(stays) - cp_model.LinearExpr.Sum(stays))
+            coefficients.append(weights['min_moves'])
+            term_bounds.append(len(stays))
+
+        if soft_slacks:
+            # one unit of (weighted) violation costs more than all the other terms together ever can, so the schedule
+            # that breaks the soft constraints least wins and the objective only picks among those
+            other_terms = sum(coefficient * bound for coefficient, bound in zip(coefficients, term_bounds))
+            scale = math.floor(other_terms / min(weight for weight, _ in soft_slacks)) + 1
+            for weight, slacks in soft_slacks:
+                terms.append(cp_model.LinearExpr.Sum(slacks))
+                coefficients.append(weight * scale)
+
+        if terms:
+            model.Minimize(cp_model.LinearExpr.WeightedSum(terms, coefficients))
+
+    def stop(self):
+        """
+        ask a running schedule() to give up (safe to call from another thread)
+        """
+        self._stop_requested.set()
+        if self._solver is not None:
+            self._solver.StopSearch()
+
+    def _presolve_error(self):
+        """the error response if the cheap feasibility checks already rule the constraints out, else None"""
+        reasons = find_infeasibility(self.matrix, self.constraints)
+        if not reasons:
+            return None
+        return {'error': 'No valid solution found with the given constraints: ' + ' '.join(reasons), 'reasons': reasons}
+
+    def explain_infeasibility(self):
+        """
+        for a roster/constraints combination cp-sat proved infeasible: name a smallest set of the user's constraints
+        that already can't be met together (drop any one of them and the rest can)
+        every constraint gets its own assumption literal; cp-sat's sufficient assumptions for infeasibility give a first
+        conflict, which is then shrunk by trying to leave each constraint out in turn
+        returns (descriptions, minimal) where minimal is False if the time ran out before every constraint was tried,
+        or None if no conflict could be found in time
+        """
+        built = self._build_model(explain=True)
+        if built is None:
+            return None
+        model, variables = built
+        assumptions = variables['assumptions']
+        descriptions = {literal.Index(): description for description, literal in assumptions.items()}
+        time_limit = min(EXPLAIN_TIME_LIMIT, self.constraints.time_limit or EXPLAIN_TIME_LIMIT)
+        deadline = time.perf_counter() + time_limit
+
+        def solve_with(conflict):
+            """solve with only the given constraints switched on; returns (status, cp-sat's own conflict)"""
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or self._stop_requested.is_set():
+                return cp_model.UNKNOWN, None
+            model.ClearAssumptions()
+            model.AddAssumptions([assumptions[description] for description in conflict])
+            solver = cp_model.CpSolver()
+            solver.parameters.max_time_in_seconds = remaining
+            solver.parameters.num_workers = 1 # sufficient assumptions are only reported by a single worker
+            self._solver = solver
+            status = solver.Solve(model)
+            if status != cp_model.INFEASIBLE:
+                return status, None
+            return status, [descriptions[index] for index in solver.SufficientAssumptionsForInfeasibility()]
+
+        status, conflict = solve_with(list(assumptions))
+        if status != cp_model.INFEASIBLE:
+            return None
+
+        # deletion filter: a constraint stays only if the others are satisfiable without it
+        minimal = True
+        for description in list(conflict):
+            if description not in conflict:
+                continue # already dropped with an earlier, smaller conflict
+            status, smaller = solve_with([d for d in conflict if d != description])
+            if status == cp_model.INFEASIBLE:
+                conflict = [d for d in conflict if d in smaller]
+            elif status == cp_model.UNKNOWN:
+                minimal = False
+        return conflict, minimal
+
+    def schedule(self, progress_callback=None):
+        """
+        generate groups based on constraints using ortools sat solver
+        progress_callback: optional function called with the name of each phase ('checking', 'building_model', 'solving',
+                           'explaining', 'formatting') plus keyword details (e.g. solutions_found while solving)
+        the result always carries a 'diagnostics' block: seconds spent per phase, model size and cp-sat search counters
+        """
+        timer = PhaseTimer()
+        self._diagnostics = {}
+        def report_progress(phase, **details):
+            timer.start(phase)
+            if progress_callback is not None:
+                progress_callback(phase, **details)
+
+        result = self._schedule(report_progress)
+        timer.stop()
+        result['diagnostics'] = dict(self._diagnostics, phases=timer.as_dict())
+        return result
+
+    def _schedule(self, report_progress):
+        # hopeless inputs are caught here in milliseconds instead of after a full failed solve
+        report_progress('checking')
+        presolve_error = self._presolve_error()
+        if presolve_error is not None:
+            return presolve_error
+
+        report_progress('building_model')
+        built = self._build_model()
+        if built is None:
+            return CANCELLED_RESULT.copy()
+        model, variables = built
+        # sparse = groups pre-bound to time slots (see _use_prebind)
+        self._diagnostics['model'] = dict(model_size(model), formulation='dense' if variables['group_slots'] is None else 'sparse')
+        group_active = variables['group_active']
+        group_uses_time = variables['group_uses_time']
+        group_slots = variables['group_slots']
+        num_groups = variables['num_groups']
         
-        attr_data = self.student_data['attributes'][student_idx]
-        return str(attr_data.get(attribute, 0)) == '1'
+        # solve for best solution
+        solver = cp_model.CpSolver()
+        self._configure_solver(solver)
+        self._solver = solver
+        if self._stop_requested.is_set():
+            return CANCELLED_RESULT.copy()
+        report_progress('solving')
+        recorder = SolutionRecorder(model.HasObjective(), lambda solutions: report_progress('solving', solutions_found=len(solutions)))
+        status = solver.Solve(model, recorder)
+
+        if self._stop_requested.is_set():
+            return CANCELLED_RESULT.copy()
+
+        solve_stats = self._solve_stats(solver, status, recorder)
+        self._diagnostics['solver'] = solver_counters(solver, status)
+        
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+            report_progress('formatting')
+            if group_slots is None:
+                group_slots = self._solution_group_slots(solver, group_uses_time, num_groups)
+            assignment = self._solution_assignment(solver, variables['group_vars'], variables['group_members'], group_slots, group_active, num_groups)
+            result = self._format_solution(assignment)
+            # FEASIBLE = best found before a limit kicked in, not proven optimal
+            result['solver_status'] = solver.StatusName(status)
+            result['solve_stats'] = solve_stats
+            result['objective'] = self.constraints.get_objective()[0]
+            if self.hint:
+                result['moved_students'] = count_moved_students(self.hint, assignment)
+            return result
+        elif status == cp_model.UNKNOWN:
+            # ran out of time (or was stopped) before finding anything
+            return {
+                'error': f'No solution was found within the time limit ({self.constraints.time_limit} seconds). Try a longer time limit or looser constraints.',
+                'solver_status': solver.StatusName(status),
+                'solve_stats': solve_stats
+            }
+        else:
+            # proven infeasible: find out which of the user's constraints clash
+            report_progress('explaining')
+            explanation = self.explain_infeasibility()
+            if self._stop_requested.is_set():
+                return CANCELLED_RESULT.copy()
+            result = {'solver_status': solver.StatusName(status), 'solve_stats': solve_stats}
+            if explanation and explanation[0]:
+                conflict, minimal = explanation
+                result['error'] = 'No valid solution found with the given constraints. These constraints cannot all be met together: ' + '; '.join(conflict) + '.'
+                result['conflicting_constraints'] = conflict
+                result['minimal_conflict'] = minimal
+            else:
+                result['error'] = 'No valid solution found with the given constraints. The combination of constraints may be too strict or incompatible with the data.'
+            return result
     
-    def schedule(self):
+    def _build_model(self, explain=False):
         """
-        generate groups based on constraints using ortools sat solver
+        build the cp-sat model for the current roster and constraints
+        explain: if True, every user-facing constraint (size bounds, count bounds, each attribute/combined bound,
+                 availability) is switched on by its own literal so explain_infeasibility() can turn them off one by one;
+                 objective and hint are left out
+        returns (model, variables) or None if stop() was called while building; in explain mode variables only holds
+        the {description: literal} assumptions
         """
         model = cp_model.CpModel()
+
+        # assumptions[description] = literal that switches one user-facing constraint on (explain mode only)
+        assumptions = {}
+        def switch(description):
+            if not explain:
+                return []
+            if description not in assumptions:
+                assumptions[description] = model.NewBoolVar(f'assume_{len(assumptions)}')
+            return [assumptions[description]]
+        availability = "students' time slot availability"
         
         # Variables
-        max_groups = min(self.constraints.group_count_max, self.num_students) if self.constraints.group_count_max else self.num_students
+        max_groups = self._max_groups(explain)
+
+        # group_slots[g] = time slot index group g is bound to (only when pre-binding, otherwise the solver picks it)
+        group_slots = self._candidate_group_slots(max_groups, explain) if self.prebind_slots else None
+        if group_slots is not None and not self._use_prebind(max_groups, group_slots):
+            group_slots = None
+        num_groups = len(group_slots) if group_slots is not None else max_groups
         
+        # index lists the constraints below keep going back to
+        available = self.matrix.availabilities.astype(bool)
+        # group_members[g] = the students who could be in group g (for a pre-bound group, the ones available at its slot)
+        if group_slots is not None and not explain:
+            slot_students = [np.flatnonzero(available[:, t]) for t in range(self.num_time_slots)]
+            group_members = [slot_students[t] for t in group_slots]
+        else:
+            group_members = [np.arange(self.num_students)] * num_groups
+        # student_groups[s] = the groups student s could be in
+        student_groups = [[] for _ in range(self.num_students)]
+        for g in range(num_groups):
+            for s in group_members[g].tolist():
+                student_groups[s].append(g)
+
         # student_in_group[s][g] = 1 if student s is in group g
-        student_in_group = {}
+        # (a pre-bound group can never hold a student who isn't available at its slot, so that's just a constant 0,
+        # unless availability has to be switchable for explaining)
+        # group_vars[g] = group g's variables of group_members[g], in the same order (the constant 0s left out)
+        zero = model.NewConstant(0)
+        student_in_group = []
+        group_vars = [[] for _ in range(num_groups)]
         for s in range(self.num_students):
-            student_in_group[s] = {}
-            for g in range(max_groups):
-                student_in_group[s][g] = model.NewBoolVar(f'student_{s}_in_group_{g}')
+            if self._stop_requested.is_set():
+                return None
+            row = [zero] * num_groups
+            for g in student_groups[s]:
+                row[g] = model.NewBoolVar(f'student_{s}_in_group_{g}')
+                group_vars[g].append(row[g])
+            student_in_group.append(row)
+        if explain and group_slots is not None:
+            for g in range(num_groups):
+                unavailable = np.flatnonzero(~available[:, group_slots[g]]).tolist()
+                if unavailable:
+                    model.Add(cp_model.LinearExpr.Sum([student_in_group[s][g] for s in unavailable]) == 0).OnlyEnforceIf(switch(availability))
+
+        def rule_vars(students):
+            """per group, the variables of those students (sorted indices) that could be in it"""
+            is_rule_member = np.zeros(self.num_students, dtype=bool)
+            is_rule_member[students] = True
+            positions = {}
+            rule_group_vars = []
+            for g in range(num_groups):
+                key = id(group_members[g]) # groups pre-bound to the same slot share their member array
+                if key not in positions:
+                    positions[key] = np.flatnonzero(is_rule_member[group_members[g]]).tolist()
+                rule_group_vars.append([group_vars[g][i] for i in positions[key]])
+            return rule_group_vars
         
-        # group_uses_time[g][t] = 1 if group g uses time slot t
-        group_uses_time = {}
-        for g in range(max_groups):
-            group_uses_time[g] = {}
-            for t in range(self.num_time_slots):
-                group_uses_time[g][t] = model.NewBoolVar(f'group_{g}_uses_time_{t}')
+        # group_uses_time[g][t] = 1 if group g uses time slot t (not needed when groups are pre-bound)
+        group_uses_time = None
+        if group_slots is None:
+            group_uses_time = [[model.NewBoolVar(f'group_{g}_uses_time_{t}') for t in range(self.num_time_slots)] for g in range(num_groups)]
         
         # group_active[g] = 1 if group g is used (b.c. can have up to max_groups number of groups)
-        group_active = {}
-        for g in range(max_groups):
-            group_active[g] = model.NewBoolVar(f'group_{g}_active')
+        group_active = [model.NewBoolVar(f'group_{g}_active') for g in range(num_groups)]
         
         # Constraints
         
         # 1. each student is in exactly one group
         for s in range(self.num_students):
-            model.Add(sum(student_in_group[s][g] for g in range(max_groups)) == 1) # i.e. sum of indicators for specific student should be 1
+            model.Add(cp_model.LinearExpr.Sum([student_in_group[s][g] for g in student_groups[s]]) == 1) # i.e. sum of indicators for specific student should be 1
         
         # 2. each group uses exactly one time slot
-        for g in range(max_groups):
-            model.Add(sum(group_uses_time[g][t] for t in range(self.num_time_slots)) == group_active[g])
+        if group_uses_time is not None:
+            for g in range(num_groups):
+                model.Add(cp_model.LinearExpr.Sum(group_uses_time[g]) == group_active[g])
         
         # 3. group size constraints
-        for g in range(max_groups):
-            group_size = sum(student_in_group[s][g] for s in range(self.num_students))
+        for g in range(num_groups):
+            if self._stop_requested.is_set():
+                return None
+            group_size = cp_model.LinearExpr.Sum(group_vars[g])
             
             # if group is active, enforce size constraints
-            model.Add(group_size >= self.constraints.group_size_min).OnlyEnforceIf(group_active[g])
+            model.Add(group_size >= self.constraints.group_size_min).OnlyEnforceIf(
+                [group_active[g]] + switch(f'minimum group size ({self.constraints.group_size_min})'))
             if self.constraints.group_size_max:
-                model.Add(group_size <= self.constraints.group_size_max).OnlyEnforceIf(group_active[g])
+                model.Add(group_size <= self.constraints.group_size_max).OnlyEnforceIf(
+                    [group_active[g]] + switch(f'maximum group size ({self.constraints.group_size_max})'))
             
             # if group is not active, it has size 0
             model.Add(group_size == 0).OnlyEnforceIf(group_active[g].Not())
             
         
         # 4. group count constraints
-        total_groups = sum(group_active[g] for g in range(max_groups))
-        model.Add(total_groups >= self.constraints.group_count_min)
+        total_groups = cp_model.LinearExpr.Sum(group_active)
+        model.Add(total_groups >= self.constraints.group_count_min).OnlyEnforceIf(switch(f'minimum group count ({self.constraints.group_count_min})'))
         if self.constraints.group_count_max:
-            model.Add(total_groups <= self.constraints.group_count_max)
+            model.Add(total_groups <= self.constraints.group_count_max).OnlyEnforceIf(switch(f'maximum group count ({self.constraints.group_count_max})'))
         
-        # 5. availability constraints
-        for s in range(self.num_students):
-            for g in range(max_groups):
-                for t in range(self.num_time_slots):
-                    # if student s is in group g and group g uses time t,
-                    # then student s must be available at time t
-                    if not self._get_student_availability(s, self.time_slots[t]):
-                        model.Add(student_in_group[s][g] + group_uses_time[g][t] <= 1)
+        # 5. availability constraints (pre-bound groups already handle this when the variables are created)
+        # if group g meets at time t, none of the students unavailable at t can be in it: one constraint per
+        # (group, slot) over the slot's unavailable students rather than one per (student, slot, group)
+        if group_uses_time is not None:
+            for t in range(self.num_time_slots):
+                unavailable = np.flatnonzero(~available[:, t]).tolist()
+                if not unavailable:
+                    continue
+                for g in range(num_groups):
+                    if self._stop_requested.is_set():
+                        return None
+                    model.Add(cp_model.LinearExpr.Sum([student_in_group[s][g] for s in unavailable]) == 0).OnlyEnforceIf(
+                        [group_uses_time[g][t]] + switch(availability))
         
-        # 6. attribute constraints
-        attribute_constraints = self.constraints.get_attribute_constraints()
+        if self._stop_requested.is_set():
+            return None
+
+        # 6. attribute constraints (the soft ones are added in 7b)
+        attribute_constraints = self.constraints.get_hard_attribute_constraints()
         for attr, constraints in attribute_constraints.items():
-            for g in range(max_groups):
-                group_attr_count = sum(student_in_group[s][g] for s in range(self.num_students) 
-                               if self._get_student_attribute(s, attr))
+            attr_vars = rule_vars(self.matrix.students_with_attribute(attr))
+            for g in range(num_groups):
+                group_attr_count = cp_model.LinearExpr.Sum(attr_vars[g])
                 if 'min_per_group' in constraints:
-                    model.Add(group_attr_count >= constraints['min_per_group']).OnlyEnforceIf(group_active[g])
+                    model.Add(group_attr_count >= constraints['min_per_group']).OnlyEnforceIf(
+                        [group_active[g]] + switch(f"at least {constraints['min_per_group']} per group with attribute '{attr}'"))
                 if 'max_per_group' in constraints:
-                    model.Add(group_attr_count <= constraints['max_per_group']).OnlyEnforceIf(group_active[g])
+                    model.Add(group_attr_count <= constraints['max_per_group']).OnlyEnforceIf(
+                        [group_active[g]] + switch(f"at most {constraints['max_per_group']} per group with attribute '{attr}'"))
 
         # 7. combined attribute constraints! added this in case individual constraints are not expressive enough
-        combined_constraints = self.constraints.get_combined_constraints()
+        combined_constraints = self.constraints.get_hard_combined_constraints()
         for combined in combined_constraints:
             attrs = combined.get('attributes', [])
             min_val = combined.get('min')
             max_val = combined.get('max')
-            for g in range(max_groups):
-                group_combined_count = sum(
-                    student_in_group[s][g]
-                    for s in range(self.num_students)
-                    if any(self._get_student_attribute(s, attr) for attr in attrs)
-                )
+            combined_vars = rule_vars(self.matrix.students_with_any_attribute(attrs))
+            attrs_label = ', '.join(f"'{attr}'" for attr in attrs)
+            for g in range(num_groups):
+                group_combined_count = cp_model.LinearExpr.Sum(combined_vars[g])
                 if min_val is not None:
-                    model.Add(group_combined_count >= min_val).OnlyEnforceIf(group_active[g])
+                    model.Add(group_combined_count >= min_val).OnlyEnforceIf(
+                        [group_active[g]] + switch(f'at least {min_val} per group with any of {attrs_label}'))
                 if max_val is not None:
-                    model.Add(group_combined_count <= max_val).OnlyEnforceIf(group_active[g])
-        
-        # solve for best solution
-        solver = cp_model.CpSolver()
-        status = solver.Solve(model)
-        
-        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            return self._format_solution(solver, student_in_group, group_uses_time, group_active, max_groups)
-        else:
-            # detailed error reporting to help user adjust their constraints
-            reasons = []
-            if self.constraints.group_size_min > self.num_students:
-                reasons.append(f"Minimum group size ({self.constraints.group_size_min}) is greater than the number of students ({self.num_students}).")
-            if self.constraints.group_count_max and self.constraints.group_count_max < self.constraints.group_count_min:
-                reasons.append(f"Maximum group count ({self.constraints.group_count_max}) is less than the minimum group count ({self.constraints.group_count_min}).")
-            # attribute constraints issues
-            for attr, cons in self.constraints.get_attribute_constraints().items():
-                count_with_attr = sum(1 for s in self.student_data['attributes'] if str(s.get(attr, 0)) == '1')
-                if 'min_per_group' in cons and count_with_attr < cons['min_per_group'] * self.constraints.group_count_min:
-                    reasons.append(f"Not enough students with attribute '{attr}' to satisfy the minimum per group ({cons['min_per_group']}).")
-                if 'max_per_group' in cons and cons['max_per_group'] < 1:
-                    reasons.append(f"Maximum per group for attribute '{attr}' is less than 1.")
-            if not reasons:
-                reasons.append("The combination of constraints may be too strict or incompatible with the data.")
-            return {'error': 'No valid solution found with the given constraints. Possible reasons: ' + ' '.join(reasons)}
-    
-    def _format_solution(self, solver, student_in_group, group_uses_time, group_active, max_groups):
-        """format the solution into group ids, time slots they're assigned to, students in each group"""
-        groups = []
-        
-        for g in range(max_groups):
+                    model.Add(group_combined_count <= max_val).OnlyEnforceIf(
+                        [group_active[g]] + switch(f'at most {max_val} per group with any of {attrs_label}'))
+
+        # 7b. soft constraints: an active group may miss the bound by its slack, which the objective charges for
+        # (they can't make the model infeasible, so explaining leaves them out)
+        soft_slacks = []
+        for r, (_, students, bound, value, weight) in enumerate(self._soft_rules() if not explain else []):
+            slacks = []
+            for g, vars_of_group in enumerate(rule_vars(students)):
+                if bound == 'min' and value <= 0 or bound == 'max' and len(vars_of_group) <= value:
+                    continue # can't be missed in this group
+                group_count = cp_model.LinearExpr.Sum(vars_of_group)
+                slack = model.NewIntVar(0, value if bound == 'min' else len(vars_of_group) - value, f'soft_{r}_group_{g}_slack')
+                if bound == 'min':
+                    model.Add(group_count + slack >= value).OnlyEnforceIf(group_active[g])
+                else:
+                    model.Add(group_count - slack <= value).OnlyEnforceIf(group_active[g])
+                model.Add(slack == 0).OnlyEnforceIf(group_active[g].Not())
+                slacks.append(slack)
+            soft_slacks.append((weight, slacks))
+
+        # where the previous schedule's groups go in this model (when re-solving); with min_moves they stay those groups,
+        # so they're kept out of the symmetry breaking
+        keep_previous = self._keeps_previous_groups() and not explain
+        placement = self._hint_placement(group_slots, num_groups, keep_order=keep_previous) if self.hint else []
+        pinned_groups = {g for g, _, _ in placement} if keep_previous else set()
+
+        # 8. symmetry breaking (the first-member ordering of pre-bound groups relies on availability, so not when that can be switched off)
+        self._add_symmetry_breaking(model, student_in_group, group_active, group_uses_time, group_slots, num_groups,
+                                    order_by_first_member=not (explain and group_slots is not None), pinned_groups=pinned_groups)
+        if explain:
+            return model, {'assumptions': assumptions}
+
+        # 9. objective (without one, the first valid schedule found is returned)
+        self._add_objective(model, student_in_group, group_active, group_uses_time, num_groups, placement, group_vars, rule_vars, soft_slacks)
+
+        if placement:
+            self._add_hint(model, student_in_group, group_active, group_uses_time, group_slots, num_groups, placement)
+
+        variables = {
+            'student_in_group': student_in_group,
+            'group_vars': group_vars,
+            'group_members': group_members,
+            'group_active': group_active,
+            'group_uses_time': group_uses_time,
+            'group_slots': group_slots,
+            'num_groups': num_groups
+        }
+        return model, variables
+
+    def _configure_solver(self, solver):
+        """apply the solver settings from the constraints (anything left as None keeps cp-sat's default)"""
+        solver_parameters = self.constraints.get_solver_parameters()
+        if solver_parameters['time_limit']:
+            solver.parameters.max_time_in_seconds = float(solver_parameters['time_limit'])
+        if solver_parameters['num_workers']:
+            solver.parameters.num_workers = int(solver_parameters['num_workers'])
+        if solver_parameters['random_seed'] is not None:
+            solver.parameters.random_seed = int(solver_parameters['random_seed'])
+        if solver_parameters['relative_gap'] is not None:
+            solver.parameters.relative_gap_limit = float(solver_parameters['relative_gap'])
+        if self.hint:
+            # starting from a (nearly) valid schedule, cp-sat's probing and symmetry detection cost far more than the
+            # search itself (the model already breaks the group symmetry on its own)
+            solver.parameters.cp_model_probing_level = 0
+            solver.parameters.symmetry_level = 0
+
+    def _solve_stats(self, solver, status, recorder):
+        """summary of the search for the response"""
+        solve_stats = {
+            'status': solver.StatusName(status),
+            'wall_time': solver.WallTime(),
+            'user_time': solver.UserTime(),
+            'num_branches': solver.NumBranches(),
+            'num_conflicts': solver.NumConflicts(),
+            'solutions_found': len(recorder.solutions),
+            'intermediate_solutions': recorder.solutions
+        }
+        if recorder.has_objective and recorder.solutions:
+            solve_stats['objective_value'] = solver.ObjectiveValue()
+            solve_stats['best_objective_bound'] = solver.BestObjectiveBound()
+        return solve_stats
+
+    def _solution_group_slots(self, solver, group_uses_time, num_groups):
+        """read off which time slot the solver picked for each group (None if the group isn't used)"""
+        group_slots = []
+        for g in range(num_groups):
+            chosen = None
+            for t in range(self.num_time_slots):
+                if solver.Value(group_uses_time[g][t]):
+                    chosen = t
+                    break
+            group_slots.append(chosen)
+        return group_slots
+
+    def _solution_assignment(self, solver, group_vars, group_members, group_slots, group_active, num_groups):
+        """[(time slot index, [student indices])] for every active group, in group order (only reads the variables that exist)"""
+        assignment = []
+        for g in range(num_groups):
             if solver.Value(group_active[g]):
-                # Find students in this group
-                group_students = []
-                for s in range(self.num_students):
-                    if solver.Value(student_in_group[s][g]):
-                        student_name = self.student_data['names'][s]
-                        student_attrs = (self.student_data['attributes'][s] 
-                                       if s < len(self.student_data['attributes']) else {})
-                        student_avail = (self.student_data['availabilities'][s] 
-                                       if s < len(self.student_data['availabilities']) else {})
-                        
-                        group_students.append({
-                            'name': student_name,
-                            'attributes': student_attrs,
-                            'availabilities': student_avail
-                        })
-                
-                # Find time slot for this group
-                time_slot = 'Not assigned'
-                for t in range(self.num_time_slots):
-                    if solver.Value(group_uses_time[g][t]):
-                        time_slot = self.time_slots[t]
-                        break
-                
-                groups.append({
-                    'group_id': g + 1,  # 1-indexed for display
-                    'time_slot': time_slot,
-                    'students': group_students,
-                    'size': len(group_students)
-                })
-        
-        # Sort groups by ID for consistent output
-        groups.sort(key=lambda x: x['group_id'])
+                students = [s for s, var in zip(group_members[g].tolist(), group_vars[g]) if solver.Value(var)]
+                assignment.append((group_slots[g], students))
+        return assignment
+
+    def _format_solution(self, assignment):
+        """
+        format the solution into group ids, time slots they're assigned to, students in each group
+        (students as row indices into the matrix, result_format.render_schedule turns them into the response)
+        """
+        groups = []
+
+        for slot_idx, students in assignment:
+            # Find time slot for this group
+            time_slot = 'Not assigned'
+            if slot_idx is not None:
+                time_slot = self.time_slots[slot_idx]
+            
+            groups.append({
+                'group_id': len(groups) + 1,  # 1-indexed for display, numbered consecutively over the active groups
+                'time_slot': time_slot,
+                'student_indices': [int(s) for s in students],
+                'size': len(students)
+            })
         
-        return {
+        result = {
             'groups': groups,
             'constraints_applied': self.constraints.get_attribute_constraints(),
             'total_students': self.num_students,
             'total_groups': len(groups),
             'group_size_range': self.constraints.get_group_size_constraints(),
             'group_count_range': self.constraints.get_group_count_constraints()
-        }
\ No newline at end of file
+        }
+        soft_rules = self._soft_rules()
+        if soft_rules:
+            result['soft_constraints'] = self._soft_violations(soft_rules, assignment)
+            result['total_violation'] = sum(rule['weight'] * rule['violation'] for rule in result['soft_constraints'])
+        return result
+
+    def _soft_violations(self, soft_rules, assignment):
+        """
+        how far the schedule misses each soft rule: violation = students short of a minimum / over a maximum, summed over
+        the groups, and violated_groups = the group ids (as _format_solution numbers them) where it's missed
+        """
+        group_of = np.full(self.num_students, -1, dtype=np.int64)
+        for i, (_, students) in enumerate(assignment):
+            group_of[students] = i
+        report = []
+        for description, students, bound, value, weight in soft_rules:
+            groups = group_of[students]
+            counts = np.bincount(groups[groups >= 0], minlength=len(assignment))
+            missed = np.maximum(value - counts if bound == 'min' else counts - value, 0)
+            report.append({
+                'constraint': description,
+                'weight': weight,
+                'violation': int(missed.sum()),
+                'violated_groups': [int(i) + 1 for i in np.flatnonzero(missed)]
+            })
+        return report
+
+def model_size(model):
+    """how big the cp-sat model came out, for the diagnostics block"""
+    proto = model.Proto()
+    return {'num_variables': len(proto.variables), 'num_constraints': len(proto.constraints)}
+
+def solver_counters(solver, status):
+    """cp-sat's own view of the search, for the diagnostics block"""
+    return {
+        'status': solver.StatusName(status),
+        'wall_time': solver.WallTime(),
+        'user_time': solver.UserTime(),
+        'num_branches': solver.NumBranches(),
+        'num_conflicts': solver.NumConflicts(),
+        'num_booleans': solver.NumBooleans()
+    }
+
+def assignment_from_groups(matrix, groups):
+    """
+    turn the groups of an earlier schedule response back into [(time slot index, [student indices])] for matrix
+    students are matched by name (duplicate names in roster order); students who are gone are skipped, and a group
+    whose time slot is gone gets None; the 'unassigned' group isn't a group
+    """
+    rows_by_name = {}
+    for s, name in enumerate(matrix.names):
+        rows_by_name.setdefault(name, []).append(s)
+    slot_lookup = {slot: t for t, slot in enumerate(matrix.time_slots)}
+
+    assignment = []
+    for group in groups:
+        if group.get('is_unassigned'):
+            continue
+        students = []
+        for student in group.get('students', []):
+            rows = rows_by_name.get(student.get('name'))
+            if rows:
+                students.append(rows.pop(0))
+        assignment.append((slot_lookup.get(group.get('time_slot')), students))
+    return assignment
+
+def count_moved_students(previous, assignment):
+    """
+    how many students of the previous assignment aren't in "their" group any more: every old group is matched to the
+    new group at the same time slot that kept most of its students (one to one, biggest overlaps first), and
+    everyone outside their group's match counts as moved
+    """
+    new_group = {}
+    for i, (_, students) in enumerate(assignment):
+        for s in students:
+            new_group[s] = i
+
+    overlaps = []
+    still_here = 0
+    for p, (slot_idx, students) in enumerate(previous):
+        kept = {}
+        for s in students:
+            if s in new_group:
+                still_here += 1
+                if assignment[new_group[s]][0] == slot_idx:
+                    kept[new_group[s]] = kept.get(new_group[s], 0) + 1
+        overlaps.extend((count, p, i) for i, count in kept.items())
+
+    matched_previous = set()
+    matched_new = set()
+    stayed = 0
+    for count, p, i in sorted(overlaps, reverse=True):
+        if p not in matched_previous and i not in matched_new:
+            matched_previous.add(p)
+            matched_new.add(i)
+            stayed += count
+    return still_here - stayed
@@ -0,0 +1,25 @@
+"""
+the SMARTGROUPS_* settings for production serving, shared by wsgi.py and gunicorn.conf.py
+(kept apart from wsgi.py so gunicorn can read its settings without importing the app in the arbiter)
+"""
+import os
+
+def serving_defaults(cores=None):
+    """the SMARTGROUPS_* settings for production serving: what's in the environment, with defaults for the rest"""
+    cores = cores or os.cpu_count() or 1
+    # one web worker unless asked for more: background jobs and (without SMARTGROUPS_ROSTER_DIR) uploaded rosters live in
+    # the worker that made them, so with several workers a follow-up request landing on another one gets a 404
+    web_workers = int(os.environ.get('SMARTGROUPS_WEB_WORKERS') or 1)
+    if web_workers > 1 and not os.environ.get('SMARTGROUPS_ROSTER_DIR'):
+        raise ValueError(f"SMARTGROUPS_WEB_WORKERS={web_workers} needs SMARTGROUPS_ROSTER_DIR, so every worker can find the "
+                         "rosters the others stored (and /api/jobs needs sticky sessions, jobs stay in the worker that took them)")
+    max_solves = int(os.environ.get('SMARTGROUPS_MAX_SOLVES') or max(1, cores // web_workers))
+    return {
+        'SMARTGROUPS_WEB_WORKERS': web_workers,
+        'SMARTGROUPS_MAX_SOLVES': max_solves,
+        # threads per web worker: one per solve plus two that are never busy solving (health checks, job polls, metrics)
+        'SMARTGROUPS_WEB_THREADS': int(os.environ.get('SMARTGROUPS_WEB_THREADS') or max_solves + 2),
+        'SMARTGROUPS_SOLVER_THREADS': int(os.environ.get('SMARTGROUPS_SOLVER_THREADS') or max(1, cores // (web_workers * max_solves))),
+        'SMARTGROUPS_MAX_UPLOAD_MB': float(os.environ.get('SMARTGROUPS_MAX_UPLOAD_MB') or 64),
+        'SMARTGROUPS_MAX_TIME_LIMIT': float(os.environ.get('SMARTGROUPS_MAX_TIME_LIMIT') or 60),
+    }
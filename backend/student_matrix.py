@@ -0,0 +1,102 @@
+import numpy as np
+
+class StudentMatrix:
+    def __init__(self, names, attribute_names, time_slots, attributes=None, availabilities=None):
+        """
+        compact internal version of the roster: one row per student, one column per attribute / time slot
+        names: list of student names (row order)
+        attribute_names: column labels of the attributes matrix
+        time_slots: column labels of the availabilities matrix
+        attributes, availabilities: anything numpy can turn into a 0/1 uint8 array of shape (students, columns)
+        """
+        self.names = list(names)
+        self.attribute_names = list(attribute_names)
+        self.time_slots = list(time_slots)
+        num_students = len(self.names)
+
+        if attributes is None:
+            attributes = np.zeros((num_students, len(self.attribute_names)), dtype=np.uint8)
+        if availabilities is None:
+            availabilities = np.zeros((num_students, len(self.time_slots)), dtype=np.uint8)
+        self.attributes = np.asarray(attributes, dtype=np.uint8).reshape(num_students, len(self.attribute_names))
+        self.availabilities = np.asarray(availabilities, dtype=np.uint8).reshape(num_students, len(self.time_slots))
+
+        self._attribute_lookup = {attr: j for j, attr in enumerate(self.attribute_names)}
+
+    @classmethod
+    def from_records(cls, names, attribute_records, availability_records):
+        """
+        build from the old list-of-dicts format ({'column': '0'/'1'} per student)
+        """
+        attribute_names = list(attribute_records[0].keys()) if attribute_records else []
+        time_slots = list(availability_records[0].keys()) if availability_records else []
+
+        attributes = np.zeros((len(names), len(attribute_names)), dtype=np.uint8)
+        for s, record in enumerate(attribute_records):
+            attributes[s] = [is_truthy(record.get(attr, 0)) for attr in attribute_names]
+
+        availabilities = np.zeros((len(names), len(time_slots)), dtype=np.uint8)
+        for s, record in enumerate(availability_records):
+            availabilities[s] = [is_truthy(record.get(slot, 0)) for slot in time_slots]
+
+        return cls(names, attribute_names, time_slots, attributes, availabilities)
+
+    @property
+    def num_students(self):
+        return len(self.names)
+
+    @property
+    def num_time_slots(self):
+        return len(self.time_slots)
+
+    def attribute_column(self, attribute):
+        """
+        0/1 column for attribute (all zeros if the roster doesn't have that attribute)
+        """
+        j = self._attribute_lookup.get(attribute)
+        if j is None:
+            return np.zeros(self.num_students, dtype=np.uint8)
+        return self.attributes[:, j]
+
+    def students_with_attribute(self, attribute):
+        """indices of the students who have attribute"""
+        return np.flatnonzero(self.attribute_column(attribute))
+
+    def students_with_any_attribute(self, attributes):
+        """indices of the students who have at least one of attributes"""
+        has_any = np.zeros(self.num_students, dtype=bool)
+        for attr in attributes:
+            has_any |= self.attribute_column(attr).astype(bool)
+        return np.flatnonzero(has_any)
+
+    def has_any_availability(self):
+        """boolean mask of the students who are available at least once"""
+        return self.availabilities.any(axis=1)
+
+    def subset(self, student_indices):
+        """new matrix with only the given rows (keeps their order)"""
+        student_indices = np.asarray(student_indices, dtype=np.intp)
+        return StudentMatrix([self.names[s] for s in student_indices], self.attribute_names, self.time_slots,
+                             self.attributes[student_indices], self.availabilities[student_indices])
+
+    def attribute_record(self, student_idx):
+        """the {'attribute': '0'/'1'} dict the api sends back for one student"""
+        return {attr: str(int(v)) for attr, v in zip(self.attribute_names, self.attributes[student_idx])}
+
+    def availability_record(self, student_idx):
+        """the {'time slot': '0'/'1'} dict the api sends back for one student"""
+        return {slot: str(int(v)) for slot, v in zip(self.time_slots, self.availabilities[student_idx])}
+
+    def student_record(self, student_idx):
+        return {
+            'name': self.names[student_idx],
+            'attributes': self.attribute_record(student_idx),
+            'availabilities': self.availability_record(student_idx)
+        }
+
+# csv cells that count as 1; everything else (0, no, false, blanks) counts as 0
+TRUTHY_VALUES = {'1', 'yes', 'true'}
+
+def is_truthy(value):
+    """csv cell -> 0/1"""
+    return 1 if str(value).strip().lower() in TRUTHY_VALUES else 0
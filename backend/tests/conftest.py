@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the backend modules are imported flat (run from the backend folder), so the tests see them the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,89 @@
+"""small synthetic problems for the tests, mostly built through the same parsing path as an upload"""
+import io
+import random
+from types import SimpleNamespace
+import numpy as np
+from constraint_parser import SchedulingConstraints
+from student_matrix import StudentMatrix
+from roster_generator import generate_roster, roster_csv, constraint_form, attribute_columns
+from csv_parser import decode_lines, parse_student_stream, parse_all_constraints
+
+def roster_matrix(num_students, num_time_slots, seed, num_attributes=2, attribute_density=0.3, availability=0.4):
+    """the StudentMatrix of a roster_generator roster, parsed like an upload"""
+    data = roster_csv(generate_roster(num_students, num_time_slots, num_attributes, attribute_density, availability, seed=seed))
+    given_attributes = [attr.lower() for attr in attribute_columns(num_attributes)]
+    return parse_student_stream(decode_lines(io.BytesIO(data)), given_attributes)['matrix']
+
+def preset_problem(num_students, seed, tightness='loose', num_time_slots=10, num_attributes=2, availability=0.4):
+    """(matrix, constraints) for a roster_generator roster under one of its tightness presets, like benchmark.py runs"""
+    matrix = roster_matrix(num_students, num_time_slots, seed, num_attributes, availability=availability)
+    form = constraint_form(tightness, num_students, num_attributes)
+    given_attributes = [attr.strip() for attr in form['given_attributes'].split(',')]
+    constraints = parse_all_constraints(SimpleNamespace(form=form), matrix.num_students, matrix.num_time_slots, given_attributes)
+    return matrix, constraints
+
+def random_problem(seed):
+    """a small random roster and constraints, the kind of corner cases a real sheet rarely hits"""
+    rng = random.Random(seed)
+    num_students = rng.randint(4, 30)
+    matrix = roster_matrix(num_students, rng.randint(1, 5), seed, num_attributes=3,
+                           attribute_density=rng.uniform(0.1, 0.6), availability=rng.uniform(0.15, 0.8))
+    size_min = rng.randint(1, 4)
+    size_max = size_min + rng.randint(0, 4)
+    attribute_constraints = {}
+    if rng.random() < 0.6:
+        attribute_constraints['attribute 1'] = {'min_per_group': rng.randint(0, 2)}
+        if rng.random() < 0.5:
+            attribute_constraints['attribute 1']['max_per_group'] = attribute_constraints['attribute 1']['min_per_group'] + rng.randint(0, 3)
+    if rng.random() < 0.3:
+        attribute_constraints['attribute 3'] = {'max_per_group': rng.randint(0, 3)}
+    combined = []
+    if rng.random() < 0.3:
+        combined.append({'attributes': ['attribute 1', 'attribute 2'], 'max': rng.randint(1, 5)})
+    if rng.random() < 0.2:
+        combined.append({'attributes': ['attribute 2', 'attribute 3'], 'min': 1})
+    count_min = rng.randint(1, 3)
+    count_max = rng.choice([0, num_students // size_min, rng.randint(count_min, 12)])
+    objective = rng.choice(['none', 'none', 'min_groups', 'balance_sizes'])
+
+    def constraints():
+        return SchedulingConstraints(attribute_constraints, size_min, size_max, count_min, count_max, combined,
+                                     time_limit=2, num_workers=1, random_seed=0, objective=objective)
+    return matrix, constraints
+
+def split_availability_roster():
+    """15 students without attributes, 7 who can only make slot A and 8 who can only make slot B"""
+    availabilities = np.zeros((15, 2), dtype=np.uint8)
+    availabilities[:7, 0] = 1
+    availabilities[7:, 1] = 1
+    return StudentMatrix([f'Student {s + 1}' for s in range(15)], [], ['A', 'B'], np.zeros((15, 0), dtype=np.uint8), availabilities)
+
+def schedule_problems(matrix, constraints, result):
+    """everything wrong with a schedule() result under the hard constraints (empty list = valid)"""
+    problems = []
+    size_min, size_max = constraints.get_group_size_constraints()
+    count_min, count_max = constraints.get_group_count_constraints()
+    rules = []
+    for attr, cons in constraints.get_hard_attribute_constraints().items():
+        rules.append((attr, matrix.students_with_attribute(attr), cons.get('min_per_group'), cons.get('max_per_group')))
+    for combined in constraints.get_hard_combined_constraints():
+        rules.append((combined.get('attributes', []), matrix.students_with_any_attribute(combined.get('attributes', [])), combined.get('min'), combined.get('max')))
+
+    seen = []
+    for group in result['groups']:
+        students = group['student_indices']
+        seen.extend(students)
+        slot = matrix.time_slots.index(group['time_slot'])
+        if len(students) < size_min or (size_max and len(students) > size_max):
+            problems.append(f"group {group['group_id']} has {len(students)} students")
+        if not matrix.availabilities[students, slot].all():
+            problems.append(f"group {group['group_id']} has students who aren't available at {group['time_slot']}")
+        for label, members, rule_min, rule_max in rules:
+            count = int(np.isin(students, members).sum())
+            if (rule_min is not None and count < rule_min) or (rule_max is not None and count > rule_max):
+                problems.append(f"group {group['group_id']} has {count} students with {label}")
+    if sorted(seen) != list(range(matrix.num_students)):
+        problems.append('not every student is in exactly one group')
+    if len(result['groups']) < count_min or (count_max and len(result['groups']) > count_max):
+        problems.append(f"{len(result['groups'])} groups")
+    return problems
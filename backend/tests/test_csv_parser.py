@@ -0,0 +1,78 @@
+import io
+import pytest
+from csv_parser import decode_lines, parse_student_stream
+from student_matrix import is_truthy
+
+SAMPLE_DIR = '../examples/sample_input_sheets'
+ATTRIBUTES = ['marketing', 'finance', 'technology', 'healthcare']
+
+def sample_bytes(filename='fun_people_test.csv'):
+    with open(f'{SAMPLE_DIR}/{filename}', 'rb') as f:
+        return f.read()
+
+def parse_bytes(data, given_attributes=ATTRIBUTES, chunk_size=None):
+    lines = decode_lines(io.BytesIO(data)) if chunk_size is None else decode_lines(io.BytesIO(data), chunk_size)
+    return parse_student_stream(lines, given_attributes)
+
+def test_sample_sheets_parse_alike():
+    # the second sheet writes its 1s as 'Yes' and adds 4 students who can't make any time slot
+    plain = parse_bytes(sample_bytes())
+    yes = parse_bytes(sample_bytes('fun_people_test_with_missing.csv'))
+    assert plain['total_students'] == 37 and plain['unassigned_students'] == []
+    assert yes['total_students'] == 41
+    assert [student['name'] for student in yes['unassigned_students']] == ['Cheshire Cat', 'Rachel Dare', 'Ethan Hunt', 'Benji Dunn']
+    assert plain['matrix'].attribute_names == ATTRIBUTES
+    assert plain['matrix'].num_time_slots == 18
+    assert (plain['matrix'].attributes == yes['matrix'].attributes).all()
+    assert (plain['matrix'].availabilities == yes['matrix'].availabilities).all()
+
+def test_byte_order_mark_is_dropped():
+    # excel's "CSV UTF-8" starts the file with a BOM, which mustn't end up in the first header ('﻿first')
+    with_bom = parse_bytes(b'\xef\xbb\xbf' + sample_bytes())
+    plain = parse_bytes(sample_bytes())
+    assert with_bom['matrix'].names == plain['matrix'].names
+    assert (with_bom['matrix'].availabilities == plain['matrix'].availabilities).all()
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 64])
+def test_multibyte_characters_across_chunks(chunk_size):
+    data = 'Name,Mañana,Après-midi\r\nZoë Ångström,1,\r\nJosé Núñez,,yes\n李小龙,1,1\n😀 Smiley,True,'.encode('utf-8')
+    lines = list(decode_lines(io.BytesIO(data), chunk_size))
+    assert lines == ['Name,Mañana,Après-midi\n', 'Zoë Ångström,1,\n', 'José Núñez,,yes\n', '李小龙,1,1\n', '😀 Smiley,True,']
+    matrix = parse_bytes(data, [], chunk_size)['matrix']
+    assert matrix.names == ['Zoë Ångström', 'José Núñez', '李小龙', '😀 Smiley']
+    assert matrix.time_slots == ['mañana', 'après-midi']
+    assert matrix.availabilities.tolist() == [[1, 0], [0, 1], [1, 1], [1, 0]]
+
+@pytest.mark.parametrize('value', ['1', 'yes', 'Yes', 'YES', 'true', 'True', ' TRUE ', ' yes\t', 1])
+def test_truthy_cells(value):
+    assert is_truthy(value) == 1
+
+@pytest.mark.parametrize('value', ['', ' ', '0', 'no', 'No', 'false', 'x', 'y', '2', '1.0', 'yes please', 0, None])
+def test_other_cells_are_zero(value):
+    assert is_truthy(value) == 0
+
+def test_missing_name_columns():
+    header, rest = sample_bytes().split(b'\n', 1)
+    result = parse_bytes(header.replace(b'First,Last', b'Given,Family') + b'\n' + rest)
+    assert result['status'] == 400
+    assert 'Name' in result['error']
+
+def test_missing_attribute_column():
+    result = parse_bytes(sample_bytes(), ATTRIBUTES + ['law'])
+    assert result['status'] == 400
+    assert 'law' in result['error']
+
+def test_empty_file():
+    result = parse_bytes(b'')
+    assert result['status'] == 400
+    assert 'empty' in result['error']
+
+def test_no_student_is_available():
+    # only the sample's header and the rows of its students who can't make any time slot
+    lines = sample_bytes('fun_people_test_with_missing.csv').splitlines(keepends=True)
+    unavailable = [line for line in lines[1:] if line.split(b',', 2)[:2] in ([b'Rachel', b'Dare'], [b'Ethan', b'Hunt'], [b'Benji', b'Dunn'])]
+    assert len(unavailable) == 3
+    result = parse_bytes(b''.join([lines[0]] + unavailable))
+    assert result['status'] == 400
+    assert 'No students have any available times' in result['error']
+    assert parse_bytes(lines[0])['status'] == 400
@@ -0,0 +1,46 @@
+import pytest
+from constraint_parser import SchedulingConstraints
+from engines import create_scheduler
+from rosters import random_problem, split_availability_roster, schedule_problems
+
+# the exact formulations: all of them have to agree on whether there is a schedule and on the best objective value
+EXACT = {'dense': {'prebind_slots': False}, 'sparse': {'prebind_slots': True}, 'cp_sat auto': {'prebind_slots': 'auto'}}
+# engines that may miss a schedule (decompose splits the problem, the heuristic is greedy) but never return a wrong one;
+# 'auto' falls back to cp-sat when the heuristic gets stuck, so it has to find one whenever there is one
+APPROXIMATE = {'decompose': {'engine': 'decompose', 'max_workers': 1}, 'heuristic': {'engine': 'heuristic'}}
+COMPLETE = {'auto': {'engine': 'auto'}}
+
+@pytest.mark.parametrize('seed', range(40))
+def test_engines_agree(seed):
+    matrix, constraints = random_problem(seed)
+    results = {}
+    for name, options in {**EXACT, **APPROXIMATE, **COMPLETE}.items():
+        result = create_scheduler(matrix, constraints(), **options).schedule()
+        if 'error' not in result:
+            assert schedule_problems(matrix, constraints(), result) == [], name
+        results[name] = result
+
+    decided = {name: 'error' not in results[name] for name in EXACT if results[name].get('solver_status') != 'UNKNOWN'}
+    assert len(set(decided.values())) <= 1, decided
+    optimal = {name: results[name]['solve_stats'].get('objective_value') for name in EXACT if results[name].get('solver_status') == 'OPTIMAL'}
+    assert len(set(optimal.values())) <= 1, optimal
+
+    if decided:
+        feasible = next(iter(decided.values()))
+        for name in APPROXIMATE:
+            assert feasible or 'error' in results[name], name
+        for name in COMPLETE:
+            if results[name].get('solver_status') != 'UNKNOWN':
+                assert feasible == ('error' not in results[name]), name
+
+def test_sparse_and_dense_explain_alike():
+    # minimum group size is one of the rules explaining may drop, so the sparse model must not size its candidate
+    # groups by it (it used to, and blamed only availability and the maximum size here)
+    matrix = split_availability_roster()
+    explanations = {}
+    for name, options in EXACT.items():
+        result = create_scheduler(matrix, SchedulingConstraints({}, 4, 5, 1, 4, []), **options).schedule()
+        assert result['minimal_conflict'], name
+        explanations[name] = set(result['conflicting_constraints'])
+    assert explanations['sparse'] == explanations['dense'] == explanations['cp_sat auto']
+    assert 'minimum group size (4)' in explanations['dense']
@@ -0,0 +1,52 @@
+import pytest
+from types import SimpleNamespace
+from ortools.sat.python import cp_model
+import scheduler
+from constraint_parser import SchedulingConstraints
+from scheduler import GroupScheduler
+from rosters import random_problem, split_availability_roster
+
+def infeasible_cases():
+    """(matrix, constraints) pairs cp-sat proves infeasible but the presolve checks let through"""
+    matrix, constraints = random_problem(41)
+    return [
+        (split_availability_roster(), lambda: SchedulingConstraints({}, 4, 5, 1, 4, [])),
+        (matrix, constraints),
+    ]
+
+def solve_with_only(matrix, constraints, kept):
+    """cp-sat's status for the roster with only the kept constraints switched on (in the dense explain model)"""
+    model, variables = GroupScheduler(matrix, constraints, prebind_slots=False)._build_model(explain=True)
+    model.AddAssumptions([variables['assumptions'][description] for description in kept])
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 10
+    solver.parameters.num_workers = 1
+    return solver.Solve(model)
+
+@pytest.mark.parametrize('case', range(2))
+@pytest.mark.parametrize('prebind_slots', [False, True])
+def test_reported_conflict_is_minimal(case, prebind_slots):
+    matrix, constraints = infeasible_cases()[case]
+    result = GroupScheduler(matrix, constraints(), prebind_slots=prebind_slots).schedule()
+    assert result['solver_status'] == 'INFEASIBLE'
+    conflict = result['conflicting_constraints']
+    assert result['minimal_conflict']
+    # the whole set can't be met, and leaving out any one of them can
+    assert solve_with_only(matrix, constraints(), conflict) == cp_model.INFEASIBLE
+    for description in conflict:
+        kept = [d for d in conflict if d != description]
+        assert solve_with_only(matrix, constraints(), kept) in (cp_model.OPTIMAL, cp_model.FEASIBLE), description
+
+def test_conflict_is_not_minimal_when_time_runs_out(monkeypatch):
+    # a clock that stands still for the first solve and then jumps past the deadline, so only the shrinking is cut short
+    calls = []
+    def perf_counter():
+        calls.append(None)
+        return 0 if len(calls) <= 2 else 1e9
+    monkeypatch.setattr(scheduler, 'time', SimpleNamespace(perf_counter=perf_counter))
+
+    matrix = split_availability_roster()
+    conflict, minimal = GroupScheduler(matrix, SchedulingConstraints({}, 4, 5, 1, 4, []), prebind_slots=False).explain_infeasibility()
+    assert not minimal
+    assert conflict
+    assert solve_with_only(matrix, SchedulingConstraints({}, 4, 5, 1, 4, []), conflict) == cp_model.INFEASIBLE
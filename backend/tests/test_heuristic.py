@@ -0,0 +1,20 @@
+import pytest
+from heuristic import HeuristicScheduler
+from rosters import preset_problem, schedule_problems
+
+@pytest.mark.parametrize('num_students', [50, 100, 300, 500])
+def test_heuristic_schedules_every_loose_roster(num_students):
+    # the loose preset (groups of 3-8, no attribute rules) is always feasible; the fast path used to get stuck on students
+    # who are only available at a sparse slot, because filling that slot up didn't lower its badness
+    for seed in range(20):
+        matrix, constraints = preset_problem(num_students, seed, 'loose')
+        result = HeuristicScheduler(matrix, constraints).schedule()
+        assert 'error' not in result, f'seed {seed}: {result["error"]}'
+        assert schedule_problems(matrix, constraints, result) == []
+
+def test_heuristic_schedules_are_valid_when_found():
+    for seed in range(20):
+        matrix, constraints = preset_problem(100, seed, 'medium')
+        result = HeuristicScheduler(matrix, constraints).schedule()
+        if 'error' not in result:
+            assert schedule_problems(matrix, constraints, result) == []
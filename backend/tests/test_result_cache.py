@@ -0,0 +1,28 @@
+import copy
+from result_cache import schedule_fingerprint, is_cacheable
+from rosters import preset_problem
+
+def test_fingerprint_ignores_defaults_and_thread_count():
+    matrix, constraints = preset_problem(50, 0)
+    key = schedule_fingerprint(matrix, constraints, {})
+    assert schedule_fingerprint(matrix, constraints, {'engine': 'cp_sat'}) == key
+    assert schedule_fingerprint(matrix, constraints, {'engine': 'cp_sat', 'symmetry_breaking': 'index', 'prebind_slots': 'auto'}) == key
+
+    more_threads = copy.deepcopy(constraints)
+    more_threads.num_workers = 8
+    more_threads.time_limit = 5
+    assert schedule_fingerprint(matrix, more_threads, {}) == key
+
+    assert schedule_fingerprint(matrix, constraints, {'engine': 'heuristic'}) != key
+    assert schedule_fingerprint(matrix, constraints, {'symmetry_breaking': 'none'}) != key
+    stricter = copy.deepcopy(constraints)
+    stricter.group_size_max -= 1
+    assert schedule_fingerprint(matrix, stricter, {}) != key
+
+def test_only_answers_a_longer_solve_couldnt_change_are_cacheable():
+    assert is_cacheable({'groups': [], 'solver_status': 'OPTIMAL'})
+    assert is_cacheable({'error': 'no schedule', 'solver_status': 'INFEASIBLE'})
+    assert is_cacheable({'error': 'too few students', 'reasons': ['...']})
+    assert not is_cacheable({'groups': [], 'solver_status': 'FEASIBLE'})
+    assert not is_cacheable({'error': 'out of time', 'solver_status': 'UNKNOWN'})
+    assert not is_cacheable({'error': 'cancelled', 'cancelled': True})
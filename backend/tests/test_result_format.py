@@ -0,0 +1,81 @@
+import io
+import csv
+import json
+from app import app
+from result_format import UNASSIGNED_LABEL
+
+SAMPLE_INPUT = '../examples/sample_input_sheets/fun_people_test{}.csv'
+SAMPLE_RESULT = '../examples/sample_result_sheets/fun_people_results{}.csv'
+
+def post(endpoint, sheet='_with_missing', **form):
+    """post one of the sample sheets (plus form) to endpoint"""
+    with open(SAMPLE_INPUT.format(sheet), 'rb') as f:
+        data = dict({'file': (io.BytesIO(f.read()), 'roster.csv'), 'given_attributes': 'Marketing,Finance,Technology,Healthcare',
+                     'group_size_min': '3', 'group_size_max': '6', 'time_limit': '5', 'num_workers': '1', 'random_seed': '0'}, **form)
+    return app.test_client().post(endpoint, data=data, content_type='multipart/form-data')
+
+def group_names(response):
+    """{time slot: names} of a compact response's groups, unassigned group included"""
+    names = response['students']['names']
+    return sorted((group['time_slot'], sorted(names[s] for s in group['students'])) for group in response['groups'])
+
+def test_compact_matches_full():
+    full = post('/api/upload').get_json()
+    compact = post('/api/upload', response_format='compact').get_json()
+    assert 'error' not in full and 'error' not in compact
+    assert group_names(compact) == sorted((group['time_slot'], sorted(student['name'] for student in group['students'])) for group in full['groups'])
+    table = compact['students']
+    for compact_group, full_group in zip(compact['groups'], full['groups']):
+        for s, student in zip(compact_group['students'], full_group['students']):
+            assert ''.join(student['attributes'][attr] for attr in table['attribute_names']) == table['attributes'][s]
+            assert ''.join(student['availabilities'][slot] for slot in table['time_slots']) == table['availabilities'][s]
+    assert compact['groups'][-1]['is_unassigned'] and compact['total_students'] == full['total_students'] == 41
+
+def test_compact_schedule_round_trips_through_resolve():
+    first = post('/api/upload', response_format='compact').get_json()
+    assert 'error' not in first, first['error']
+    # nothing changed, so re-solving from the compact schedule keeps every student where they were
+    again = post('/api/resolve', response_format='compact', previous_schedule=json.dumps(first)).get_json()
+    assert 'error' not in again, again['error']
+    assert again['moved_students'] == 0
+    assert group_names(again) == group_names(first)
+
+def export_rows(sheet):
+    """the csv export of one of the sample sheets and the sample result sheet for it: (text, rows) each"""
+    response = post('/api/export', sheet, export_format='csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    text = response.get_data(as_text=True)
+    with open(SAMPLE_RESULT.format(sheet if sheet else '_no_missing'), newline='') as f:
+        sample_text = f.read()
+    return (text, list(csv.DictReader(io.StringIO(text)))), (sample_text, list(csv.DictReader(io.StringIO(sample_text))))
+
+def test_csv_export_has_the_sample_layout():
+    (text, rows), (sample_text, sample_rows) = export_rows('')
+
+    # the same columns (the sample sheet has its attribute and time slot columns sorted, the export keeps the upload's order)
+    header = next(csv.reader(io.StringIO(text)))
+    sample_header = next(csv.reader(io.StringIO(sample_text)))
+    assert header[:3] == sample_header[:3] == ['Student Name', 'Assigned Group', 'Assigned Time Slot']
+    assert sorted(header[3:]) == sorted(sample_header[3:])
+    # text quoted, 0/1 bare, like the sample
+    assert text.splitlines()[1].startswith('"') and text.splitlines()[1].endswith(('0', '1'))
+
+    # every student once, with the sample's attributes and availabilities, in a group that meets when they can
+    assert sorted(row['Student Name'] for row in rows) == sorted(row['Student Name'] for row in sample_rows)
+    sample_by_name = {row['Student Name']: row for row in sample_rows}
+    for row in rows:
+        assert {column: row[column] for column in header[3:]} == {column: sample_by_name[row['Student Name']][column] for column in header[3:]}
+        assert row['Assigned Group'].startswith('Group ')
+        assert row[row['Assigned Time Slot']] == '1'
+
+def test_csv_export_lists_unassigned_students_like_the_sample():
+    # (this sheet's time slot headers don't match its result sheet's, so only the names and labels are compared)
+    (_, rows), (_, sample_rows) = export_rows('_with_missing')
+    assert len(rows) == len(sample_rows) == 41
+    unassigned = [(row['Student Name'], row['Assigned Group'], row['Assigned Time Slot']) for row in rows if row['Assigned Group'] == UNASSIGNED_LABEL]
+    assert unassigned == [(row['Student Name'], row['Assigned Group'], row['Assigned Time Slot']) for row in sample_rows
+                          if row['Assigned Group'] == UNASSIGNED_LABEL]
+    assert [name for name, _, slot in unassigned if slot == UNASSIGNED_LABEL] == ['Cheshire Cat', 'Rachel Dare', 'Ethan Hunt', 'Benji Dunn']
+    # the unassigned students come last
+    assert [row['Assigned Group'] for row in rows[-4:]] == [UNASSIGNED_LABEL] * 4
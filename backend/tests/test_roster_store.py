@@ -0,0 +1,94 @@
+import io
+import numpy as np
+import pytest
+from app import app
+from roster_store import RosterStore
+from rosters import roster_matrix
+
+SAMPLE = '../examples/sample_input_sheets/fun_people_test_with_missing.csv'
+
+def parsed_roster(seed, num_students=20):
+    return {'matrix': roster_matrix(num_students, 4, seed), 'unassigned_students': [{'name': 'Nobody', 'attributes': {}, 'availabilities': {}}],
+            'total_students': num_students + 1}
+
+def same_roster(a, b):
+    return (a['matrix'].names == b['matrix'].names and a['matrix'].attribute_names == b['matrix'].attribute_names
+            and a['matrix'].time_slots == b['matrix'].time_slots
+            and np.array_equal(a['matrix'].attributes, b['matrix'].attributes)
+            and np.array_equal(a['matrix'].availabilities, b['matrix'].availabilities)
+            and a['unassigned_students'] == b['unassigned_students'] and a['total_students'] == b['total_students'])
+
+@pytest.fixture(params=['memory', 'disk'])
+def store(request, tmp_path):
+    return RosterStore(max_entries=4, store_dir=str(tmp_path) if request.param == 'disk' else None)
+
+def test_add_get_delete(store):
+    parsed = parsed_roster(0)
+    key = store.add(parsed)
+    assert same_roster(store.get(key), parsed)
+    assert store.delete(key)
+    assert store.get(key) is None
+    assert not store.delete(key)
+
+def test_same_roster_same_id(store):
+    key = store.add(parsed_roster(0))
+    # parsed again from scratch, same content
+    assert store.add(parsed_roster(0)) == key
+    assert store.add(parsed_roster(1)) != key
+    assert store.add(parsed_roster(0, num_students=21)) != key
+
+@pytest.mark.parametrize('key', ['', None, 'abc', '../' + '0' * 21, '0' * 23, 'g' * 24])
+def test_bad_ids(store, key):
+    assert store.get(key) is None
+    assert not store.delete(key)
+
+def test_memory_keeps_the_most_recently_used():
+    store = RosterStore(max_entries=2)
+    first, second = store.add(parsed_roster(0)), store.add(parsed_roster(1))
+    store.get(first)
+    store.add(parsed_roster(2))
+    assert store.get(first) is not None
+    assert store.get(second) is None
+
+def test_disk_store_survives_a_restart(tmp_path):
+    parsed = parsed_roster(0)
+    key = RosterStore(max_entries=1, store_dir=str(tmp_path)).add(parsed)
+    # a new store on the same folder (a restarted server) reads it back memory-mapped
+    reloaded = RosterStore(max_entries=1, store_dir=str(tmp_path)).get(key)
+    assert same_roster(reloaded, parsed)
+    # still the read-only mapping of the file, not a copy
+    assert not reloaded['matrix'].availabilities.flags.owndata and not reloaded['matrix'].availabilities.flags.writeable
+    assert RosterStore(store_dir=str(tmp_path)).delete(key)
+    assert RosterStore(store_dir=str(tmp_path)).get(key) is None
+
+def test_damaged_disk_entry_is_gone(tmp_path):
+    store = RosterStore(max_entries=1, store_dir=str(tmp_path))
+    key = store.add(parsed_roster(0))
+    (tmp_path / key / 'attributes.npy').write_bytes(b'not a numpy file')
+    assert RosterStore(store_dir=str(tmp_path)).get(key) is None
+    assert not (tmp_path / key).exists()
+
+def upload_sample(client):
+    with open(SAMPLE, 'rb') as f:
+        data = {'file': (io.BytesIO(f.read()), 'fun_people_test_with_missing.csv'), 'given_attributes': 'Marketing,Finance,Technology,Healthcare'}
+    return client.post('/api/rosters', data=data, content_type='multipart/form-data')
+
+def test_roster_endpoints():
+    client = app.test_client()
+    first = upload_sample(client)
+    assert first.status_code == 201
+    info = first.get_json()
+    assert info['total_students'] == 41 and info['unassigned_students'] == 4
+    assert info['attribute_names'] == ['marketing', 'finance', 'technology', 'healthcare']
+    # uploading the same sheet again gives the same roster back
+    assert upload_sample(client).get_json()['roster_id'] == info['roster_id']
+    assert client.get(f"/api/rosters/{info['roster_id']}").get_json() == info
+
+    schedule = client.post('/api/upload', data={'roster_id': info['roster_id'], 'group_size_min': '3', 'group_size_max': '6', 'time_limit': '5'}).get_json()
+    assert 'error' not in schedule, schedule['error']
+    assert schedule['total_students'] == 41
+
+    assert client.delete(f"/api/rosters/{info['roster_id']}").get_json() == {'roster_id': info['roster_id'], 'deleted': True}
+    assert client.get(f"/api/rosters/{info['roster_id']}").status_code == 404
+    assert client.delete(f"/api/rosters/{info['roster_id']}").status_code == 404
+    assert client.post('/api/upload', data={'roster_id': info['roster_id']}).status_code == 404
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from constraint_parser import SchedulingConstraints
+from engines import create_scheduler
+from student_matrix import StudentMatrix
+from rosters import schedule_problems
+
+def one_slot_roster():
+    """10 students who can all make the one time slot, the first 6 of them with attribute 'x'"""
+    attributes = np.zeros((10, 1), dtype=np.uint8)
+    attributes[:6, 0] = 1
+    return StudentMatrix([f'Student {s + 1}' for s in range(10)], ['x'], ['A'], attributes, np.ones((10, 1), dtype=np.uint8))
+
+def soft_constraints(rule, size_min, size_max, count_min, count_max, **options):
+    return SchedulingConstraints({'x': dict(rule, soft=True)}, size_min, size_max, count_min, count_max, [],
+                                 time_limit=10, num_workers=1, random_seed=0, **options)
+
+@pytest.mark.parametrize('prebind_slots', [False, True])
+def test_unmeetable_soft_rule_is_missed_as_little_as_possible(prebind_slots):
+    # two groups of 5 share the 6 students with x, so at most 2 per group is missed by at least one in each group
+    matrix = one_slot_roster()
+    constraints = soft_constraints({'max_per_group': 2}, 5, 5, 2, 2)
+    result = create_scheduler(matrix, constraints, prebind_slots=prebind_slots).schedule()
+    assert 'error' not in result, result['error']
+    assert result['solver_status'] in ('OPTIMAL', 'FEASIBLE')
+    assert schedule_problems(matrix, constraints, result) == []
+    assert result['total_violation'] == 2
+    assert result['soft_constraints'] == [{'constraint': "at most 2 per group with attribute 'x'", 'weight': 1, 'violation': 2,
+                                           'violated_groups': [1, 2]}]
+
+    # the same rule as a hard constraint has no schedule at all
+    hard = SchedulingConstraints({'x': {'max_per_group': 2}}, 5, 5, 2, 2, [], time_limit=10, num_workers=1)
+    assert 'error' in create_scheduler(matrix, hard, prebind_slots=prebind_slots).schedule()
+
+def test_meetable_soft_rule_is_met():
+    result = create_scheduler(one_slot_roster(), soft_constraints({'max_per_group': 3}, 5, 5, 2, 2)).schedule()
+    assert 'error' not in result, result['error']
+    assert result['total_violation'] == 0
+    assert result['soft_constraints'][0]['violated_groups'] == []
+
+def test_fractional_weight_still_comes_first():
+    # with groups of up to 10, min_groups alone would put everyone in one group (4 over the soft maximum); even at half
+    # weight the soft rule has to outrank it and every other weighted term, so the students with x get split up
+    constraints = soft_constraints({'max_per_group': 2, 'weight': 0.5}, 2, 10, 1, 5, objective='weighted')
+    result = create_scheduler(one_slot_roster(), constraints).schedule()
+    assert 'error' not in result, result['error']
+    assert result['total_violation'] == 0
+    assert result['total_groups'] >= 3
+    assert result['soft_constraints'][0]['weight'] == 0.5
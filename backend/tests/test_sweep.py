@@ -0,0 +1,58 @@
+import io
+import json
+import pytest
+from types import SimpleNamespace
+from app import app, constraints_for_variant
+from constraint_parser import SchedulingConstraints
+from csv_parser import parse_sweep, MAX_SWEEP_VARIANTS
+
+SAMPLE = '../examples/sample_input_sheets/fun_people_test.csv'
+
+def sweep_request(sweep, **form):
+    """just enough of a flask request for parse_sweep"""
+    return SimpleNamespace(form=dict(form, sweep=sweep if isinstance(sweep, str) else json.dumps(sweep)))
+
+def test_parse_sweep_takes_every_combination():
+    parsed = parse_sweep(sweep_request({'group_size_min': [3, 4], 'marketing_max_per_group': [1, 2]}, time_limit='5'), ['marketing'])
+    assert parsed['status'] == 200
+    assert parsed['variants'] == [{'group_size_min': 3, 'marketing_max_per_group': 1}, {'group_size_min': 3, 'marketing_max_per_group': 2},
+                                  {'group_size_min': 4, 'marketing_max_per_group': 1}, {'group_size_min': 4, 'marketing_max_per_group': 2}]
+    assert parsed['time_limit'] == 5
+    assert parse_sweep(sweep_request({'group_size_max': [5]}, time_limit='5', variant_time_limit='2'), [])['time_limit'] == 2
+
+@pytest.mark.parametrize('sweep', [
+    'not json', {}, [3, 4], {'random_seed': [1, 2]}, {'finance_max_per_group': [1]}, {'group_size_min': []},
+    {'group_size_min': 3}, {'group_size_min': [-1]}, {'group_size_min': [2.5]}, {'group_size_min': [True]},
+    {'group_size_min': list(range(MAX_SWEEP_VARIANTS)), 'group_size_max': [5, 6]},
+])
+def test_parse_sweep_rejects(sweep):
+    parsed = parse_sweep(sweep_request(sweep), ['marketing'])
+    assert parsed['status'] == 400 and parsed['error']
+
+def test_variant_fills_in_its_values():
+    base = SchedulingConstraints({'marketing': {'min_per_group': 1}}, 3, 5, 1, 4, [], time_limit=30)
+    constraints = constraints_for_variant(base, {'group_size_max': 6, 'marketing_max_per_group': 2, 'finance_min_per_group': 1}, 10)
+    assert constraints.get_group_size_constraints() == (3, 6)
+    assert constraints.attribute_constraints == {'marketing': {'min_per_group': 1, 'max_per_group': 2}, 'finance': {'min_per_group': 1}}
+    assert constraints.time_limit == 10
+    # the base constraints are left alone for the next variant
+    assert base.get_group_size_constraints() == (3, 5)
+    assert base.attribute_constraints == {'marketing': {'min_per_group': 1}}
+    assert base.time_limit == 30
+
+def test_variant_zero_means_default():
+    constraints = constraints_for_variant(SchedulingConstraints({}, 3, 5, 2, 4, []), {'group_size_min': 0, 'group_size_max': 0, 'group_count_min': 0}, None)
+    # same as the constructor does with 0s
+    assert constraints.get_group_size_constraints() == (1, None)
+    assert constraints.group_count_min == 1
+
+def test_sweep_with_zero_minimum_size():
+    with open(SAMPLE, 'rb') as f:
+        data = {'file': (io.BytesIO(f.read()), 'fun_people_test.csv'), 'group_size_max': '5', 'time_limit': '5',
+                'sweep': json.dumps({'group_size_min': [0, 3]})}
+    response = app.test_client().post('/api/sweep', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert [summary['variant'] for summary in body['variants']] == [{'group_size_min': 0}, {'group_size_min': 3}]
+    assert all(summary['status'] != 'ERROR' for summary in body['variants']), body['variants']
+    assert body['best'] is not None
@@ -0,0 +1,115 @@
+"""
+the one pool of worker processes this process solves on (batches, sweeps, decomposed slots and background jobs), and
+the solve slots that keep how many solves run at once - on request threads or in the pool - under SMARTGROUPS_MAX_SOLVES
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+_solve_slots = None # BoundedSemaphore once limit_solves() is called, None = no limit
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+_in_pool_worker = False # set inside the pool's own processes
+# None = forkserver or spawn (see mp_context); a program that runs no threads of its own may set 'fork'
+start_method = None
+
+def limit_solves(max_solves, pool_workers=None):
+    """
+    at most max_solves solves at once in this process and its pool (None = no limit)
+    pool_workers: size of the shared pool (defaults to max_solves, or the number of cores without a limit)
+    """
+    global _solve_slots, _pool_workers
+    _solve_slots = threading.BoundedSemaphore(max_solves) if max_solves else None
+    _pool_workers = pool_workers or max_solves
+
+def take_solve_slot(blocking=False, timeout=None):
+    """claim a solve slot; False if none is free (right away, or within timeout when blocking)"""
+    if _solve_slots is None:
+        return True
+    return _solve_slots.acquire(blocking=blocking, timeout=timeout if blocking else None)
+
+def release_solve_slot():
+    if _solve_slots is not None:
+        _solve_slots.release()
+
+def take_extra_solve_slots(wanted):
+    """
+    for a caller that already holds a slot and could use wanted more to solve side by side: take the ones that are
+    free right now (never waits) and return how many it got; give them back with release_solve_slot()
+    inside the pool's processes nothing more runs side by side, the parent already counted the task's one slot
+    """
+    if _in_pool_worker:
+        return 0
+    taken = 0
+    while taken < wanted and take_solve_slot():
+        taken += 1
+    return taken
+
+def mp_context():
+    """
+    forkserver where there is one (spawn elsewhere): the web process runs threads, and forking it mid-request can copy
+    a lock some other thread holds (e.g. the import lock) into a child that then waits on it forever
+    """
+    if start_method is not None:
+        return multiprocessing.get_context(start_method)
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # the server imports the solver once, single-threaded, so every worker it forks starts with it loaded
+        context.set_forkserver_preload(['engines', 'scheduler'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+def _start_worker():
+    global _in_pool_worker
+    _in_pool_worker = True
+
+def _shared_pool(broken=None):
+    """the pool, started on first use (and started again if it's the one that broke)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool is broken:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_pool_workers or os.cpu_count() or 1, mp_context=mp_context(),
+                                        initializer=_start_worker)
+        return _pool
+
+def submit(fn, *args):
+    """run fn(*args) on the shared pool (started on first use), returns its future"""
+    pool = _shared_pool()
+    try:
+        return pool.submit(fn, *args)
+    except BrokenProcessPool:
+        # a worker died (e.g. ran out of memory) and took the pool with it, start a fresh one
+        return _shared_pool(broken=pool).submit(fn, *args)
+
+def run_all(fn, tasks, width, stop_event=None):
+    """
+    fn(*task) for every task on the shared pool, at most width at a time; waits for them and returns their futures
+    in task order (tasks that hadn't started when stop_event got set come back cancelled)
+    """
+    futures = []
+    running = set()
+    for task in tasks:
+        while len(running) >= width:
+            _, running = wait(running, return_when=FIRST_COMPLETED)
+        if stop_event is not None and stop_event.is_set():
+            future = Future()
+            future.cancel()
+        else:
+            future = submit(fn, *task)
+            running.add(future)
+        futures.append(future)
+    wait(running)
+    return futures
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool = None
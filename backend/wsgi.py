@@ -0,0 +1,34 @@
+"""
+production entry point: `gunicorn -c gunicorn.conf.py wsgi:app` from the backend folder (pip install gunicorn first;
+gunicorn.conf.py reads the worker counts and timeouts from the same SMARTGROUPS_* variables as below)
+`python wsgi.py` runs the same app on werkzeug's threaded server instead, for machines without gunicorn (e.g. windows)
+
+unlike `python app.py` this doesn't write the port into the frontend, runs without the debugger and reloader, and turns
+on the limits from app.py with these defaults (set the variables to override them):
+    SMARTGROUPS_MAX_UPLOAD_MB    biggest request body in MB (64)
+    SMARTGROUPS_MAX_TIME_LIMIT   longest time_limit a solve may ask for, and the limit it gets if it doesn't ask (60);
+                                 this caps the solver's search, reading the upload, explaining an infeasible result and
+                                 the auto/decompose fallbacks come on top of it
+    SMARTGROUPS_WEB_WORKERS      web worker processes (1)
+    SMARTGROUPS_MAX_SOLVES       solves per web worker at once, counting background jobs and the sections, variants and
+                                 time slots a request solves side by side (the cores divided between the web workers)
+    SMARTGROUPS_SOLVER_THREADS   cp-sat search workers per solve (the cores divided between all the solves at once)
+one web worker is usually enough (cp-sat lets go of the gil while it searches, so the threads of one worker still solve
+side by side). more than one needs SMARTGROUPS_ROSTER_DIR so they all see the same rosters (serving.py refuses to start
+without it), and since background jobs (/api/jobs) live in the worker that accepted them, polling them needs sticky
+sessions; SMARTGROUPS_CACHE_DIR is shared by all of them too
+"""
+import os
+from serving import serving_defaults
+
+# app.py reads its limits when it's imported, so they have to be in place first
+for name, value in serving_defaults().items():
+    os.environ[name] = str(value)
+
+from app import app
+
+if __name__ == '__main__':
+    host = os.environ.get('SMARTGROUPS_HOST', '127.0.0.1')
+    port = int(os.environ.get('SMARTGROUPS_PORT', 5013))
+    print(f"Serving SmartGroups on http://{host}:{port}")
+    app.run(host=host, port=port, threaded=True, debug=False, use_reloader=False)
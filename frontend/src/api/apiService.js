@@ -66,7 +66,8 @@ const checkFile = (file) => {
 };
 
 // upload the file and the constraints formdata to the backend
-export const uploadFileAndConstraints = async (file, constraints = {}) => {
+// pass previousSchedule (the data of an earlier result) to re-solve from it after a small change to the sheet or settings
+export const uploadFileAndConstraints = async (file, constraints = {}, previousSchedule = null) => {
     await initializeApi(); // Ensure API is initialized before proceeding
     try {
         const formData = new FormData(); // all the constraints + file
@@ -93,6 +94,28 @@ export const uploadFileAndConstraints = async (file, constraints = {}) => {
             formData.append('group_count_max', constraints.groupCountMax.toString());  // request.form['group_count_max']
         }
 
+        // add the solver settings (time limit in seconds, search workers, random seed, relative optimality gap)
+        if (constraints.timeLimit !== undefined) {
+            formData.append('time_limit', constraints.timeLimit.toString());  // request.form['time_limit']
+        }
+        if (constraints.numWorkers !== undefined) {
+            formData.append('num_workers', constraints.numWorkers.toString());  // request.form['num_workers']
+        }
+        if (constraints.randomSeed !== undefined) {
+            formData.append('random_seed', constraints.randomSeed.toString());  // request.form['random_seed']
+        }
+        if (constraints.relativeGap !== undefined) {
+            formData.append('relative_gap', constraints.relativeGap.toString());  // request.form['relative_gap']
+        }
+
+        // add what the solver should optimize for (and how much each part counts if combining them)
+        if (constraints.objective !== undefined) {
+            formData.append('objective', constraints.objective);  // request.form['objective']
+        }
+        if (constraints.objectiveWeights !== undefined) {
+            formData.append('objective_weights', JSON.stringify(constraints.objectiveWeights));  // request.form['objective_weights']
+        }
+
         // for each attribute, add min / max constraints if they enter them
         if (constraints.attributeConstraints) {
             Object.entries(constraints.attributeConstraints).forEach(([attr, attrConstraints]) => {
@@ -108,6 +131,14 @@ export const uploadFileAndConstraints = async (file, constraints = {}) => {
             formData.append('combined_constraints', JSON.stringify(constraints.combinedConstraints));
         }
 
+        // re-solving: send the previous schedule so students stay in their groups where possible
+        if (previousSchedule) {
+            formData.append('previous_schedule', JSON.stringify(previousSchedule));  // request.form['previous_schedule']
+            if (constraints.minimizeMoves !== undefined) {
+                formData.append('minimize_moves', constraints.minimizeMoves.toString());  // request.form['minimize_moves']
+            }
+        }
+
         // show what's sent to backend
         if (process.env.NODE_ENV === 'development') {
             console.log('FormData being sent to backend:');
@@ -117,7 +148,7 @@ export const uploadFileAndConstraints = async (file, constraints = {}) => {
         }
 
         // send the request
-        const response = await postFormData(API_ENDPOINTS.UPLOAD, formData);
+        const response = await postFormData(previousSchedule ? API_ENDPOINTS.RESOLVE : API_ENDPOINTS.UPLOAD, formData);
 
         return {
             success: true,
@@ -66,6 +66,7 @@ export const getApiConfig = () => {
 // api endpoints
 export const API_ENDPOINTS = {
   UPLOAD: '/api/upload', // this is defined in the backend when i wrote up app.py
+  RESOLVE: '/api/resolve', // re-solve starting from a previous schedule (keeps students in their groups where possible)
   HEALTH: '/api/health', // just checking it works
 };
 
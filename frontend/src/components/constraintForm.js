@@ -9,6 +9,8 @@ const ConstraintForm = ({ file, onConstraints, onBack }) => {
     const [groupSizeMax, setGroupSizeMax] = useState('');
     const [groupCountMin, setGroupCountMin] = useState('');
     const [groupCountMax, setGroupCountMax] = useState('');
+    const [timeLimit, setTimeLimit] = useState('');
+    const [objective, setObjective] = useState('none');
     const [attributeConstraints, setAttributeConstraints] = useState({});
     const [combinedConstraints, setCombinedConstraints] = useState([]);
 
@@ -74,6 +76,8 @@ const ConstraintForm = ({ file, onConstraints, onBack }) => {
             groupSizeMax: groupSizeMax ? parseInt(groupSizeMax) : undefined,
             groupCountMin: groupCountMin ? parseInt(groupCountMin) : undefined,
             groupCountMax: groupCountMax ? parseInt(groupCountMax) : undefined,
+            timeLimit: timeLimit ? parseFloat(timeLimit) : undefined,
+            objective: objective !== 'none' ? objective : undefined,
             attributeConstraints: cleanedAttributeConstraints,
             combinedConstraints: cleanedCombinedConstraints
         };
@@ -162,6 +166,31 @@ const ConstraintForm = ({ file, onConstraints, onBack }) => {
                         </div>
                     </div>
 
+                    {/* Solver Settings */}
+                    <div className="constraints-section">
+                        <h4>Solver Settings</h4>
+                        <div className="constraint-inputs">
+                            <input
+                                type="number"
+                                placeholder="Time limit in seconds (optional)"
+                                value={timeLimit}
+                                onChange={(e) => setTimeLimit(e.target.value)}
+                                className="constraint-input"
+                            />
+                            <select
+                                value={objective}
+                                onChange={(e) => setObjective(e.target.value)}
+                                className="constraint-input"
+                            >
+                                <option value="none">Any valid groups</option>
+                                <option value="min_groups">As few groups as possible</option>
+                                <option value="balance_sizes">Group sizes as even as possible</option>
+                                <option value="spread_attributes">Attributes spread as evenly as possible</option>
+                                <option value="weighted">Balance all of the above</option>
+                            </select>
+                        </div>
+                    </div>
+
                     {/* Attribute-specific Constraints - only show if attributes were provided */}
                     {attributeArray.length > 0 && (
                         <div className="constraints-section">